@@ -0,0 +1,217 @@
+'''
+Created on 18 Oct 2026
+
+Generate a synthetic corpus by scaling up the Shakespeare sample. Every
+document is a copy of the image of the sample with a new identifier and
+its own set of depicted people and subject, drawn from a shared pool of
+entities. A few entities are depicted very often and most of them rarely,
+and every entity comes with its owl:sameAs links, so the corpus has the
+same kind of equivalence classes and fan-out as the real data. Run from
+the root of the project with
+
+    python -m benchmarks.generate OUTPUT.NQ [-q QUADS] [-f FANOUT] [-s SEED]
+'''
+from rdflib.graph import Dataset
+from rdflib.namespace import FOAF, OWL, RDF, RDFS, DCTERMS, VOID
+from rdflib.term import URIRef, Literal
+import argparse
+import random
+import re
+
+import logging
+logger = logging.getLogger(__name__)
+
+SAMPLE = 'features/shakespeare-sample.nq'
+
+# The identifier of the image used as a template, and the site it comes from
+TEMPLATE_ID = '6731510'
+SITE = 'http://shakespeare.acropolis.org.uk/'
+
+FRBR_WORK = URIRef('http://purl.org/vocab/frbr/core#Work')
+
+def load_sample(nquad_file_name=SAMPLE):
+    '''
+    Split the sample into the template document and the other graphs
+
+    @return: a tuple (template, template name, others) with the triples of
+    the template that only talk about the image, the name of its graph and
+    a list of (graph name, triples) for the other graphs
+    '''
+    dataset = Dataset()
+    dataset.parse(nquad_file_name, format='nquads')
+    template = None
+    others = []
+    for graph in dataset.graphs():
+        if len(graph) == 0:
+            continue
+        if (None, RDF.type, FOAF.Image) in graph:
+            # Drop what is about the people and works depicted, these
+            # come from the pool of entities
+            template = [(s, p, o) for (s, p, o) in graph
+                        if str(s).startswith(SITE)
+                        and p not in (FOAF.depicts, DCTERMS.subject)]
+            template_name = graph.identifier
+        else:
+            others.append((graph.identifier, list(graph)))
+    return (template, template_name, others)
+
+def _rename(term, identifier):
+    '''
+    Change the identifier of the template image found in a term
+    '''
+    if isinstance(term, URIRef) and TEMPLATE_ID in term:
+        return URIRef(term.replace(TEMPLATE_ID, identifier))
+    if isinstance(term, Literal) and TEMPLATE_ID in term:
+        return Literal(term.replace(TEMPLATE_ID, identifier),
+                       lang=term.language, datatype=term.datatype)
+    return term
+
+class EntityPool(object):
+    '''
+    The people and works documents talk about. Entity i is a dbpedia
+    resource with a sameAs link to dbpedialite, every fifth one is a work
+    which also has a wikidata resource pointing to it
+    '''
+    def __init__(self, size, skew, rng):
+        '''
+        Constructor
+
+        @param size: the number of entities
+        @param skew: how much the popular entities are preferred, 1 for a
+        uniform distribution
+        @param rng: the random generator to use
+        '''
+        self.size = size
+        self.skew = skew
+        self.rng = rng
+
+    def pick(self):
+        '''
+        Draw an entity, the ones with a low index being more popular
+        '''
+        return int(self.size * self.rng.random() ** self.skew)
+
+    def is_work(self, index):
+        return index % 5 == 0
+
+    def uri(self, index):
+        '''
+        Get the URI documents use for an entity
+        '''
+        if self.is_work(index):
+            return URIRef('http://www.wikidata.org/entity/Q{}'.format(index))
+        return URIRef('http://dbpedia.org/resource/Entity_{}'.format(index))
+
+    def triples(self, index):
+        '''
+        Get the description of an entity, as found in the documents
+        '''
+        dbpedia = URIRef('http://dbpedia.org/resource/Entity_{}'.format(index))
+        dbpedialite = URIRef('http://www.dbpedialite.org/things/{}#id'.format(index))
+        label = Literal('Entity {}'.format(index), lang='en-gb')
+        if self.is_work(index):
+            wikidata = self.uri(index)
+            return [(wikidata, RDF.type, FRBR_WORK),
+                    (wikidata, RDFS.label, label),
+                    (wikidata, OWL.sameAs, dbpedia),
+                    (dbpedia, OWL.sameAs, dbpedialite)]
+        return [(dbpedia, RDF.type, FOAF.Person),
+                (dbpedia, RDFS.label, label),
+                (dbpedia, OWL.sameAs, dbpedialite)]
+
+def generate(output, quads, fanout=3, skew=2.0, entities=None, seed=0,
+             sample=SAMPLE):
+    '''
+    Write a synthetic corpus to a file
+
+    @param output: the name of the NQuads file to write
+    @param quads: the number of quads to write, approximately
+    @param fanout: the average number of people depicted by a document
+    @param skew: how much the popular entities are preferred
+    @param entities: the number of entities, by default one per ten
+    documents
+    @param seed: the seed of the random generator, the same seed always
+    gives the same corpus
+    @return: the number of documents and quads written
+    '''
+    rng = random.Random(seed)
+    (template, template_name, others) = load_sample(sample)
+
+    # Guess the number of documents from the size of an average document
+    per_document = len(template) + fanout + 2 + (fanout + 1) * 3.2
+    documents = max(1, int(quads / per_document))
+    if entities is None:
+        entities = max(10, documents // 10)
+    pool = EntityPool(entities, skew, rng)
+
+    written = 0
+    with open(output, 'w', encoding='utf-8') as nquads:
+        def write(triple, graph_name):
+            nquads.write('{} {} {} {} .\n'.format(
+                triple[0].n3(), triple[1].n3(), triple[2].n3(), graph_name.n3()))
+
+        # The graphs of the sample describing the site, listing the images
+        for (graph_name, triples) in others:
+            for triple in triples:
+                write(triple, graph_name)
+                written += 1
+
+        for document in range(documents):
+            identifier = str(int(TEMPLATE_ID) + document + 1)
+            graph_name = _rename(template_name, identifier)
+            image = URIRef('{}images/{}#id'.format(SITE, identifier))
+            for triple in template:
+                write(tuple(_rename(t, identifier) for t in triple), graph_name)
+
+            # The people depicted and the subject, with their descriptions
+            depicted = set(pool.pick() for _ in range(rng.randint(1, 2 * fanout - 1)))
+            subject = pool.pick() // 5 * 5
+            for index in depicted:
+                write((image, FOAF.depicts, pool.uri(index)), graph_name)
+            write((image, DCTERMS.subject, pool.uri(subject)), graph_name)
+            for index in depicted | set([subject]):
+                for triple in pool.triples(index):
+                    write(triple, graph_name)
+            written += len(template) + len(depicted) + 1
+            written += sum(len(pool.triples(i)) for i in depicted | set([subject]))
+
+            # List the image in the collection of images
+            write((URIRef(SITE + 'images#id'), VOID.subset, graph_name),
+                  URIRef(SITE + 'images.ttl'))
+            written += 1
+
+    logger.info('Wrote {} quads in {} documents to {}'.format(
+        written, documents, output))
+    return (documents, written)
+
+def document_uris(nquad_file_name):
+    '''
+    Get the names of the image documents of a generated corpus
+    '''
+    pattern = re.compile(r'<({}images/\d+)> \.$'.format(re.escape(SITE)))
+    uris = set()
+    with open(nquad_file_name, encoding='utf-8') as nquads:
+        for line in nquads:
+            match = pattern.search(line.rstrip())
+            if match is not None:
+                uris.add(match.group(1))
+    return sorted(uris)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic corpus')
+    parser.add_argument('output', help='NQuads file to write')
+    parser.add_argument('-q', dest='quads', type=int, default=1000000,
+                        help='number of quads to generate')
+    parser.add_argument('-f', dest='fanout', type=int, default=3,
+                        help='average number of people depicted in a document')
+    parser.add_argument('-k', dest='skew', type=float, default=2.0,
+                        help='preference for the popular entities (1 for none)')
+    parser.add_argument('-e', dest='entities', type=int, default=None,
+                        help='number of entities (default: documents / 10)')
+    parser.add_argument('-s', dest='seed', type=int, default=0,
+                        help='seed of the random generator')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    generate(args.output, args.quads, args.fanout, args.skew, args.entities,
+             args.seed)
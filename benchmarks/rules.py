@@ -0,0 +1,97 @@
+'''
+Created on 18 Oct 2026
+
+Compare the native rule engine with the evaluation of the rules as SPARQL
+CONSTRUCT queries. Run from the root of the project with
+
+    python -m benchmarks.rules [FILE.NQ] [-r RULES] [-n REPEAT]
+'''
+from indexer.component.engine import RuleEngine
+from indexer.util.rules import read_rules
+from rdflib.graph import Dataset, Graph
+from rdflib.plugins.sparql.processor import prepareQuery
+from rdflib.compare import isomorphic
+import argparse
+import time
+
+def load_rules(rules_file_name):
+    '''
+    Load the rule base as a set of prepared queries
+    '''
+    (queries, r_ns) = read_rules(rules_file_name)
+    return dict((name, prepareQuery(query, initNs=r_ns))
+                for (name, query) in queries.items())
+
+def load_graphs(nquad_file_name):
+    '''
+    Load all the named graphs of an NQuads file
+    '''
+    dataset = Dataset()
+    dataset.parse(nquad_file_name, format='nquads')
+    graphs = []
+    for graph in dataset.graphs():
+        if len(graph) > 0:
+            copy = Graph()
+            for triple in graph:
+                copy.add(triple)
+            graphs.append(copy)
+    return graphs
+
+def run_sparql(rules, graphs):
+    results = []
+    for graph in graphs:
+        output = Graph()
+        for rule in rules.values():
+            for triple in graph.query(rule).graph:
+                output.add(triple)
+        results.append(output)
+    return results
+
+def run_native(engine, graphs):
+    results = []
+    for graph in graphs:
+        output = Graph()
+        engine.apply(output, graph)
+        results.append(output)
+    return results
+
+def timed(function, repeat):
+    '''
+    Run a function several times and return its last result and the best time
+    '''
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return (result, best)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the rule engines')
+    parser.add_argument('file', nargs='?', default='features/shakespeare-sample.nq',
+                        help='NQuads file with the graphs to process')
+    parser.add_argument('-r', dest='rules', default='rulebase.ttl',
+                        help='rule base')
+    parser.add_argument('-n', dest='repeat', type=int, default=10,
+                        help='number of runs, the best one is reported')
+    args = parser.parse_args()
+
+    rules = load_rules(args.rules)
+    engine = RuleEngine(rules)
+    graphs = load_graphs(args.file)
+    triples = sum(len(g) for g in graphs)
+    print('{} graphs, {} triples, {} rules ({} compiled)'.format(
+        len(graphs), triples, len(rules), len(engine.compiled)))
+
+    (expected, sparql_time) = timed(lambda: run_sparql(rules, graphs), args.repeat)
+    (actual, native_time) = timed(lambda: run_native(engine, graphs), args.repeat)
+
+    # Both engines must produce the same graphs
+    same = all(isomorphic(a, b) for (a, b) in zip(expected, actual))
+    print('Identical results: {} ({} triples produced)'.format(
+        same, sum(len(g) for g in actual)))
+    for (name, elapsed) in [('sparql', sparql_time), ('native', native_time)]:
+        print('{:8} {:10.2f} ms {:12.1f} graphs/s'.format(
+            name, elapsed * 1000, len(graphs) / elapsed))
+    print('Speed-up: {:.1f}x'.format(sparql_time / native_time))
@@ -0,0 +1,407 @@
+'''
+Created on 18 Oct 2026
+
+In-process stand-ins for CouchDB and Stardog. They implement the part of
+the HTTP APIs used by the stores over plain dictionaries and an rdflib data
+set, so that the whole indexer can run without any external service. They
+are meant for benchmarks and tests, not for keeping data.
+
+    with CouchDBStandIn() as couchdb, StardogStandIn() as stardog:
+        ... use couchdb.port and stardog.port in the configuration ...
+'''
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, unquote, parse_qsl
+from rdflib.graph import Dataset
+from rdflib.term import URIRef
+import base64
+import json
+import re
+import socket
+import threading
+import uuid
+
+import logging
+logger = logging.getLogger(__name__)
+
+class _Handler(BaseHTTPRequestHandler):
+    '''
+    Pass all the requests on to the stand-in the server belongs to
+    '''
+    protocol_version = 'HTTP/1.1'
+    standin = None
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        # Do not wait to send the body after the headers
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _dispatch(self):
+        url = urlsplit(self.path)
+        segments = [unquote(s) for s in url.path.split('/') if s != '']
+        query = dict(parse_qsl(url.query, keep_blank_values=True))
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length > 0 else b''
+        try:
+            (status, content_type, payload) = self.standin.handle(
+                self.command, segments, query, self.headers, body)
+        except Exception as e:
+            logger.exception('Could not handle {} {}'.format(self.command, self.path))
+            (status, content_type, payload) = (500, 'text/plain', str(e))
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        elif not isinstance(payload, bytes):
+            (content_type, payload) = ('application/json', json.dumps(payload).encode())
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(payload)
+
+    do_GET = do_HEAD = do_PUT = do_POST = do_DELETE = _dispatch
+
+    def log_message(self, format, *args):
+        pass
+
+class StandIn(object):
+    '''
+    An HTTP server running in a thread of the current process, on a free
+    port of the loopback interface
+    '''
+    def __init__(self):
+        '''
+        Constructor
+        '''
+        handler = type('Handler', (_Handler,), {'standin': self})
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self._server.daemon_threads = True
+        self._thread = None
+        self._lock = threading.RLock()
+
+        # The number of requests received, by kind of request
+        self.requests = {}
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def url(self):
+        return 'http://127.0.0.1:{}/'.format(self.port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+    def _count(self, kind):
+        with self._lock:
+            self.requests[kind] = self.requests.get(kind, 0) + 1
+
+    def handle(self, method, segments, query, headers, body):
+        '''
+        Answer a request
+
+        @return: a tuple (status, content type, payload), the payload being
+        bytes, a string or something to encode as JSON
+        '''
+        raise NotImplementedError
+
+class CouchDBStandIn(StandIn):
+    '''
+    Stand-in for the CouchDB API: databases, documents with inline
+    attachments, bulk operations, _all_docs, the views of the cache store
+    and the longpoll changes feed
+    '''
+    def __init__(self):
+        '''
+        Constructor
+        '''
+        StandIn.__init__(self)
+        self._databases = {}
+        self._changed = threading.Condition(self._lock)
+
+    def _new_database(self):
+        return {'docs': {}, 'attachments': {}, 'resources': {}, 'queue': set(),
+                'changes': {}, 'seq': 0}
+
+    def handle(self, method, segments, query, headers, body):
+        if len(segments) == 0:
+            return (200, 'application/json', {'couchdb': 'Welcome'})
+        with self._lock:
+            name = segments[0]
+            if len(segments) == 1:
+                self._count(method + ' db')
+                return self._database(method, name)
+            db = self._databases.get(name)
+            if db is None:
+                return (404, 'application/json', {'error': 'not_found'})
+
+            # Special resources of the database
+            resource = segments[1]
+            if resource == '_bulk_docs':
+                self._count('bulk_docs')
+                docs = json.loads(body.decode())['docs']
+                return (201, 'application/json', [self._save(db, d) for d in docs])
+            if resource == '_all_docs':
+                self._count('all_docs')
+                keys = json.loads(body.decode())['keys'] if body else sorted(db['docs'])
+                return (200, 'application/json',
+                        self._all_docs(db, keys, query.get('include_docs') == 'true'))
+            if resource == '_changes':
+                self._count('changes')
+                return (200, 'application/json', self._changes(db, query))
+            if resource == '_design' and len(segments) == 5 and segments[3] == '_view':
+                self._count('view ' + segments[4])
+                return (200, 'application/json', self._view(db, segments[4], query))
+
+        # Documents and attachments, the ids of design and local documents
+        # contain a slash
+        if resource in ('_design', '_local'):
+            (doc_id, rest) = ('/'.join(segments[1:3]), segments[3:])
+        else:
+            (doc_id, rest) = (segments[1], segments[2:])
+        with self._lock:
+            if len(rest) > 0:
+                self._count('attachment')
+                attachment = db['attachments'].get((doc_id, rest[0]))
+                if attachment is None:
+                    return (404, 'application/json', {'error': 'not_found'})
+                return (200, attachment[0], attachment[1])
+            self._count(method + ' doc')
+            if method in ('GET', 'HEAD'):
+                doc = db['docs'].get(doc_id)
+                if doc is None:
+                    return (404, 'application/json', {'error': 'not_found'})
+                return (200, 'application/json', doc)
+            if method in ('PUT', 'POST'):
+                doc = json.loads(body.decode())
+                doc.setdefault('_id', doc_id)
+                result = self._save(db, doc)
+                if 'error' in result:
+                    return (409, 'application/json', result)
+                result['ok'] = True
+                return (201, 'application/json', result)
+            if method == 'DELETE':
+                self._forget(db, doc_id)
+                return (200, 'application/json', {'ok': True})
+        return (405, 'application/json', {'error': 'method_not_allowed'})
+
+    def _database(self, method, name):
+        if method == 'PUT':
+            if name in self._databases:
+                return (412, 'application/json', {'error': 'file_exists'})
+            self._databases[name] = self._new_database()
+            return (201, 'application/json', {'ok': True})
+        if name not in self._databases:
+            return (404, 'application/json', {'error': 'not_found'})
+        if method == 'DELETE':
+            del self._databases[name]
+            return (200, 'application/json', {'ok': True})
+        db = self._databases[name]
+        return (200, 'application/json', {'db_name': name,
+                                          'doc_count': len(db['docs']),
+                                          'update_seq': db['seq']})
+
+    def _save(self, db, doc):
+        '''
+        Insert or update a document, checking its revision
+        '''
+        doc_id = doc.get('_id') or uuid.uuid4().hex
+        current = db['docs'].get(doc_id)
+        if current is not None and current['_rev'] != doc.get('_rev'):
+            return {'id': doc_id, 'error': 'conflict',
+                    'reason': 'Document update conflict.'}
+
+        # Keep the attachments apart, the document only has stubs
+        attachments = doc.pop('_attachments', None) or {}
+        for filename in [f for (i, f) in db['attachments'] if i == doc_id]:
+            if filename not in attachments:
+                del db['attachments'][(doc_id, filename)]
+        stubs = {}
+        for (filename, attachment) in attachments.items():
+            if 'data' in attachment:
+                db['attachments'][(doc_id, filename)] = (
+                    attachment['content_type'], base64.b64decode(attachment['data']))
+            content_type, data = db['attachments'][(doc_id, filename)]
+            stubs[filename] = {'content_type': content_type,
+                               'length': len(data), 'stub': True}
+        if len(stubs) > 0:
+            doc['_attachments'] = stubs
+
+        generation = int(current['_rev'].split('-')[0]) if current else 0
+        doc['_id'] = doc_id
+        doc['_rev'] = '{}-{}'.format(generation + 1, uuid.uuid4().hex)
+        db['docs'][doc_id] = doc
+
+        # Update the views and the changes feed
+        if '@id' in doc:
+            db['resources'][doc['@id']] = doc_id
+        if doc.get('processed') is False:
+            db['queue'].add(doc_id)
+        else:
+            db['queue'].discard(doc_id)
+        if not doc_id.startswith('_local/'):
+            db['seq'] += 1
+            db['changes'].pop(doc_id, None)
+            db['changes'][doc_id] = db['seq']
+            self._changed.notify_all()
+        return {'id': doc_id, 'rev': doc['_rev']}
+
+    def _forget(self, db, doc_id):
+        doc = db['docs'].pop(doc_id, None)
+        if doc is not None and '@id' in doc:
+            db['resources'].pop(doc['@id'], None)
+        db['queue'].discard(doc_id)
+
+    def _all_docs(self, db, keys, include_docs):
+        rows = []
+        for key in keys:
+            doc = db['docs'].get(key)
+            if doc is None:
+                rows.append({'key': key, 'error': 'not_found'})
+                continue
+            row = {'id': key, 'key': key, 'value': {'rev': doc['_rev']}}
+            if include_docs:
+                row['doc'] = doc
+            rows.append(row)
+        return {'total_rows': len(db['docs']), 'offset': 0, 'rows': rows}
+
+    def _view(self, db, name, query):
+        if name == 'by_resource':
+            key = json.loads(query['key'])
+            rows = []
+            if key in db['resources']:
+                doc = db['docs'][db['resources'][key]]
+                rows.append({'id': doc['_id'], 'key': key,
+                             'value': {'rev': doc['_rev'], 'g': doc['_id']}})
+            return {'total_rows': len(db['resources']), 'offset': 0, 'rows': rows}
+        if name == 'processing_queue':
+            ids = sorted(db['queue'])
+            if 'startkey' in query:
+                start = json.loads(query['startkey'])
+                ids = [i for i in ids if i >= start]
+            ids = ids[int(query.get('skip', 0)):]
+            if 'limit' in query:
+                ids = ids[:int(query['limit'])]
+            rows = [{'id': i, 'key': i, 'value': db['docs'][i]['@id']} for i in ids]
+            return {'total_rows': len(db['queue']), 'offset': 0, 'rows': rows}
+        raise ValueError('Unknown view "{}"'.format(name))
+
+    def _changes(self, db, query):
+        '''
+        Get the changes of the entries in the processing queue, waiting for
+        some if there is none yet and the feed is a longpoll
+        '''
+        since = int(json.loads(query.get('since', '0')))
+        def pending():
+            return [(seq, doc_id) for (doc_id, seq) in db['changes'].items()
+                    if seq > since and doc_id in db['queue']]
+        changes = pending()
+        if len(changes) == 0 and query.get('feed') == 'longpoll':
+            timeout = int(query.get('timeout', 60000)) / 1000.0
+            self._changed.wait(timeout)
+            changes = pending()
+        results = [{'seq': seq, 'id': doc_id, 'changes': [],
+                    'doc': db['docs'][doc_id]} for (seq, doc_id) in sorted(changes)]
+        return {'results': results, 'last_seq': db['seq']}
+
+class StardogStandIn(StandIn):
+    '''
+    Stand-in for the Stardog API: creating and dropping databases, SPARQL
+    queries and updates evaluated with rdflib over all the named graphs,
+    and the transactions used to write the named graphs
+    '''
+    def __init__(self):
+        '''
+        Constructor
+        '''
+        StandIn.__init__(self)
+        self._databases = {}
+        self._transactions = {}
+
+    def handle(self, method, segments, query, headers, body):
+        with self._lock:
+            if segments[:2] == ['admin', 'databases']:
+                self._count(method + ' databases')
+                return self._admin(method, segments[2:], body)
+            if len(segments) < 2 or segments[0] not in self._databases:
+                return (404, 'text/plain', 'Unknown database')
+            dataset = self._databases[segments[0]]
+            action = segments[1:]
+
+            if action == ['query']:
+                self._count('query')
+                text = dict(parse_qsl(body.decode()))['query']
+                return self._query(dataset, text)
+            if action == ['update']:
+                self._count('update')
+                dataset.update(dict(parse_qsl(body.decode()))['update'])
+                return (200, 'text/plain', '')
+
+            # The transactions only touch the data when they are committed
+            if action == ['transaction', 'begin']:
+                self._count('transaction')
+                identifier = uuid.uuid4().hex
+                self._transactions[identifier] = []
+                return (200, 'text/plain', identifier)
+            if action[:2] == ['transaction', 'commit']:
+                for (operation, argument) in self._transactions.pop(action[2]):
+                    self._apply(dataset, operation, argument)
+                return (200, 'text/plain', '')
+            if action[:2] == ['transaction', 'rollback']:
+                self._transactions.pop(action[2], None)
+                return (200, 'text/plain', '')
+            if len(action) == 2 and action[0] in self._transactions:
+                if action[1] == 'clear':
+                    argument = query['graph-uri']
+                else:
+                    argument = body
+                self._transactions[action[0]].append((action[1], argument))
+                return (200, 'text/plain', '')
+        return (404, 'text/plain', 'Unknown resource')
+
+    def _admin(self, method, segments, body):
+        if method == 'GET':
+            return (200, 'application/json', {'databases': sorted(self._databases)})
+        if method == 'POST':
+            # The options of the database are in the JSON part of the form
+            options = json.loads(re.search(rb'\{.*\}', body, re.S).group(0).decode())
+            self._databases[options['dbname']] = Dataset(default_union=True)
+            return (201, 'text/plain', '')
+        if method == 'DELETE':
+            self._databases.pop(segments[0], None)
+            return (200, 'text/plain', '')
+        return (405, 'text/plain', '')
+
+    def _query(self, dataset, text):
+        result = dataset.query(text)
+        if result.type == 'CONSTRUCT' or result.type == 'DESCRIBE':
+            return (200, 'application/n-triples',
+                    result.graph.serialize(format='nt', encoding='utf-8'))
+        return (200, 'application/sparql-results+json',
+                result.serialize(format='json'))
+
+    def _apply(self, dataset, operation, argument):
+        if operation == 'clear':
+            dataset.graph(URIRef(argument)).remove((None, None, None))
+        elif operation == 'add':
+            dataset.parse(data=argument.decode('utf-8'), format='nquads')
+        elif operation == 'remove':
+            quads = Dataset()
+            quads.parse(data=argument.decode('utf-8'), format='nquads')
+            for (s, p, o, graph_name) in quads.quads((None, None, None, None)):
+                dataset.graph(graph_name).remove((s, p, o))
+        else:
+            raise ValueError('Unknown operation "{}"'.format(operation))
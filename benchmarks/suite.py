@@ -0,0 +1,311 @@
+'''
+Created on 18 Oct 2026
+
+End-to-end benchmarks running entirely on the local machine. A synthetic
+corpus is generated, the stand-ins for CouchDB and Stardog are started in a
+separate process, and then every benchmark runs in a fresh process so that
+its peak memory is its own. The benchmarks depend on each other and always
+run in this order: ingest, process, lookup, search. Run from the root of
+the project with
+
+    python -m benchmarks.suite [BENCHMARK ...] [-q QUADS] [-o RESULTS.JSONL]
+
+Every benchmark prints one JSON object per line, also appended to the
+results file if one is given, so that runs on different commits can be
+compared.
+'''
+from benchmarks.generate import generate
+from benchmarks.standins import CouchDBStandIn, StardogStandIn
+from concurrent.futures import ProcessPoolExecutor
+from configparser import ConfigParser
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import subprocess
+import tempfile
+import time
+
+import logging
+logger = logging.getLogger(__name__)
+
+BENCHMARKS = ['ingest', 'process', 'lookup', 'search']
+
+# The texts searched for by the search benchmark
+SEARCHES = ['Entity 1', 'Entity 42', 'Image no. 67315', 'Henry', 'nothing']
+
+def percentiles(latencies):
+    '''
+    Summarise a list of latencies, in seconds
+
+    @return: a dictionary with the median, 90th and 99th percentiles and
+    the maximum, in milliseconds
+    '''
+    if len(latencies) == 0:
+        return None
+    ordered = sorted(latencies)
+    def rank(fraction):
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000
+    return {'p50': rank(0.5), 'p90': rank(0.9), 'p99': rank(0.99),
+            'max': ordered[-1] * 1000}
+
+def peak_rss():
+    '''
+    Get the peak resident memory of this process and of its children, in
+    kilobytes
+    '''
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+def _result(name, operations, unit, elapsed, latencies, **extra):
+    (rss, children_rss) = peak_rss()
+    result = {'benchmark': name, 'operations': operations,
+              'seconds': round(elapsed, 3),
+              'throughput': round(operations / elapsed, 2) if elapsed > 0 else None,
+              'unit': unit, 'latency_ms': percentiles(latencies),
+              'peak_rss_kb': rss, 'children_peak_rss_kb': children_rss}
+    result.update(extra)
+    return result
+
+def _timed(function, latencies):
+    '''
+    Wrap a function to record how long every call takes
+    '''
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+    return timed
+
+def run_ingest(config_file, corpus, options):
+    '''
+    Load the corpus in the cache. The latencies are those of the batches
+    written to the cache
+    '''
+    from indexer.util.config import Config
+    from indexer.component.ingest import Ingest
+
+    ingest = Ingest(Config(config_file), clean=True)
+    latencies = []
+    ingest.cache.write_entries = _timed(ingest.cache.write_entries, latencies)
+    start = time.perf_counter()
+    ingest.load(corpus, stream=True)
+    elapsed = time.perf_counter() - start
+    return _result('ingest', ingest.summary['written'], 'documents/s', elapsed,
+                   latencies, quads_per_second=round(options['quads'] / elapsed, 2))
+
+def run_process(config_file, corpus, options):
+    '''
+    Process the whole queue. The latencies are those of the documents, some
+    of them include writing a batch to the index. With several workers only
+    the throughput is measured
+    '''
+    from indexer.util.config import Config
+    from indexer.component.process import Process
+
+    processor = Process(Config(config_file), clean=True)
+    uris = list(processor.cache_store.get_processing_queue())
+    latencies = []
+    start = time.perf_counter()
+    if options['workers'] > 1:
+        processor.process_all(uris, options['workers'])
+    else:
+        process = _timed(processor.process, latencies)
+        for uri in uris:
+            process(uri)
+        processor.flush()
+    rewrites = processor.index_store.apply_rewrites()
+    elapsed = time.perf_counter() - start
+    return _result('process', len(uris), 'documents/s', elapsed, latencies,
+                   workers=options['workers'], rewrites=rewrites)
+
+def run_lookup(config_file, corpus, options):
+    '''
+    Find the proxies of entities of the corpus, some of which are unknown
+    '''
+    from indexer.util.config import Config
+    from indexer.storage.index import IndexStore
+
+    index = IndexStore(Config(config_file))
+    rng = random.Random(0)
+    entities = max(10, options['documents'] // 10)
+    uris = ['http://dbpedia.org/resource/Entity_{}'.format(rng.randrange(entities * 2))
+            for _ in range(options['repeat'])]
+    latencies = []
+    lookup = _timed(index.lookup, latencies)
+    start = time.perf_counter()
+    found = len([uri for uri in uris if lookup(uri) is not None])
+    elapsed = time.perf_counter() - start
+    return _result('lookup', len(uris), 'lookups/s', elapsed, latencies,
+                   found=found, local=index.local_equivalences() is not None)
+
+def run_search(config_file, corpus, options):
+    '''
+    Run full text searches against the index
+    '''
+    from indexer.util.config import Config
+    from indexer.storage.index import IndexStore
+
+    index = IndexStore(Config(config_file))
+    searches = [SEARCHES[i % len(SEARCHES)]
+                for i in range(max(1, options['repeat'] // 100))]
+    latencies = []
+    search = _timed(index.search, latencies)
+    start = time.perf_counter()
+    for text in searches:
+        search('http://localhost/search', {'q': text})
+    elapsed = time.perf_counter() - start
+    return _result('search', len(searches), 'searches/s', elapsed, latencies)
+
+RUNNERS = {'ingest': run_ingest, 'process': run_process,
+           'lookup': run_lookup, 'search': run_search}
+
+def _serve(connection):
+    '''
+    Run the stand-ins, answering the requests for their counters until
+    told to stop
+    '''
+    with CouchDBStandIn() as couchdb, StardogStandIn() as stardog:
+        connection.send((couchdb.port, stardog.port))
+        while connection.recv() != 'stop':
+            connection.send({'couchdb': dict(couchdb.requests),
+                             'stardog': dict(stardog.requests)})
+
+def write_config(directory, couchdb_port, stardog_port, local=True,
+                 backend='stardog'):
+    '''
+    Write a configuration file using the stand-ins and keeping all the
+    local files in a directory
+
+    @param local: if False do not use the local index of equivalences
+    @param backend: the backend of the index, stardog or embedded
+    @return: the name of the file
+    '''
+    config = ConfigParser()
+    config.read('config.cfg')
+    config['couchdb']['hostname'] = config['stardog']['hostname'] = '127.0.0.1'
+    config['couchdb']['port'] = str(couchdb_port)
+    config['stardog']['port'] = str(stardog_port)
+    config['cache']['path'] = os.path.join(directory, 'cache.sqlite')
+    for section in ['equivalences', 'rewrites', 'outputs']:
+        config[section]['path'] = os.path.join(directory, section + '.sqlite')
+    if not local:
+        config['equivalences']['path'] = ''
+    config['index']['backend'] = backend
+    config['index']['path'] = os.path.join(directory, 'index.sqlite')
+    file_name = os.path.join(directory, 'benchmark.cfg')
+    with open(file_name, 'w') as config_file:
+        config.write(config_file)
+    return file_name
+
+def _delta(before, after):
+    return dict((service, dict((kind, count - before[service].get(kind, 0))
+                               for (kind, count) in counts.items()
+                               if count != before[service].get(kind, 0)))
+                for (service, counts) in after.items())
+
+def commit():
+    '''
+    Get the commit being benchmarked, if this is a git checkout
+    '''
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(names, quads, output=None, corpus=None, workers=1, repeat=1000,
+        local=True, backend='stardog'):
+    '''
+    Run some benchmarks, and the ones they depend on
+
+    @param names: the names of the benchmarks
+    @param quads: the size of the corpus to generate
+    @param output: the name of a file to append the results to
+    @param corpus: an NQuads file to use instead of generating a corpus
+    @param workers: the number of processes used by the process benchmark
+    @param repeat: the number of lookups, and a hundredth of that of searches
+    @param local: if False look the proxies up in the triple store
+    @param backend: the backend of the index, stardog or embedded
+    @return: the list of results
+    '''
+    last = max(BENCHMARKS.index(name) for name in names)
+    context = multiprocessing.get_context('spawn')
+    directory = tempfile.mkdtemp(prefix='indexer-benchmark-')
+
+    # Get the corpus
+    if corpus is None:
+        corpus = os.path.join(directory, 'corpus.nq')
+        (documents, quads) = generate(corpus, quads)
+    else:
+        with open(corpus, encoding='utf-8') as nquads:
+            quads = sum(1 for _ in nquads)
+        documents = quads // 30
+    options = {'quads': quads, 'documents': documents, 'workers': workers,
+               'repeat': repeat}
+    description = {'commit': commit(), 'quads': quads, 'documents': documents,
+                   'backend': backend}
+
+    # Start the stand-ins
+    (connection, child) = context.Pipe()
+    server = context.Process(target=_serve, args=(child,), daemon=True)
+    server.start()
+    config_file = write_config(directory, *connection.recv(), local=local,
+                               backend=backend)
+
+    results = []
+    try:
+        for name in BENCHMARKS[:last + 1]:
+            connection.send('stats')
+            before = connection.recv()
+            with ProcessPoolExecutor(1, mp_context=context) as executor:
+                result = executor.submit(RUNNERS[name], config_file, corpus,
+                                         options).result()
+            connection.send('stats')
+            result['requests'] = _delta(before, connection.recv())
+            result.update(description)
+            results.append(result)
+
+            line = json.dumps(result, sort_keys=True)
+            print(line)
+            if output is not None:
+                with open(output, 'a') as results_file:
+                    results_file.write(line + '\n')
+    finally:
+        connection.send('stop')
+        server.join()
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the benchmarks')
+    parser.add_argument('benchmarks', nargs='*', default=BENCHMARKS,
+                        help='benchmarks to run among {} (default: all)'.format(
+                            ', '.join(BENCHMARKS)))
+    parser.add_argument('-q', dest='quads', type=int, default=100000,
+                        help='number of quads of the generated corpus')
+    parser.add_argument('-c', dest='corpus', default=None,
+                        help='NQuads file to use instead of a generated corpus')
+    parser.add_argument('-o', dest='output', default=None,
+                        help='file to append the results to, as JSON lines')
+    parser.add_argument('-w', dest='workers', type=int, default=1,
+                        help='number of processes of the process benchmark')
+    parser.add_argument('-n', dest='repeat', type=int, default=1000,
+                        help='number of lookups, a hundredth of that of searches')
+    parser.add_argument('--sparql', action='store_true',
+                        help='look the proxies up in the triple store')
+    parser.add_argument('--embedded', action='store_true',
+                        help='keep the index in the embedded store instead of '
+                        'the Stardog stand-in')
+    args = parser.parse_args()
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error('Unknown benchmark "{}"'.format(name))
+
+    logging.basicConfig(level=logging.WARNING)
+    run(args.benchmarks, args.quads, args.output, args.corpus, args.workers,
+        args.repeat, not args.sparql,
+        'embedded' if args.embedded else 'stardog')
@@ -0,0 +1,116 @@
+'''
+Created on 18 Oct 2026
+
+Compare an rdflib Graph with a TermGraph as the working memory of the
+processor on large synthetic documents: load the triples, replace the
+subjects and the objects by proxies and write the result to an rdflib
+graph. Run from the root of the project with
+
+    python -m benchmarks.termgraph [-s SUBJECTS] [-t TRIPLES] [-n REPEAT]
+'''
+from indexer.util.termgraph import TermGraph
+from rdflib.graph import Graph
+from rdflib.namespace import OWL, RDF, RDFS
+from rdflib.term import Literal, URIRef
+from rdflib.compare import isomorphic
+import argparse
+import time
+import tracemalloc
+
+FOAF_TOPIC = URIRef('http://xmlns.com/foaf/0.1/topic')
+
+def make_document(subjects, triples):
+    '''
+    Generate a document with a number of subjects, each described by a number
+    of triples pointing to the other subjects and with a sameAs link
+    '''
+    graph = Graph()
+    for i in range(subjects):
+        subject = URIRef('http://example.org/thing/{}#id'.format(i))
+        graph.add((subject, RDF.type, OWL.Thing))
+        graph.add((subject, RDFS.label, Literal('Thing {}'.format(i))))
+        graph.add((subject, OWL.sameAs,
+                   URIRef('http://example.com/other/{}'.format(i))))
+        for j in range(triples):
+            target = URIRef('http://example.org/thing/{}#id'.format(
+                (i * 7 + j) % subjects))
+            graph.add((subject, FOAF_TOPIC, target))
+    return graph
+
+def make_replacement(graph):
+    '''
+    Pick a proxy URI for every subject of the graph
+    '''
+    return dict((s, URIRef('http://proxy.org/{}#id'.format(i)))
+                for (i, s) in enumerate(set(graph.subjects())))
+
+def run_rdflib(document, replacement):
+    # This is what the processor used to do with an rdflib graph
+    graph = Graph()
+    for triple in document:
+        graph.add(triple)
+    for (s, p, o) in list(graph):
+        if s in replacement:
+            graph.remove((s, p, o))
+            graph.add((replacement[s], p, o))
+    for (s, p, o) in list(graph):
+        if o in replacement and p != OWL.sameAs:
+            graph.remove((s, p, o))
+            graph.add((s, p, replacement[o]))
+    output = Graph()
+    for triple in graph:
+        output.add(triple)
+    return output
+
+def run_termgraph(document, replacement):
+    graph = TermGraph.from_graph(document)
+    graph.remap_subjects(replacement)
+    graph.remap_objects(replacement, skip_predicate=OWL.sameAs)
+    return graph.to_graph(Graph())
+
+def measured(function, repeat):
+    '''
+    Run a function several times and return its last result, the best time
+    and the peak of memory allocated during the last run
+    '''
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    # Trace the memory separately as tracing slows everything down
+    tracemalloc.start()
+    function()
+    (_, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (result, best, peak)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the working graphs')
+    parser.add_argument('-s', dest='subjects', type=int, default=5000,
+                        help='number of subjects in the document')
+    parser.add_argument('-t', dest='triples', type=int, default=10,
+                        help='number of links from every subject')
+    parser.add_argument('-n', dest='repeat', type=int, default=3,
+                        help='number of runs, the best one is reported')
+    args = parser.parse_args()
+
+    document = make_document(args.subjects, args.triples)
+    replacement = make_replacement(document)
+    print('{} triples, {} subjects'.format(len(document), len(replacement)))
+
+    (expected, rdflib_time, rdflib_peak) = measured(
+        lambda: run_rdflib(document, replacement), args.repeat)
+    (actual, term_time, term_peak) = measured(
+        lambda: run_termgraph(document, replacement), args.repeat)
+
+    # Both must produce the same graph
+    print('Identical results: {}'.format(isomorphic(expected, actual)))
+    for (name, elapsed, peak) in [('rdflib', rdflib_time, rdflib_peak),
+                                  ('termgraph', term_time, term_peak)]:
+        print('{:10} {:10.2f} ms {:12.1f} triples/s {:8.1f} MB peak'.format(
+            name, elapsed * 1000, len(document) / elapsed, peak / 1e6))
+    print('Speed-up: {:.1f}x, memory: {:.1f}x less'.format(
+        rdflib_time / term_time, rdflib_peak / float(term_peak)))
@@ -3,10 +3,11 @@ import os
 
 from flask import render_template, send_from_directory, request, redirect, g
 from flask.helpers import make_response, url_for
-from indexer.storage.proxy import ProxyStore
-from indexer.storage.collection import CollectionStore
+from indexer.storage.index import IndexStore
+from indexer.component.processors.collection import CollectionStore
 from indexer.app import application, configuration
 from indexer.app.conneg import negotiate, SUFFIX_TO_MIME
+from indexer.util.metrics import REGISTRY
 from rdflib.graph import Graph
 
 # Debug logging
@@ -32,16 +33,17 @@ def redirect_with_args(target, args):
     response.headers['Accept'] = request.headers['Accept']
     return response
     
+# The stores are shared by all the requests, and so are their pooled
+# connections to the triple store. They are created once when the
+# application starts so that concurrent requests never build their own
+stores = {'proxies': IndexStore(configuration),
+          'collections': CollectionStore(configuration)}
+
 @application.before_request
 def before_request():
-    # Instantiate the proxy store and collections store
-    g.proxies = ProxyStore(base = configuration.base(), store = configuration.stardog())
-    g.collections = CollectionStore(base = configuration.base(), store = configuration.stardog())
-
-@application.teardown_request
-def teardown_request(exception):
-    g.proxies.close()
-    g.collections.close()
+    # Use the proxy store and collections store of the application
+    g.proxies = stores['proxies']
+    g.collections = stores['collections']
     
 @application.route('/', methods=['GET'])
 def home():
@@ -66,6 +68,15 @@ def index():
     
     return negotiate(graph, 'content.html', request)
     
+@application.route('/metrics', methods=['GET'])
+def metrics():
+    '''
+    Expose the metrics of this process in the Prometheus text format
+    '''
+    response = make_response(REGISTRY.render(), 200)
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return response
+    
 @application.route('/<identifier>', methods=['GET'])
 def get_resource(identifier):
     '''
@@ -0,0 +1,218 @@
+'''
+Created on 18 Oct 2026
+
+Rule engine matching the conditions of the rules directly against the
+indexes of the input graph. Rules made of a single basic graph pattern are
+compiled into a native matcher, the other ones are run with the SPARQL
+evaluator of rdflib
+'''
+from rdflib.namespace import RDF
+from rdflib.term import BNode, URIRef, Variable
+from indexer.util.profiling import rule_timer
+
+import logging
+logger = logging.getLogger(__name__)
+
+def is_valid(triple):
+    '''
+    Returns True if a triple produced by a rule is valid RDF. As for a SPARQL
+    CONSTRUCT the triples with a literal as subject or anything else than a
+    URI as predicate are not part of the result
+    '''
+    (s, p, _) = triple
+    return isinstance(s, (URIRef, BNode)) and isinstance(p, URIRef)
+
+class CompiledRule(object):
+    '''
+    A rule made of a basic graph pattern in its condition and a template of
+    triples to produce for every match of that pattern
+    '''
+    def __init__(self, name, patterns, template):
+        '''
+        Constructor
+
+        @param name: the name of the rule
+        @param patterns: the triple patterns of the condition
+        @param template: the triple patterns of the result
+        '''
+        self.name = name
+        self.patterns = list(patterns)
+        self.template = list(template)
+
+        # The predicates and types the graph must contain for the rule to
+        # match anything
+        self.predicates = set(p for (_, p, _) in self.patterns
+                              if not isinstance(p, Variable))
+        self.types = set(o for (_, p, o) in self.patterns
+                         if p == RDF.type and not isinstance(o, Variable))
+
+        # The order in which the patterns are joined
+        self._plan = self._order()
+
+    def _order(self):
+        '''
+        Returns the patterns in the order they should be joined: the pattern
+        with the most terms known is always matched first
+        '''
+        ordered = []
+        remaining = list(self.patterns)
+        bound = set()
+        while len(remaining) > 0:
+            def known(pattern):
+                return len([t for t in pattern
+                            if not isinstance(t, Variable) or t in bound])
+            pattern = max(remaining, key=known)
+            remaining.remove(pattern)
+            ordered.append(pattern)
+            bound.update(t for t in pattern if isinstance(t, Variable))
+        return ordered
+
+    def matches(self, graph):
+        '''
+        Generator over the solutions of the condition in the graph, as
+        dictionaries variable -> term
+        '''
+        patterns = self._plan
+
+        def solve(index, binding):
+            if index == len(patterns):
+                yield binding
+                return
+            pattern = [binding.get(t, t) if isinstance(t, Variable) else t
+                       for t in patterns[index]]
+            query = tuple(None if isinstance(t, Variable) else t
+                          for t in pattern)
+            for triple in graph.triples(query):
+                extended = dict(binding)
+                consistent = True
+                for (term, value) in zip(pattern, triple):
+                    if isinstance(term, Variable):
+                        if extended.setdefault(term, value) != value:
+                            consistent = False
+                            break
+                if consistent:
+                    for solution in solve(index + 1, extended):
+                        yield solution
+
+        return solve(0, {})
+
+    def apply(self, output_graph, input_graph):
+        '''
+        Add the result of the rule in the output graph
+
+        @return: the number of solutions found
+        '''
+        count = 0
+        for binding in self.matches(input_graph):
+            count = count + 1
+            for pattern in self.template:
+                triple = tuple(binding.get(t) if isinstance(t, Variable) else t
+                               for t in pattern)
+                if None not in triple and is_valid(triple):
+                    output_graph.add(triple)
+        return count
+
+def _unwrap(node):
+    '''
+    Get the basic graph pattern under the projections of a parsed query, or
+    None if the pattern is anything more complex than that
+    '''
+    while getattr(node, 'name', None) == 'Project':
+        node = node['p']
+    if getattr(node, 'name', None) == 'BGP':
+        return node['triples']
+    return None
+
+def compile_rule(name, query):
+    '''
+    Compile a prepared CONSTRUCT query into a native rule
+
+    @param name: the name of the rule
+    @param query: the query returned by prepareQuery
+    @return: a CompiledRule or None if the query can not be compiled
+    '''
+    algebra = query.algebra
+    if algebra.name != 'ConstructQuery' or algebra.get('datasetClause'):
+        return None
+    patterns = _unwrap(algebra['p'])
+    if patterns is None or len(patterns) == 0:
+        return None
+    template = algebra['template']
+    if any(isinstance(t, BNode) for pattern in template for t in pattern):
+        return None
+    if any(isinstance(t, BNode) for pattern in patterns for t in pattern):
+        return None
+    return CompiledRule(name, patterns, template)
+
+class RuleEngine(object):
+    '''
+    Apply a set of rules to graphs. The compiled rules are indexed by the
+    predicates and types they need so that only the rules which can match
+    something are evaluated
+    '''
+    def __init__(self, rules):
+        '''
+        Constructor
+
+        @param rules: a dictionary name -> query returned by prepareQuery
+        '''
+        self.compiled = []
+        self.fallback = {}
+        for (name, query) in rules.items():
+            rule = compile_rule(name, query)
+            if rule is None:
+                logger.info('Rule {} will be evaluated with SPARQL'.format(name))
+                self.fallback[name] = query
+            else:
+                self.compiled.append(rule)
+
+        # Index the compiled rules by the predicates and types they need
+        self._by_predicate = {}
+        self._by_type = {}
+        for rule in self.compiled:
+            for predicate in rule.predicates:
+                self._by_predicate.setdefault(predicate, []).append(rule)
+            for rdf_type in rule.types:
+                self._by_type.setdefault(rdf_type, []).append(rule)
+
+    def __len__(self):
+        return len(self.compiled) + len(self.fallback)
+
+    def candidates(self, graph):
+        '''
+        Get the compiled rules whose predicates and types are all in the graph
+        '''
+        missing = set()
+        for (predicate, rules) in self._by_predicate.items():
+            if (None, predicate, None) not in graph:
+                missing.update(rules)
+        for (rdf_type, rules) in self._by_type.items():
+            if (None, RDF.type, rdf_type) not in graph:
+                missing.update(rules)
+        return [rule for rule in self.compiled if rule not in missing]
+
+    def apply(self, output_graph, input_graph, profiler=None):
+        '''
+        Execute all the rules against the input graph and put the result in
+        the output graph
+
+        @param output_graph: the target graph to put the result of the rules in
+        @param input_graph: the data graph to process in search for entities
+        @param profiler: the Profiler recording the cost of every rule, if any
+        '''
+        timed = rule_timer(profiler)
+        for rule in self.candidates(input_graph):
+            with timed(rule.name) as stats:
+                stats['matches'] = rule.apply(output_graph, input_graph)
+            if stats['matches'] > 0:
+                logger.debug('Found a match for {}'.format(rule.name))
+
+        for (name, query) in self.fallback.items():
+            with timed(name) as stats:
+                tmp_graph = input_graph.query(query).graph
+                stats['matches'] = len(tmp_graph)
+                for st in tmp_graph:
+                    if is_valid(st):
+                        output_graph.add(st)
+            if stats['matches'] > 0:
+                logger.debug('Found a match for {}'.format(name))
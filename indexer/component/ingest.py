@@ -3,12 +3,233 @@ Created on 8 Jul 2016
 
 @author: guerec01
 '''
-from rdflib.graph import Dataset
-from indexer.storage.cache import CacheStore
+from rdflib.graph import Dataset, Graph
+from rdflib.term import URIRef
+from indexer.storage.cache import CacheStore, prepare_entry
+from indexer.util.metrics import REGISTRY, INGEST_SECONDS
+from queue import Empty
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import heapq
+import itertools
+import multiprocessing
+import tempfile
+import zlib
 
 import logging
 logger = logging.getLogger(__name__)
 
+def split_nquad(line):
+    '''
+    Utility function to split an NQuad statement into the NTriple statement
+    it contains and the name of the graph it belongs to. The graph name is
+    None for statements in the default graph
+
+    @param line: a line from an NQuads file
+    @return: a tuple (ntriple, graph_name) or None if the line is empty or
+    a comment
+    '''
+    line = line.strip()
+    if line == '' or line.startswith('#'):
+        return None
+
+    # Skip over the subject, the predicate and the object. The object is the
+    # only term that can contain spaces (literals) so it needs a bit of care
+    position = 0
+    for _ in range(3):
+        while line[position] in ' \t':
+            position += 1
+        if line[position] == '"':
+            # Find the closing quote, ignoring the escaped ones
+            position += 1
+            while line[position] != '"':
+                position += 2 if line[position] == '\\' else 1
+            position += 1
+            # Skip over the language tag or the datatype
+            while position < len(line) and line[position] not in ' \t':
+                if line[position] == '<':
+                    position = line.index('>', position)
+                position += 1
+        elif line[position] == '<':
+            position = line.index('>', position) + 1
+        else:
+            while line[position] not in ' \t':
+                position += 1
+
+    # What remains is the optional graph name followed by the final dot
+    rest = line[position:].strip()[:-1].strip()
+    graph_name = rest.strip('<>') if rest != '' else None
+    return (line[:position] + ' .\n', graph_name)
+
+def graph_token(line):
+    '''
+    Utility function to quickly get the last term of an NQuad statement,
+    which is the name of the graph if the statement has one. This is much
+    cheaper than split_nquad() and is used to decide whether a statement
+    needs to be looked at at all
+    '''
+    tokens = line.rstrip()[:-1].rsplit(None, 1)
+    return tokens[-1].strip('<>') if len(tokens) > 0 else ''
+
+def get_shard(graph_name, shards):
+    '''
+    Utility function to assign a graph to a shard. This has to give the
+    same result in all the processes, so we can not rely on hash()
+    '''
+    return zlib.crc32(graph_name.encode()) % shards
+
+def read_statements(nquad_file_name, shard=0, shards=1):
+    '''
+    Read the statements of an NQuad file one by one. Only the statements of
+    the graphs named with an HTTP URI and assigned to the shard are read
+
+    @return: a generator of (graph name, ntriple) tuples
+    '''
+    with open(nquad_file_name, 'r', encoding='utf-8') as nquad_file:
+        lines = nquad_file
+        if shards > 1:
+            lines = (line for line in lines
+                     if get_shard(graph_token(line), shards) == shard)
+        statements = (split_nquad(line) for line in lines)
+        for (t, g) in filter(None, statements):
+            if g is not None and g.startswith('http://'):
+                yield (g, t)
+
+def read_graphs(nquad_file_name, chunk_size, shard=0, shards=1):
+    '''
+    Read the graphs contained in an NQuad file one by one without keeping
+    more than one graph in memory. As long as the statements of every graph
+    are next to each other in the file, a graph is returned as soon as the
+    next one starts. If a graph comes back after it was returned, the
+    whole file is read again with its quads sorted by graph name in chunks
+    which are spilled to disk and then merged back together. The graphs
+    which came back are then returned again with all their triples, the
+    others which were already returned are skipped. Only the graphs named
+    with an HTTP URI are returned.
+    
+    @param nquad_file_name: the name of the file to read
+    @param chunk_size: the number of quads to sort in memory
+    @param shard: the shard to read, only the graphs assigned to it are read
+    @param shards: the total number of shards
+    @return: a generator of (uri, graph) tuples
+    '''
+    # Return the graphs as they come while the file is grouped by graph
+    returned = set()
+    (current, triples) = (None, [])
+    stop = 0
+    for (stop, (uri, ntriple)) in enumerate(read_statements(nquad_file_name,
+                                                            shard, shards)):
+        if uri != current:
+            if uri in returned:
+                break
+            if current is not None:
+                yield parse_graph(current, triples)
+                returned.add(current)
+            (current, triples) = (uri, [])
+        triples.append(ntriple)
+    else:
+        if current is not None:
+            yield parse_graph(current, triples)
+        return
+    logger.warning('The graphs of {} are not grouped, sorting it'.format(nquad_file_name))
+    
+    # Note the graphs which came back after they were returned while the
+    # file is sorted, they have to be returned again
+    reopened = set()
+    def statements():
+        for (position, (uri, ntriple)) in enumerate(read_statements(
+                nquad_file_name, shard, shards)):
+            if position >= stop and uri in returned:
+                reopened.add(uri)
+            yield (uri, ntriple)
+    for (uri, triples) in sort_statements(statements(), chunk_size):
+        if uri not in returned or uri in reopened:
+            yield parse_graph(uri, triples)
+
+def sort_statements(statements, chunk_size):
+    '''
+    Sort statements by graph name in chunks which are spilled to disk and
+    then merged back together. All the statements are read before the
+    first graph is returned
+    
+    @param statements: an iterable of (graph name, ntriple) tuples
+    @param chunk_size: the number of statements to sort in memory
+    @return: a generator of (graph name, ntriples) tuples
+    '''
+    # Sort the statements into a set of sorted runs
+    runs = []
+    while True:
+        chunk = list(itertools.islice(statements, chunk_size))
+        if len(chunk) == 0:
+            break
+        chunk.sort(key=lambda statement: statement[0])
+        runs.append(chunk)
+        
+        # Spill to disk unless everything fitted in the first chunk
+        if len(chunk) == chunk_size or len(runs) > 1:
+            runs[-1] = spill(chunk)
+    logger.debug('Sorted the quads into {} run(s)'.format(len(runs)))
+    
+    # Merge all the runs and return the graphs one by one
+    merged = heapq.merge(*runs, key=lambda statement: statement[0])
+    for (uri, group) in itertools.groupby(merged, key=lambda s: s[0]):
+        yield (uri, [t for (_, t) in group])
+
+def parse_graph(uri, triples):
+    '''
+    Parse the NTriples statements of a graph
+
+    @return: a tuple (uri, graph)
+    '''
+    with INGEST_SECONDS.time(step='parse'):
+        graph = Graph()
+        graph.parse(data=''.join(triples), format='nt')
+    return (URIRef(uri), graph)
+
+def spill(chunk):
+    '''
+    Write a sorted chunk of statements to a temporary file and return an
+    iterator reading them back
+    '''
+    spill_file = tempfile.TemporaryFile(mode='w+', encoding='utf-8')
+    for (graph_name, ntriple) in chunk:
+        spill_file.write('{}\t{}'.format(graph_name, ntriple))
+    spill_file.seek(0)
+    return (tuple(line.split('\t', 1)) for line in spill_file)
+
+def _init_worker(queue):
+    '''
+    Initialise an ingest worker process with the queue used to send the
+    prepared entries back
+    '''
+    global _queue
+    _queue = queue
+    
+    # Forget the metrics inherited from the parent, they are counted there
+    REGISTRY.snapshot()
+
+def _ingest_job(job):
+    '''
+    Read one shard of a file in a worker process and send the prepared
+    entries back in batches. The metrics of the worker are always sent
+    once the job is over
+    '''
+    (nquad_file_name, shard, shards, chunk_size, batch_size, codec,
+     filters) = job
+    try:
+        batch = []
+        for (uri, graph) in read_graphs(nquad_file_name, chunk_size,
+                                        shard, shards):
+            with INGEST_SECONDS.time(step='prepare'):
+                batch.append(prepare_entry(uri, graph, codec, **filters))
+            if len(batch) >= batch_size:
+                _queue.put(batch)
+                batch = []
+        if len(batch) > 0:
+            _queue.put(batch)
+    finally:
+        _queue.put(REGISTRY.snapshot())
+
 class Ingest(object):
     '''
     This class provides the higher level interface to the cache store
@@ -20,19 +241,50 @@ class Ingest(object):
         # Get an instance of the cache interface
         self.cache = CacheStore(config)
     
+        # Number of quads to sort in memory before spilling to disk
+        self.chunk_size = config.ingest_chunk_size()
+        
+        # Graphs waiting to be written to the cache in one batch
+        self.batch_size = config.couchdb_batch_size()
+        self.batch = []
+        
+        # Keep track of what happened to the graphs
+        self.summary = {'written': 0, 'skipped': 0, 'deduplicated': 0,
+                        'pruned': 0, 'conflicts': []}
+
         # If we want to clean the DB, do it
         if clean:
             self.cache.reset_db()
             
-    def load(self, nquad_file_name):
+    def load(self, nquad_file_name, stream=False):
         '''
         Load the content of an NQuad file into the cache
+
+        @param nquad_file_name: the name of the file to load
+        @param stream: if True read the file line by line instead of loading
+        it entirely in memory
         '''
         logger.info('Loading {}'.format(nquad_file_name))
         
+        # Read the graphs and push them to the cache
+        if stream:
+            self._load_stream(nquad_file_name)
+        else:
+            self._load_dataset(nquad_file_name)
+        
+        # Write the last batch and report what was done
+        self._flush()
+        self._report()
+    
+    def _load_dataset(self, nquad_file_name):
+        '''
+        Load the content of an NQuad file in memory and push all the graphs
+        it contains to the cache
+        '''
         # Load the NQuads
-        g = Dataset()
-        g.parse(nquad_file_name, format='nquads')
+        with INGEST_SECONDS.time(step='parse'):
+            g = Dataset()
+            g.parse(nquad_file_name, format='nquads')
         
         # For each graph in the dataset
         for graph in g.graphs():
@@ -40,4 +292,115 @@ class Ingest(object):
             if uri.startswith('http://'):
                 # Push the graph to the cache
                 logger.info('Found graph {}'.format(uri))
-                self.cache.store(uri, g.graph(graph))
+                self._push(uri, g.graph(graph))
+
+    def _load_stream(self, nquad_file_name):
+        '''
+        Load the content of an NQuad file into the cache without keeping more
+        than a batch of graphs in memory
+        '''
+        for (uri, graph) in read_graphs(nquad_file_name, self.chunk_size):
+            logger.info('Found graph {}'.format(uri))
+            self._push(uri, graph)
+    
+    def load_all(self, nquad_file_names, workers, shards=1):
+        '''
+        Load the content of several NQuad files into the cache using a pool
+        of processes. The workers parse, filter and serialise the graphs and
+        hand them over to this process which is the only one writing to the
+        cache.
+        
+        @param nquad_file_names: the names of the files to load
+        @param workers: the number of worker processes
+        @param shards: the number of shards to split every file into
+        '''
+        logger.info('Loading {} file(s) using {} worker(s)'.format(
+            len(nquad_file_names), workers))
+        
+        # Every file is split into shards processed independently
+        jobs = [(nquad_file_name, shard, shards, self.chunk_size, self.batch_size,
+                 self.cache.codec, self.cache.filters)
+                for nquad_file_name in nquad_file_names
+                for shard in range(shards)]
+        
+        # Start the workers, they report their batches using a shared queue
+        queue = multiprocessing.Queue(maxsize=workers * 2)
+        executor = ProcessPoolExecutor(workers, initializer=_init_worker,
+                                       initargs=(queue,))
+        try:
+            futures = [executor.submit(_ingest_job, job) for job in jobs]
+            
+            # Write the batches as they come, until all the jobs are done
+            pending = len(jobs)
+            while pending > 0:
+                try:
+                    batch = queue.get(timeout=1)
+                except Empty:
+                    # A worker killed by a signal or by the system takes the
+                    # pool down, stop waiting for its batches
+                    for future in futures:
+                        if future.done() and isinstance(future.exception(),
+                                                        BrokenProcessPool):
+                            raise future.exception()
+                    # Stop waiting if the workers stopped without notice
+                    if all(future.done() for future in futures) and queue.empty():
+                        break
+                    continue
+                if isinstance(batch, dict):
+                    # A job is over, keep the metrics of its worker
+                    REGISTRY.merge(batch)
+                    pending -= 1
+                else:
+                    self._write(batch)
+            
+            # Report what was done, this also raises the errors of the workers
+            self._report()
+            for future in futures:
+                future.result()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def _push(self, uri, graph):
+        '''
+        Add a graph to the current batch and write the batch to the cache
+        once it is full
+        '''
+        self.batch.append((uri, graph))
+        if len(self.batch) >= self.batch_size:
+            self._flush()
+    
+    def _flush(self):
+        '''
+        Write the current batch of graphs to the cache
+        '''
+        if len(self.batch) == 0:
+            return
+        entries = []
+        for (uri, graph) in self.batch:
+            with INGEST_SECONDS.time(step='prepare'):
+                entries.append(prepare_entry(uri, graph, **self.cache.filters))
+        self._write(entries)
+        self.batch = []
+    
+    def _write(self, entries):
+        '''
+        Write a batch of prepared entries to the cache and keep track of
+        the outcome
+        '''
+        logger.debug('Writing {} graph(s) to the cache'.format(len(entries)))
+        summary = self.cache.write_entries(entries)
+        for (key, value) in summary.items():
+            self.summary[key] += value
+    
+    def _report(self):
+        '''
+        Report what happened to all the graphs loaded so far
+        '''
+        logger.info('{} graph(s) written ({} deduplicated), {} unchanged '
+                    'skipped, {} triple(s) pruned'.format(
+                        self.summary['written'], self.summary['deduplicated'],
+                        self.summary['skipped'], self.summary['pruned']))
+        if len(self.summary['conflicts']) > 0:
+            logger.warning('{} graph(s) could not be stored because of a '
+                           'conflict'.format(len(self.summary['conflicts'])))
+
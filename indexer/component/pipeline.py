@@ -0,0 +1,155 @@
+'''
+Created on 18 Oct 2026
+
+Staged processing of the queue. The stages of Process run concurrently and
+hand the jobs over to each other through bounded queues, so that fetching
+documents, applying the rules, resolving the proxies and writing to the
+index overlap instead of running one after the other for every entry
+'''
+from concurrent.futures import ThreadPoolExecutor
+from indexer.util.metrics import PROCESS_DOCUMENTS
+import asyncio
+import time
+
+import logging
+logger = logging.getLogger(__name__)
+
+class Pipeline(object):
+    '''
+    Run the stages of a Process over a stream of entries. The stages talking
+    to the stores have several tasks working at the same time, the CPU
+    bound stage has only one as it is limited by the interpreter anyway.
+    The blocking calls run in thread pools driven by an asyncio event loop.
+    '''
+    def __init__(self, processor, concurrency=4, queue_size=16):
+        '''
+        Constructor
+
+        @param processor: the Process instance to use
+        @param concurrency: the number of tasks of every network stage
+        @param queue_size: the maximum number of jobs waiting between two
+        stages
+        '''
+        self.processor = processor
+        self.queue_size = queue_size
+
+        # The stages as (name, function, number of tasks, CPU bound)
+        self.stages = [('retrieve', processor.retrieve, concurrency, False),
+                       ('derive', processor.derive, 1, True),
+                       ('resolve', processor.resolve, concurrency, False),
+                       ('write', processor.write, concurrency, False)]
+
+        # The counters
+        self.stats = dict((name, {'jobs': 0, 'failed': 0, 'seconds': 0.0})
+                          for (name, _, _, _) in self.stages)
+
+    def run(self, entries):
+        '''
+        Process all the entries. The entries which can not be processed are
+        skipped, as are those of the batches which can not be written to the
+        index. Only the entries written are acknowledged
+
+        @param entries: an iterable over the URIs of the entries to process
+        @return: the number of entries written to the index
+        '''
+        start = time.time()
+        stored = PROCESS_DOCUMENTS.value(outcome='stored')
+        asyncio.run(self._run(iter(entries)))
+        if not self.processor.flush():
+            logger.error('Could not store the last batch')
+            self.stats['write']['failed'] += 1
+        stored = PROCESS_DOCUMENTS.value(outcome='stored') - stored
+        elapsed = time.time() - start
+
+        # Report on the time spent in every stage, the slowest one is the
+        # limit to the throughput
+        logger.info('Processed {} entries in {:.1f}s, {} written to the index'.format(
+            self.stats['write']['jobs'], elapsed, stored))
+        for (name, stats) in self.stats.items():
+            logger.info('Stage {}: {} jobs, {} failed, {:.1f}s busy'.format(
+                name, stats['jobs'], stats['failed'], stats['seconds']))
+        return stored
+
+    async def _run(self, entries):
+        io_tasks = sum(tasks for (_, _, tasks, cpu) in self.stages if not cpu)
+        io_executor = ThreadPoolExecutor(io_tasks + 1)
+        cpu_executor = ThreadPoolExecutor(1)
+        try:
+            # One queue in front of every stage
+            queues = [asyncio.Queue(self.queue_size) for _ in self.stages]
+            coroutines = [self._feed(entries, queues[0], self.stages[0][2],
+                                     io_executor)]
+            for (index, (name, function, tasks, cpu)) in enumerate(self.stages):
+                if index + 1 < len(self.stages):
+                    (outbox, consumers) = (queues[index + 1], self.stages[index + 1][2])
+                else:
+                    (outbox, consumers) = (None, 0)
+                executor = cpu_executor if cpu else io_executor
+                coroutines.append(self._stage(name, function, tasks, executor,
+                                              queues[index], outbox, consumers))
+            await asyncio.gather(*coroutines)
+        finally:
+            io_executor.shutdown()
+            cpu_executor.shutdown()
+
+    async def _feed(self, entries, outbox, consumers, executor):
+        '''
+        Send the entries to the first stage. Reading the entries may block,
+        for instance when following the queue, so this is done in a thread
+        '''
+        loop = asyncio.get_running_loop()
+        while True:
+            uri = await loop.run_in_executor(executor, next, entries, None)
+            if uri is None:
+                break
+            await outbox.put(uri)
+
+        # Tell all the tasks of the first stage to stop
+        for _ in range(consumers):
+            await outbox.put(None)
+
+    async def _stage(self, name, function, tasks, executor, inbox, outbox,
+                     consumers):
+        '''
+        Run the tasks of a stage until they all got a None from the inbox,
+        then tell the tasks of the next stage to stop
+        '''
+        loop = asyncio.get_running_loop()
+        stats = self.stats[name]
+
+        async def work():
+            while True:
+                job = await inbox.get()
+                if job is None:
+                    return
+                start = time.time()
+                try:
+                    result = await loop.run_in_executor(executor, function, job)
+                except Exception:
+                    uri = job['uri'] if isinstance(job, dict) else job
+                    logger.exception('Stage {} failed on {}'.format(name, uri))
+                    stats['failed'] += 1
+                    PROCESS_DOCUMENTS.inc(outcome='failed')
+                    
+                    # Move past the entry in the queue, it stays marked as
+                    # not processed for the next run over the whole queue
+                    if self.processor.acknowledge is not None:
+                        self.processor.acknowledge(uri)
+                    continue
+                finally:
+                    stats['seconds'] += time.time() - start
+                
+                # The batch written with the job could not be stored, its
+                # entries are not acknowledged and stay in the queue
+                if result is False:
+                    logger.error('Could not store the batch written with {}'.format(job['uri']))
+                    stats['failed'] += 1
+                    continue
+                stats['jobs'] += 1
+                if outbox is not None:
+                    await outbox.put(result)
+
+        await asyncio.gather(*[work() for _ in range(tasks)])
+        if outbox is not None:
+            for _ in range(consumers):
+                await outbox.put(None)
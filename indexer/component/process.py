@@ -8,9 +8,25 @@ from indexer.storage.index import IndexStore
 from urllib.parse import urlparse
 from rdflib.namespace import RDF, OWL, FOAF, RDFS
 from rdflib.graph import Dataset, Graph
-from indexer.util.namespaces import INDEXER, PROV
+from indexer.util.namespaces import PROV
+from indexer.util.rules import read_rules
+from indexer.util.unionfind import UnionFind
+from indexer.util.termgraph import TermGraph
+from indexer.util.metrics import REGISTRY, PROCESS_SECONDS, PROCESS_DOCUMENTS, PROXIES_MINTED
+from indexer.util.profiling import Profiler
+from indexer.component.engine import RuleEngine
 from rdflib.plugins.sparql.processor import prepareQuery
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.managers import BaseManager
+import functools
 import hashlib
+import itertools
+import multiprocessing
+import os
+import signal
+import threading
+import time
 
 import logging
 from rdflib.term import URIRef, Literal, BNode
@@ -18,6 +34,112 @@ import uuid
 import datetime
 logger = logging.getLogger(__name__)
 
+# Number of times a chunk of entries is tried again after it took a worker
+# down
+MAX_ATTEMPTS = 3
+
+# Number of seconds between two progress reports of the workers
+REPORT_INTERVAL = 30
+
+# Error reported by a worker for the entries of a batch it could not store
+STORE_FAILED = 'Could not store the batch'
+
+class ProxyRegistry(object):
+    '''
+    The proxies assigned to URIs which are not in the index yet. Every
+    Process has its own for the documents waiting in its batch, the workers
+    of a pool share one living in a manager process. It is only used while
+    holding the minting lock
+    '''
+    def __init__(self):
+        self._proxies = {}
+        
+    def get_many(self, uris):
+        return dict((uri, self._proxies[uri]) for uri in uris
+                    if uri in self._proxies)
+    
+    def update(self, proxies):
+        self._proxies.update(proxies)
+    
+    def remove(self, proxies):
+        '''
+        Forget the proxies which are now in the index, unless they have
+        been changed in the meantime
+        '''
+        for (uri, proxy) in proxies.items():
+            if self._proxies.get(uri) == proxy:
+                del self._proxies[uri]
+
+class RegistryManager(BaseManager):
+    pass
+
+RegistryManager.register('ProxyRegistry', ProxyRegistry)
+
+# The processor of a worker process
+_processor = None
+
+def _profiled(stage):
+    '''
+    Decorate a stage of Process to record its cost for the document when a
+    profiler is set
+    '''
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(self, job):
+            if self.profiler is None:
+                return function(self, job)
+            uri = job if isinstance(job, str) else job['uri']
+            with self.profiler.stage(uri, stage):
+                return function(self, job)
+        return wrapper
+    return decorator
+
+def _init_worker(config, registry, lock, plan, batch_size, profile):
+    '''
+    Initialise a processing worker with its own connections to the stores
+    and the shared registry of proxies
+    '''
+    global _processor
+    # Interruptions are dealt with by the main process
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _processor = Process(config)
+    _processor.registry = registry
+    _processor.registry_lock = lock
+    _processor.proxy_plan = plan
+    _processor.batch_size = batch_size
+    if profile:
+        _processor.profiler = Profiler()
+    
+    # Forget the metrics inherited from the parent, they are counted there
+    REGISTRY.snapshot()
+
+def _process_job(uris):
+    '''
+    Process a chunk of entries in a worker process and write them to the
+    index in one batch
+    
+    @return: a tuple (worker, results, metrics, profile) with a tuple (uri,
+    success, error) for every entry, the metrics collected by the worker
+    since the last chunk and what its profiler recorded, if any
+    '''
+    results = []
+    for uri in uris:
+        try:
+            results.append([uri, _processor.process(uri), None])
+        except Exception as e:
+            logger.exception('Failed to process {}'.format(uri))
+            results.append([uri, False, repr(e)])
+    
+    # Write what is left, if that fails none of these entries was stored
+    if not _processor.flush():
+        for result in results:
+            if result[1]:
+                result[1:] = [False, STORE_FAILED]
+    profile = None
+    if _processor.profiler is not None:
+        profile = _processor.profiler.snapshot()
+    return (os.getpid(), [tuple(result) for result in results],
+            REGISTRY.snapshot(), profile)
 
 class Process(object):
     '''
@@ -28,6 +150,7 @@ class Process(object):
         Constructor
         '''
         # Get the base for minting URIs
+        self.config = config
         self.base = config.base()
         
         # Load the rules
@@ -40,50 +163,156 @@ class Process(object):
         # Create an instance of the proxies interface
         self.index_store = IndexStore(config)
         
+        # The proxies assigned in advance to the equivalence classes
+        self.proxy_plan = {}
+        
+        # The proxies assigned but not written to the index yet, by this
+        # process and by the others when running in a pool
+        self.registry = ProxyRegistry()
+        self.registry_lock = threading.Lock()
+        
+        # The processed entries waiting to be written to the index
+        self.batch_size = config.stardog_transaction_size()
+        self._batch = []
+        self._batch_lock = threading.Lock()
+        
+        # The Profiler recording the cost of the rules and documents, if any
+        self.profiler = None
+        
+        # A function called with the URI of every entry written to the
+        # index, if any, when following the queue
+        self.acknowledge = None
+        
         # If clean, reset the index DB
         if clean:
             self.index_store.reset_db()
         
     def process(self, uri):
         '''
-        Process one entry from the cache
+        Process one entry from the cache. The result is written to the index
+        with the next batch, flush() must be called once all the entries
+        are processed
+        
+        @return: False if writing a batch to the index failed
         '''
         logger.info('Processing {}'.format(uri))
-
+        
+        # Go through all the stages one after the other
+        try:
+            job = self.retrieve(uri)
+            job = self.derive(job)
+            job = self.resolve(job)
+            return self.write(job)
+        except Exception:
+            PROCESS_DOCUMENTS.inc(outcome='failed')
+            raise
+    
+    @PROCESS_SECONDS.timed(stage='retrieve')
+    @_profiled('retrieve')
+    def retrieve(self, uri):
+        '''
+        First stage of the processing: get the graph from the cache
+        
+        @return: the job passed on to the next stages, as a dictionary
+        '''
         # Keep track of the starting time
         start_time = Literal(datetime.datetime.now())
             
         # Retrieve the graph
         input_graph = self.cache_store.retrieve(uri)
         
-        # We define a named graph with the hash of the source. This way
+        return {'uri': uri, 'start_time': start_time, 'input_graph': input_graph}
+    
+    @PROCESS_SECONDS.timed(stage='rules')
+    @_profiled('rules')
+    def derive(self, job):
+        '''
+        Second stage of the processing: apply the rules to the graph
+        '''
+        # We define a named graph with the hash of the source. This way
         # different versions of the same document will overwrite the triples
         # previously generated from it        
-        hashed_uri = hashlib.sha256(uri.encode()).hexdigest()
+        hashed_uri = hashlib.sha256(job['uri'].encode()).hexdigest()
         named_graph_base = URIRef('{}{}'.format(self.base, hashed_uri))
-        
-        # Defined a number of graph URIs
-        named_graph_uri = named_graph_base + "#id"
-        prov_uri = named_graph_base + "#prov"
         data_uri = named_graph_base + "#data"
-        activity_uri = BNode()
         
-        # Initialise the data set that will be generated from processing
-        # the graph.
-        dataset = Dataset()
+        # Initialise the working graph that will be generated from processing
+        # the graph. It is only turned into an rdflib data set when written
+        data_graph = TermGraph()
         
         # Extract a data set from applying the rules
-        self._apply_rules(dataset.graph(data_uri), input_graph)
-        logger.debug('Generated {} triples using the rules'.format(len(dataset)))
+        self._apply_rules(data_graph, job.pop('input_graph'))
+        logger.debug('Generated {} triples using the rules'.format(len(data_graph)))
+        
+        job.update({'named_graph_base': named_graph_base, 'data_uri': data_uri,
+                    'data_graph': data_graph})
+        return job
+    
+    @PROCESS_SECONDS.timed(stage='resolve')
+    @_profiled('resolve')
+    def resolve(self, job):
+        '''
+        Third stage of the processing: use the proxies
+        '''
+        data_graph = job['data_graph']
+        
+        # Get what was written the last time the document was processed, its
+        # subjects and objects keep the proxies they had then
+        previous = None
+        if self.index_store.outputs is not None:
+            previous = self.index_store.outputs.get(job['named_graph_base'])
+        (subjects, objects) = ({}, {})
+        if previous is not None:
+            (subjects, objects) = (previous['subjects'], previous['objects'])
         
         # Change the subjects and objects to use proxy URIs instead of the
         # subjects and objects currently used
-        proxies_map = self._replace_subjects_by_proxies(dataset.graph(data_uri))
-        self._replace_objects_by_proxies(dataset.graph(data_uri))
+        (subjects, job['proxies_map']) = self._replace_subjects_by_proxies(data_graph, subjects)
+        objects = self._replace_objects_by_proxies(data_graph, objects)
         
         # Add some more information about the collections
-        self._update_collections(dataset.graph(data_uri))
-
+        self._update_collections(data_graph)
+        
+        job.update({'previous': previous, 'subjects': subjects,
+                    'objects': objects})
+        return job
+    
+    @_profiled('write')
+    def write(self, job):
+        '''
+        Last stage of the processing: add the provenance information to the
+        result and queue it for the index. A batch is written to the index
+        once it has batch_size results
+        
+        @return: False if the batch was written and that failed
+        '''
+        start = time.perf_counter()
+        uri = job['uri']
+        named_graph_base = job['named_graph_base']
+        data_uri = job['data_uri']
+        
+        # Blank nodes can not be matched with the ones in the index, the
+        # documents having some are always written in full
+        previous = job.pop('previous')
+        if previous is not None:
+            triples = itertools.chain(job['data_graph'], previous['triples'])
+            if any(isinstance(t, BNode) for triple in triples for t in triple):
+                previous = None
+        
+        # Turn the working graph into the data set to store, or into the
+        # changes since the last time the document was processed
+        dataset = Dataset()
+        if previous is None:
+            job['data_graph'].to_graph(dataset.graph(data_uri))
+        else:
+            (job['additions'], job['removals']) = self._diff(job, previous)
+        job['dataset'] = dataset
+        
+        # Defined a number of graph URIs
+        named_graph_uri = named_graph_base + "#id"
+        prov_uri = named_graph_base + "#prov"
+        activity_uri = BNode()
+        
         # Keep track of the end time
         end_time = Literal(datetime.datetime.now())
         
@@ -93,7 +322,7 @@ class Process(object):
         prov_graph.add((data_uri, PROV.wasDerivedFrom, URIRef(uri)))
         prov_graph.add((data_uri, PROV.wasGeneratedBy, activity_uri))
         prov_graph.add((activity_uri, PROV.used, URIRef(uri)))
-        prov_graph.add((activity_uri, PROV.startedAtTime, start_time))
+        prov_graph.add((activity_uri, PROV.startedAtTime, job['start_time']))
         prov_graph.add((activity_uri, PROV.endedAtTime, end_time))
         
         # Describe the document we just created
@@ -103,98 +332,445 @@ class Process(object):
                            Literal("Outcome of the processing of <{}>".format(uri))))
         default_graph.add((named_graph_base, FOAF.primaryTopic, named_graph_uri))
         
-        # Store the generated dataset in the index   
-        ok = self.index_store.store(dataset)
+        # Keep track of the time spent, storing the batch is timed apart
+        PROCESS_SECONDS.observe(time.perf_counter() - start, stage='write')
+        
+        # Queue the generated dataset and write the batch if it is full
+        with self._batch_lock:
+            self._batch.append(job)
+            if len(self._batch) < self.batch_size:
+                return True
+            (batch, self._batch) = (self._batch, [])
+        
+        # The batch is shared by several documents, do not charge its
+        # writing to the one that happened to fill it
+        if self.profiler is not None:
+            with self.profiler.detached():
+                return self._store(batch)
+        return self._store(batch)
+    
+    def _diff(self, job, previous):
+        '''
+        Compare the data graph of a job with the one written the last time
+        the document was processed
+        
+        @return: a tuple (additions, removals) of data sets with the triples
+        to add to the index and to remove from it
+        '''
+        data_graph = job['data_graph']
+        old = previous['triples']
+        added = [t for t in data_graph if t not in old]
+        
+        # Objects which had no proxy the last time may have one now. The
+        # references already in the index have been rewritten since, but
+        # not the ones being added
+        stale = set([o for (_, p, o) in added if p != OWL.sameAs
+                     and previous['objects'].get(o) == o])
+        proxies = self.index_store.get_proxy_uris(stale)
+        if len(proxies) > 0:
+            data_graph.remap_objects(proxies, skip_predicate=OWL.sameAs)
+            job['objects'].update(proxies)
+            added = [t for t in data_graph if t not in old]
+        removed = [t for t in old if t not in data_graph]
+        
+        # Likewise the objects of the triples removed may have been
+        # rewritten in the index, remove both versions
+        rewritten = self.index_store.get_proxy_uris(
+            set([o for (_, p, o) in removed if p != OWL.sameAs and isinstance(o, URIRef)]))
+        
+        additions = Dataset()
+        graph = additions.graph(job['data_uri'])
+        for triple in added:
+            graph.add(triple)
+        removals = Dataset()
+        graph = removals.graph(job['data_uri'])
+        for (s, p, o) in removed:
+            graph.add((s, p, o))
+            if o in rewritten and p != OWL.sameAs and (s, p, rewritten[o]) not in data_graph:
+                graph.add((s, p, rewritten[o]))
+        logger.debug('{} triples added and {} removed'.format(len(added), len(removed)))
+        
+        return (additions, removals)
+    
+    def flush(self):
+        '''
+        Write the results waiting in the current batch to the index
+        
+        @return: True if successful
+        '''
+        with self._batch_lock:
+            (batch, self._batch) = (self._batch, [])
+        return self._store(batch)
+    
+    def _store(self, batch):
+        '''
+        Store a batch of results in the index in a single transaction
+        '''
+        if len(batch) == 0:
+            return True
+        
+        # Store the generated datasets in the index, if that fails the
+        # entries stay in the processing queue
+        try:
+            with PROCESS_SECONDS.time(stage='store'):
+                ok = self.index_store.store_many(
+                    [job['dataset'] for job in batch],
+                    additions=[job['additions'] for job in batch if 'additions' in job],
+                    removals=[job['removals'] for job in batch if 'removals' in job])
+        except Exception:
+            logger.exception('Could not store {} entries'.format(len(batch)))
+            PROCESS_DOCUMENTS.inc(len(batch), outcome='failed')
+            return False
+        PROCESS_DOCUMENTS.inc(len(batch), outcome='stored' if ok else 'failed')
         
         # If we managed to store that data we may need to change all the 
         # references made to the subjects we just created a new proxy for
         if ok:
-            self.index_store.update_uris(proxies_map)
+            rewrites = {}
+            for job in batch:
+                rewrites.update(job['proxies_map'])
+            self.index_store.defer_update_uris(rewrites)
+            
+            # Remember what was written for every document
+            if self.index_store.outputs is not None:
+                self.index_store.outputs.put_many(
+                    [(job['named_graph_base'], job['data_graph'],
+                      job['subjects'], job['objects']) for job in batch])
+            
+            # Keep the local index of the equivalences in sync with the
+            # store, the links of the data graphs replaced are replaced too
+            if self.index_store.local_equivalences() is not None:
+                self.index_store.equivalences.replace_many(
+                    [(job['data_uri'], job['data_graph'].subject_objects(OWL.sameAs))
+                     for job in batch])
+            
+            for job in batch:
+                # Remove the entry from the processing queue
+                self.cache_store.mark_processed(job['uri'])
+                if self.acknowledge is not None:
+                    self.acknowledge(job['uri'])
+            
+            # The proxies of the batch can now be found in the index
+            with self._minting():
+                for job in batch:
+                    self.registry.remove(job['subjects'])
+        
+        return ok
+    
+    def process_following(self, entries):
+        '''
+        Process entries handed over one at a time while following the
+        queue. An entry which can not be processed does not stop the
+        following, it is counted as failed and acknowledged so that the
+        position in the queue moves past it. It stays in the queue and is
+        tried again by the next run over the whole queue
+        
+        @param entries: an iterable over the URIs of the entries to process
+        @return: the number of entries which could not be processed
+        '''
+        failed = 0
+        for entry in entries:
+            try:
+                self.process(entry)
+            except Exception:
+                logger.exception('Failed to process {}, skipping it'.format(entry))
+                failed += 1
+                if self.acknowledge is not None:
+                    self.acknowledge(entry)
+        self.flush()
+        return failed
+    
+    def process_all(self, entries, workers):
+        '''
+        Process entries from the cache using a pool of processes. Every
+        worker has its own connections to the stores. The proxies are minted
+        under a shared lock and recorded in a shared registry so that two
+        workers never mint different proxies for the same URI. The entries
+        are sent to the workers in chunks of batch_size entries written to
+        the index together. If a worker dies the pool is restarted and the
+        chunks that were in flight are tried again
+        
+        @param entries: an iterable over the URIs of the entries to process
+        @param workers: the number of worker processes
+        @return: a dictionary worker id -> number of entries processed and
+        failed by that worker
+        '''
+        logger.info('Processing using {} worker(s)'.format(workers))
+        
+        # Start the shared registry of proxies
+        manager = RegistryManager()
+        manager.start()
+        registry = manager.ProxyRegistry()
+        initargs = (self.config, registry, multiprocessing.Lock(),
+                    self.proxy_plan, self.batch_size, self.profiler is not None)
+        
+        entries = iter(entries)
+        progress = {}
+        attempts = {}
+        retry = []
+        pending = {}
+        last_report = time.time()
+        executor = ProcessPoolExecutor(workers, initializer=_init_worker,
+                                       initargs=initargs)
+        try:
+            while True:
+                # Keep a bounded number of chunks in flight
+                while len(pending) < workers * 2:
+                    if len(retry) > 0:
+                        chunk = retry.pop()
+                    else:
+                        chunk = tuple(itertools.islice(entries, self.batch_size))
+                    if len(chunk) == 0:
+                        break
+                    pending[executor.submit(_process_job, chunk)] = chunk
+                if len(pending) == 0:
+                    break
+                
+                # Collect the results of the chunks done
+                (done, _) = wait(pending, return_when=FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    chunk = pending.pop(future)
+                    try:
+                        (worker, results, metrics, profile) = future.result()
+                    except BrokenProcessPool:
+                        broken = True
+                        attempts[chunk] = attempts.get(chunk, 0) + 1
+                        if attempts[chunk] < MAX_ATTEMPTS:
+                            retry.append(chunk)
+                        else:
+                            logger.error('Giving up on {} entries, they stay in the queue'.format(len(chunk)))
+                        continue
+                    REGISTRY.merge(metrics)
+                    if profile is not None:
+                        self.profiler.merge(profile)
+                    stats = progress.setdefault(worker, {'processed': 0, 'failed': 0})
+                    for (uri, ok, error) in results:
+                        stats['processed' if ok else 'failed'] += 1
+                        if error is not None:
+                            logger.error('Failed to process {}: {}'.format(uri, error))
+                        # Move past the entries written and those which can
+                        # not be processed, not past those which could not
+                        # be stored
+                        skipped = error is not None and error != STORE_FAILED
+                        if (ok or skipped) and self.acknowledge is not None:
+                            self.acknowledge(uri)
+                
+                # If a worker died, all the entries in flight are lost. Start
+                # a new pool and send them again. The other workers have been
+                # terminated too, maybe while holding the lock, so a new lock
+                # is needed as well
+                if broken:
+                    logger.error('A worker crashed, restarting the pool')
+                    retry.extend(pending.values())
+                    pending = {}
+                    executor.shutdown(wait=False)
+                    initargs = (self.config, registry, multiprocessing.Lock(),
+                                self.proxy_plan, self.batch_size,
+                                self.profiler is not None)
+                    executor = ProcessPoolExecutor(workers, initializer=_init_worker,
+                                                   initargs=initargs)
+                
+                # Report on the progress every now and then
+                if time.time() - last_report > REPORT_INTERVAL:
+                    self._report_progress(progress)
+                    last_report = time.time()
+        finally:
+            executor.shutdown()
+            manager.shutdown()
+        
+        self._report_progress(progress)
+        return progress
+    
+    def _report_progress(self, progress):
+        '''
+        Log the number of entries processed by every worker
+        '''
+        for (worker, stats) in sorted(progress.items()):
+            logger.info('Worker {}: {} processed, {} failed'.format(
+                worker, stats['processed'], stats['failed']))
+    
+    def _minting(self):
+        '''
+        Get the context in which proxies are resolved and minted. When
+        running in a pool this is the lock shared by all the workers
+        '''
+        return self.registry_lock
+        
+    def plan_proxies(self, uris):
+        '''
+        Go through the sameAs statements of a set of cached entries to find
+        the classes of equivalent resources across all of them, and assign
+        one proxy to each class. The proxies are then used when the entries
+        are processed, instead of minting one proxy per document and merging
+        them afterwards. Only the sameAs links kept with the metadata of the
+        entries are read, not their graphs. The subjects shared by several
+        documents without a sameAs link are not planned, they get their
+        proxy when the first of these documents is processed
         
-    def _replace_subjects_by_proxies(self, graph):
+        @param uris: the URIs of the cached entries, usually the queue
+        @return: the number of equivalence classes found
+        '''
+        # Build the equivalence classes
+        classes = UnionFind()
+        for (s, o) in self.cache_store.same_as_links(uris):
+            classes.union(s, o)
+        groups = [g for g in classes.groups().values() if len(g) > 1]
+        logger.info('Found {} equivalence classes'.format(len(groups)))
+        
+        # Re-use the proxy already existing for one of the members of the
+        # class if there is one, otherwise mint a new one
+        existing = self.index_store.get_proxy_uris([u for g in groups for u in g])
+        for group in groups:
+            proxies = sorted(existing[u] for u in group if u in existing)
+            if len(proxies) > 0:
+                proxy_uri = proxies[0]
+            else:
+                proxy_uri = URIRef("{}{}#id".format(self.base, uuid.uuid1()))
+                PROXIES_MINTED.inc()
+            for uri in group:
+                self.proxy_plan[uri] = proxy_uri
+        
+        return len(groups)
+    
+    def _replace_subjects_by_proxies(self, graph, known=None):
         '''
         Replace all the subjects by the equivalent proxy URI in one exists.
         Then update the set of sameAs relation to keep track of the appartenance
         of all those subjects to the proxy
+        
+        @param known: the proxies of the subjects already resolved, only the
+        other subjects are looked up
+        @return: a tuple (replacement, rewrites) with the proxies of all the
+        subjects and those of the subjects which were not attached to a
+        proxy yet
         '''
-        # Prepare a map of replacements
-        replacement = {}
-        for subj in graph.subjects():
-            logger.debug("Dealing with {}".format(subj))
+        known = known or {}
+        
+        # Index the sameAs statements of the document in both directions
+        same_as = {}
+        for (s, o) in graph.subject_objects(OWL.sameAs):
+            same_as.setdefault(s, set()).add(o)
+            same_as.setdefault(o, set()).add(s)
+        
+        # Resolve in one go the proxies of all the new subjects and of
+        # everything they are sameAs of in this document
+        candidates = set()
+        for s in graph.subjects():
+            if isinstance(s, URIRef) and s not in known:
+                candidates.add(s)
+                candidates |= set([o for o in same_as.get(s, [])
+                                   if isinstance(o, URIRef)])
+        
+        # The proxies are resolved and minted under a lock, shared by all
+        # the workers when running in a pool. Those assigned to documents
+        # which are not in the index yet are in the registry
+        with self._minting():
+            proxies = self.index_store.get_proxy_uris(candidates)
+            assigned = self.registry.get_many(list(candidates))
+        
+            # Prepare a map of replacements, starting with the subjects
+            # already resolved
+            replacement = {}
+            subjects_list = graph.subjects()
+            for subj in subjects_list:
+                if subj in known:
+                    replacement[subj] = known[subj]
+                    graph.add((known[subj], OWL.sameAs, subj))
+            for subj in subjects_list:
+                logger.debug("Dealing with {}".format(subj))
                         
-            # If we already dealt with this subject move on
-            # also skip everything that is not a URIRef
-            if subj in replacement or not isinstance(subj, URIRef):
-                continue
+                # If we already dealt with this subject move on
+                # also skip everything that is not a URIRef
+                if subj in replacement or not isinstance(subj, URIRef):
+                    continue
 
-            # Get all the things this subject is a sameAs of either as a subject
-            # or as an object. Combine that into a set of subjects all equivalent
-            # to each other. That set only considers the data available in the
-            # document being currently processed as passed on by "graph"
-            sameAsO = set([o for o in graph.objects(subj, OWL.sameAs)])
-            sameAsS = set([s for s in graph.subjects(OWL.sameAs, subj)])
-            subjects = sameAsO | sameAsS | set([subj])
-            logger.info("Looking for a proxy any of {}".format(subjects))
+                # Get all the things this subject is a sameAs of either as a subject
+                # or as an object. Combine that into a set of subjects all equivalent
+                # to each other. That set only considers the data available in the
+                # document being currently processed as passed on by "graph"
+                subjects = same_as.get(subj, set()) | set([subj])
+                logger.info("Looking for a proxy any of {}".format(subjects))
             
-            # Try first to find a proxy we just created for one of the subjects
-            proxy_uri = None 
-            for subject in subjects:
-                if subject in replacement:
-                    proxy_uri = replacement[subject]
-                    
-            # Try to find a proxy already existing for one of the subjects
-            if proxy_uri == None:
+                # Try first to find a proxy we just created for one of the subjects
+                proxy_uri = None 
                 for subject in subjects:
-                    if self.index_store.has_proxy(subject):
-                        proxy_uri = self.get_proxy_uri(subject)
+                    if subject in replacement:
+                        proxy_uri = replacement[subject]
                     
-            # If we have not found any create a new one
-            if proxy_uri == None:
-                proxy_uri = URIRef("{}{}#id".format(self.base, uuid.uuid1()))
-                logger.info("Created <{}>".format(proxy_uri))
-            else:
-                logger.info("Found <{}>".format(proxy_uri))
+                # Try to find a proxy already existing for one of the subjects
+                if proxy_uri == None:
+                    for subject in subjects:
+                        if subject in proxies:
+                            proxy_uri = proxies[subject]
                 
-            # Save the mapping
-            replacement[subj] = proxy_uri
+                # Then the proxy assigned to one of them by a document not
+                # written yet, by this process or another worker
+                if proxy_uri == None:
+                    for subject in subjects:
+                        if subject in assigned:
+                            proxy_uri = assigned[subject]
+            
+                # Then use the proxy planned for the equivalence class
+                if proxy_uri == None:
+                    for subject in subjects:
+                        if subject in self.proxy_plan:
+                            proxy_uri = self.proxy_plan[subject]
+                    
+                # If we have not found any create a new one
+                if proxy_uri == None:
+                    proxy_uri = URIRef("{}{}#id".format(self.base, uuid.uuid1()))
+                    PROXIES_MINTED.inc()
+                    logger.info("Created <{}>".format(proxy_uri))
+                else:
+                    logger.info("Found <{}>".format(proxy_uri))
+                
+                # Save the mapping
+                replacement[subj] = proxy_uri
 
-            # Also add an RDF statement to state that equivalence
-            graph.add((proxy_uri, OWL.sameAs, subj))
+                # Also add an RDF statement to state that equivalence
+                graph.add((proxy_uri, OWL.sameAs, subj))
+            
+            # Keep the proxies assigned until the document is written, for
+            # the next documents and the other workers
+            self.registry.update(replacement)
             
         # In all the graphs replace the subjects by their proxy URI
-        for (s, p, o) in graph:
-            if s in replacement:
-                graph.remove((s, p, o))
-                graph.add((replacement[s], p, o))
+        graph.remap_subjects(replacement)
     
-        # Return the replacement map
-        return replacement
+        # Also return the replacement map for the subjects which were not
+        # already attached to a proxy, references to the others are already
+        # rewritten
+        rewrites = dict((s, p) for (s, p) in replacement.items()
+                        if s not in proxies and s not in known)
+        return (replacement, rewrites)
     
-    def _replace_objects_by_proxies(self, graph):
+    def _replace_objects_by_proxies(self, graph, known=None):
         '''
         Replace all the objects by the equivalent proxy URI in one exists.
         Contrary to what is done with the subjects we do not create a proxy
         if one does not already exist. Creating such proxy will eventually
         happen if the object can be crawled and indexed. In this case the
         replacement will be done when this happens.
+        
+        @param known: the proxies of the objects already resolved, only the
+        other objects are looked up
+        @return: the proxies of all the objects, those without a proxy being
+        mapped to themselves
         '''
-        # Get a proxy URI for each of the object
-        replacement = {}
-        for obj in graph.objects():
-            # If we already dealt with this object move on
-            # also skip everything that is not a URIRef
-            if obj in replacement or not isinstance(obj, URIRef):
-                continue
-            
-            # Get the proxy URI if there is one
-            if self.index_store.has_proxy(obj):
-                replacement[obj] = self.get_proxy_uri(obj)
+        known = known or {}
+        
+        # Get a proxy URI for each of the new objects, skipping everything
+        # that is not a URIRef
+        objects = set([o for o in graph.objects() if isinstance(o, URIRef)])
+        replacement = self.index_store.get_proxy_uris(objects - set(known))
+        for o in objects:
+            replacement.setdefault(o, known.get(o, o))
             
-        # In all the graphs replace the subjects by the proxy URI
-        for (s, p, o) in graph:
-            if o in replacement:
-                graph.remove((s, p, o))
-                graph.add((s, p, replacement[o]))
+        # In all the graphs replace the subjects by the proxy URI, except
+        # in the sameAs links of the proxies
+        graph.remap_objects(replacement, skip_predicate=OWL.sameAs)
+        return replacement
     
     def _update_collections(self, dataset):
         '''
@@ -228,26 +804,16 @@ class Process(object):
         # Rules are stored in hash map
         rules = {}
         
-        # Load the rule base into memory
-        logger.debug('Loading {}'.format(rules_file_name))
-        g = Graph().parse(rules_file_name, format="turtle")
-        
-        # Extract the namespaces from the rule base
-        r_ns = {}
-        for (ns, uri) in g.namespaces():
-            r_ns[ns] = uri
-        
-        # Compose and prepare the SPARQL queries
-        for s in g.subjects(RDF.type, INDEXER.Rule):
-            # Extract the components of the rule
-            r_if = g.value(s, INDEXER['if']).toPython().replace('\t', '')
-            r_then = g.value(s, INDEXER['then']).toPython().replace('\t', '')
-            rule = 'CONSTRUCT {' + r_then + '} WHERE {' + r_if + '}'
-            
+        # Load the rule base as a set of SPARQL queries
+        (queries, r_ns) = read_rules(rules_file_name)
+        
+        # Prepare the SPARQL queries
+        for (name, query) in queries.items():
             # Pre-load the rule
-            rules[s.toPython()] = prepareQuery(rule, initNs=r_ns)
+            rules[name] = prepareQuery(query, initNs=r_ns)
     
-        return rules
+        # Compile what can be compiled into native rules
+        return RuleEngine(rules)
     
     def _apply_rules(self, output_graph, input_graph):
         '''
@@ -257,16 +823,4 @@ class Process(object):
         @param output_graph: the target graph to put the result of the rules in
         @param input_graph: the data graph to process in search for entities
         '''
-        # Apply all the rules one by one
-        for (name, rule) in self.rules.items():
-            # Apply the rule, the result is an RDF graph
-            tmp_graph = input_graph.query(rule).graph
-            if len(tmp_graph) == 0:
-                continue
-            logger.debug('Found a match for {}'.format(name))
-                
-            # Add the graph statements in the named graph
-            for st in tmp_graph:
-                output_graph.add(st)
-                tmp_graph.remove(st)
-        
\ No newline at end of file
+        self.rules.apply(output_graph, input_graph, self.profiler)
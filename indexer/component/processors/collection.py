@@ -4,7 +4,7 @@ Created on 8 May 2016
 
 @author: guerec01
 '''
-from SPARQLWrapper import SPARQLWrapper, POST, JSON
+from indexer.storage.index import get_backend
 from rdflib.graph import Graph
 from rdflib.namespace import RDF, VOID, RDFS, DCTERMS, Namespace, FOAF
 from rdflib.term import Literal, URIRef
@@ -31,9 +31,8 @@ class CollectionStore(object):
         @param base: the base for all the minted URIs
         @param store: location of the triple store
         '''
-        # The URIs for the store
-        self.sparql = config.stardog_url() + config.stardog_db() + '/query'
-        self.sparul = config.stardog_url() + config.stardog_db() + '/update'
+        # The store selected in the configuration
+        self.backend = get_backend(config)
 
         # The base for all the URIs
         self.base = config.base()
@@ -51,10 +50,7 @@ class CollectionStore(object):
         '''
         logger.info("Cleaning the DB")
         query = "DELETE {?s ?p ?o.} WHERE {?s ?p ?o.}"
-        sparql = SPARQLWrapper(self.sparul)
-        sparql.setQuery(query)
-        sparql.setMethod(POST)
-        sparql.query()
+        self.backend.update(query)
         
         self._init_db()
         
@@ -82,12 +78,8 @@ class CollectionStore(object):
         PREFIX void: <http://rdfs.org/ns/void#>
         ASK { <__URI__> a void:Dataset. }
         """.replace("__URI__", uri)
-        sparql = SPARQLWrapper(self.sparql)
-        sparql.setQuery(query)
-        sparql.setReturnFormat(JSON)
-        
         # Execute it
-        res = sparql.query().convert()["boolean"]
+        res = self.backend.ask(query)
         return res
 
     def create(self, name, label, description):
@@ -115,12 +107,9 @@ class CollectionStore(object):
             __PAYLOAD__
         }
         """.replace("__PAYLOAD__", data)
-        sparql = SPARQLWrapper(self.sparul)
-        sparql.setQuery(query)
-        sparql.setMethod(POST)
         
         # Execute it
-        sparql.query()
+        self.backend.update(query)
 
         # Return the uri of the collection        
         return uri
@@ -146,12 +135,9 @@ class CollectionStore(object):
             __PAYLOAD__
         }
         """.replace("__PAYLOAD__", data)
-        sparql = SPARQLWrapper(self.sparul)
-        sparql.setQuery(query)
-        sparql.setMethod(POST)
         
         # Execute it
-        sparql.query()
+        self.backend.update(query)
     
     def close(self):
         '''
@@ -0,0 +1,172 @@
+'''
+Created on 18 Oct 2026
+
+Interfaces of the stores the cache can keep its documents in and of the
+stores the index can keep its graphs in
+'''
+import os
+
+import logging
+logger = logging.getLogger(__name__)
+
+class ConflictError(Exception):
+    '''
+    Raised when a document is saved with a revision which is not the latest
+    '''
+    pass
+
+class CacheBackend(object):
+    '''
+    Interface to a store of JSON documents used by the CacheStore. The
+    documents are identified by their "_id" and versioned with a "_rev".
+    The metadata documents have an "@id" with the URI of the cached
+    resource and a "processed" flag. A document being saved can come with
+    a payload given as a tuple (filename, content type, data) under the key
+    "_payload".
+    '''
+    def reset(self):
+        '''
+        Remove all the documents
+        '''
+        raise NotImplementedError()
+
+    def contains(self, uri):
+        '''
+        Returns True if there is a metadata document for the URI
+        '''
+        raise NotImplementedError()
+
+    def get(self, identifier):
+        '''
+        Get a document, or None if there is no such document
+        '''
+        raise NotImplementedError()
+
+    def get_many(self, identifiers):
+        '''
+        Get several documents at once, as a dictionary indexed by identifier
+        with only the documents found
+        '''
+        raise NotImplementedError()
+
+    def save(self, document):
+        '''
+        Insert or update a document. Raises a ConflictError if the document
+        does not have the latest revision
+        '''
+        raise NotImplementedError()
+
+    def save_many(self, documents):
+        '''
+        Insert or update several documents at once
+
+        @return: a list of (success, identifier, error) tuples
+        '''
+        raise NotImplementedError()
+
+    def get_payload(self, identifier, filename):
+        '''
+        Get the payload attached to a document
+        '''
+        raise NotImplementedError()
+
+    def processing_queue(self, page_size):
+        '''
+        Generator over the URIs of the metadata documents which are not
+        processed yet, reading page_size of them at a time
+        '''
+        raise NotImplementedError()
+
+    def changes(self, since, timeout):
+        '''
+        Get the metadata documents which are not processed yet and have
+        changed after a given position in the history of the store, waiting
+        at most timeout milliseconds for one to appear
+
+        @return: a tuple (changes, last_seq) where changes is a list of
+        (seq, uri) tuples and last_seq the position to ask for next
+        '''
+        raise NotImplementedError()
+
+class IndexBackend(object):
+    '''
+    Interface to a quad store used by the IndexStore and the
+    CollectionStore. The queries are SPARQL 1.1 queries evaluated over the
+    union of all the named graphs, and the bindings of SELECT queries are
+    returned as in the SPARQL 1.1 JSON results format. The named graphs
+    are written in transactions, see transaction()
+    '''
+    def exists(self):
+        '''
+        Returns True if the database was already initialised
+        '''
+        raise NotImplementedError()
+
+    def reset(self):
+        '''
+        Remove everything and initialise the database again
+
+        @return: True if successful
+        '''
+        raise NotImplementedError()
+
+    def select(self, query):
+        '''
+        Execute a SELECT query and return the bindings
+        '''
+        raise NotImplementedError()
+
+    def ask(self, query):
+        '''
+        Execute an ASK query and return the answer
+        '''
+        raise NotImplementedError()
+
+    def construct(self, query):
+        '''
+        Execute a CONSTRUCT query and return the resulting graph
+        '''
+        raise NotImplementedError()
+
+    def update(self, query):
+        '''
+        Execute an update. The WHERE clause matches the union of the named
+        graphs but the templates without a GRAPH clause change the default
+        graph, updates to the data of the documents must name their graph
+        '''
+        raise NotImplementedError()
+
+    def transaction(self):
+        '''
+        Start a transaction, to be used in a "with" block. It has the
+        methods clear(graph name), add(N-Quads) and remove(N-Quads), the
+        N-Quads being given as bytes. The changes are committed at the end
+        of the block and rolled back if the block raises an exception
+        '''
+        raise NotImplementedError()
+
+    def search(self, text, collection):
+        '''
+        Find the resources of a collection with a label or a description
+        containing some text. By default this is a SPARQL query matching
+        the text as a regular expression
+
+        @param text: the text to search for
+        @param collection: the URI of the collection
+        @return: the bindings of the variables "proxy", "label" and
+        "description" for every match
+        '''
+        file_name = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                                 'queries', 'full_text_search.rq')
+        with open(file_name) as query_file:
+            query = query_file.read()
+        query = query.replace("__TEXT__", text)
+        query = query.replace("__COLLECTION__", collection)
+        logger.debug('Executing \n{}'.format(query))
+        return self.select(query)
+
+    def close(self):
+        '''
+        Release the resources used by the backend
+        '''
+        pass
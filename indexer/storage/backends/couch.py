@@ -0,0 +1,152 @@
+'''
+Created on 18 Oct 2026
+
+CouchDB backend for the cache store, using the code moved out of the
+cache store
+'''
+import base64
+from couchdb.client import Server
+from couchdb import http
+from indexer.storage.backends.base import CacheBackend, ConflictError
+from indexer.util.connections import get_couchdb_session
+
+import logging
+logger = logging.getLogger(__name__)
+
+def index_doc():
+    '''
+    This function returns the index used by CouchDB to search for metadata
+    documents based on the URI of the graph they contain
+    '''
+    return  {
+        "_id": "_design/index",
+        "views": {
+            "by_resource": {
+                "map": """
+                    function(doc) {
+                    if ('@id' in doc) {
+                        emit(doc['@id'], {'rev': doc._rev, 'g': doc._id})
+                        }
+                    }
+                    """
+            },
+            "processing_queue": {
+                "map": """
+                    function(doc) {
+                    if ('processed' in doc && !doc['processed']) {
+                        emit(doc._id, doc['@id'])
+                        }
+                    }
+                    """
+            }
+        }
+    }
+
+class CouchDBBackend(CacheBackend):
+    '''
+    Cache backend storing the documents in CouchDB, the payloads are stored
+    as attachments
+    '''
+    def __init__(self, config, **client_opts):
+        '''
+        Constructor
+
+        @param config: the Config object wrapping the configuration file
+        '''
+        # Get the config
+        url = config.couchdb_url()
+        self.db_name = config.couchdb_db()
+
+        # Connect to CouchDB using the shared connection pool
+        client_opts.setdefault('session', get_couchdb_session(config))
+        self._server = Server(url=url, **client_opts)
+
+        # Initialise the DB if needed
+        self._init_db()
+
+    def _init_db(self):
+        '''
+        Initialise the DB if needed. Also add the index document if that one
+        is not already there
+        '''
+        try:
+            self._db = self._server[self.db_name]
+        except http.ResourceNotFound:
+            self._db = self._server.create(self.db_name)
+
+        if not '_design/index' in self._db:
+            self._db.save(index_doc())
+
+    def reset(self):
+        self._server.delete(self.db_name)
+        self._init_db()
+
+    def contains(self, uri):
+        return len(self._db.view('index/by_resource', key=uri).rows) > 0
+
+    def get(self, identifier):
+        return self._db.get(identifier)
+
+    def get_many(self, identifiers):
+        documents = {}
+        for row in self._db.view('_all_docs', keys=identifiers,
+                                 include_docs=True).rows:
+            if row.doc is not None:
+                documents[row.id] = row.doc
+        return documents
+
+    def save(self, document):
+        try:
+            self._db.save(document)
+        except http.ResourceConflict as e:
+            raise ConflictError(e)
+
+    def save_many(self, documents):
+        # Turn the payloads into inline attachments
+        for document in documents:
+            if '_payload' in document:
+                (filename, content_type, data) = document.pop('_payload')
+                document['_attachments'] = {
+                    filename: {
+                        'content_type': content_type,
+                        'data': base64.b64encode(data).decode()
+                    }
+                }
+        return self._db.update(documents)
+
+    def get_payload(self, identifier, filename):
+        return self._db.get_attachment(identifier, filename=filename).read()
+
+    def processing_queue(self, page_size):
+        options = {'limit': page_size}
+        last = None
+        while True:
+            results = self._db.view('index/processing_queue', **options)
+            rows = results.rows
+            if last is None:
+                logger.info('{} entries to process'.format(results.total_rows))
+            for row in rows:
+                # The page starts with the last row of the previous one,
+                # unless it has been processed since
+                if row.id != last:
+                    yield row.value
+
+            # Stop after the last page, otherwise start the next page from
+            # the last row we got. One more row is asked for as that one
+            # may be returned again
+            if len(rows) < options['limit']:
+                break
+            last = rows[-1].id
+            options['startkey'] = rows[-1].key
+            options['startkey_docid'] = rows[-1].id
+            options['limit'] = page_size + 1
+
+    def changes(self, since, timeout):
+        changes = self._db.changes(feed='longpoll', since=since,
+                                   timeout=timeout, include_docs=True,
+                                   filter='_view',
+                                   view='index/processing_queue')
+        results = [(change['seq'], change['doc']['@id'])
+                   for change in changes['results']
+                   if change.get('doc') is not None]
+        return (results, changes['last_seq'])
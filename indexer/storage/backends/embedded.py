@@ -0,0 +1,391 @@
+'''
+Created on 18 Oct 2026
+
+Embedded backend for the index, for single node deployments and for
+running without a triple store. The quads are kept in a SQLite database
+in-process, the SPARQL queries and updates are evaluated by rdflib over
+that database and the literals are indexed for full-text search
+'''
+from contextlib import contextmanager
+from indexer.storage.backends.base import IndexBackend
+from indexer.util.metrics import SPARQL_SECONDS, SPARQL_ERRORS
+from indexer.util.profiling import count_sparql
+from rdflib.graph import Dataset, Graph
+from rdflib.namespace import DCTERMS, RDFS
+from rdflib.store import Store
+from rdflib.term import URIRef, BNode, Literal
+from rdflib.util import from_n3
+import functools
+import sqlite3
+import threading
+
+import logging
+logger = logging.getLogger(__name__)
+
+# The terms are stored in the N3 syntax. The literals are also copied in
+# the "text" column, which is indexed by the full-text search
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS quads (
+    id INTEGER PRIMARY KEY,
+    g TEXT NOT NULL,
+    s TEXT NOT NULL,
+    p TEXT NOT NULL,
+    o TEXT NOT NULL,
+    text TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS quads_spog ON quads (s, p, o, g);
+CREATE INDEX IF NOT EXISTS quads_po ON quads (p, o);
+CREATE INDEX IF NOT EXISTS quads_o ON quads (o);
+CREATE INDEX IF NOT EXISTS quads_g ON quads (g);
+CREATE VIRTUAL TABLE IF NOT EXISTS texts USING fts5 (
+    text, content='quads', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS quads_insert AFTER INSERT ON quads
+WHEN new.text IS NOT NULL BEGIN
+    INSERT INTO texts (rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS quads_delete AFTER DELETE ON quads
+WHEN old.text IS NOT NULL BEGIN
+    INSERT INTO texts (texts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+'''
+
+# The trigram index can only find texts of at least that many characters
+MIN_SEARCH_LENGTH = 3
+
+def _encode(term):
+    return term.n3()
+
+@functools.lru_cache(maxsize=100000)
+def _decode(text):
+    if text.startswith('<'):
+        return URIRef(text[1:-1])
+    if text.startswith('_:'):
+        return BNode(text[2:])
+    return from_n3(text)
+
+def _binding(term):
+    '''
+    Get the value of a variable as in the SPARQL JSON results format
+    '''
+    if isinstance(term, URIRef):
+        return {'type': 'uri', 'value': str(term)}
+    if isinstance(term, BNode):
+        return {'type': 'bnode', 'value': str(term)}
+    binding = {'type': 'literal', 'value': str(term)}
+    if term.language is not None:
+        binding['xml:lang'] = term.language
+    elif term.datatype is not None:
+        binding['datatype'] = str(term.datatype)
+    return binding
+
+def _parse(nquads):
+    '''
+    Get the (graph name, subject, predicate, object) quads of some N-Quads
+    given as bytes
+    '''
+    dataset = Dataset()
+    dataset.parse(data=nquads.decode('utf-8'), format='nquads')
+    return [(g, s, p, o) for (s, p, o, g) in dataset.quads((None, None, None, None))]
+
+class QuadStore(Store):
+    '''
+    rdflib store reading and writing the quads of the database of an
+    EmbeddedBackend, used to evaluate SPARQL with rdflib. The graphs only
+    exist as long as they have some quads
+    '''
+    context_aware = True
+    formula_aware = False
+    graph_aware = True
+    transaction_aware = False
+
+    def __init__(self, backend):
+        '''
+        Constructor
+
+        @param backend: the EmbeddedBackend owning the database
+        '''
+        Store.__init__(self)
+        self.backend = backend
+        self._namespaces = {}
+        self._prefixes = {}
+
+    def _where(self, triple, context):
+        conditions = []
+        parameters = []
+        for (column, term) in zip('spo', triple):
+            if term is not None:
+                conditions.append(column + ' = ?')
+                parameters.append(_encode(term))
+        if context is not None:
+            conditions.append('g = ?')
+            parameters.append(_encode(context.identifier))
+        if len(conditions) == 0:
+            return ('', parameters)
+        return (' WHERE ' + ' AND '.join(conditions), parameters)
+
+    def add(self, triple, context, quoted=False):
+        self.backend._insert([(context.identifier,) + tuple(triple)])
+
+    def addN(self, quads):
+        self.backend._insert((c.identifier, s, p, o) for (s, p, o, c) in quads)
+
+    def remove(self, triple, context=None):
+        (where, parameters) = self._where(triple, context)
+        self.backend._connection.execute('DELETE FROM quads' + where, parameters)
+
+    def triples(self, triple, context=None):
+        # The rows are all read first as the quads may be changed while the
+        # triples are being used, by an update
+        (where, parameters) = self._where(triple, context)
+        connection = self.backend._connection
+        if context is not None:
+            rows = connection.execute('SELECT s, p, o FROM quads' + where,
+                                      parameters).fetchall()
+            for (s, p, o) in rows:
+                yield ((_decode(s), _decode(p), _decode(o)), iter([context]))
+            return
+
+        # Over all the graphs, every triple comes once with the list of
+        # the graphs it is in
+        rows = connection.execute(
+            "SELECT s, p, o, group_concat(g, char(0)) FROM quads{} "
+            "GROUP BY s, p, o".format(where), parameters).fetchall()
+        for (s, p, o, graph_names) in rows:
+            yield ((_decode(s), _decode(p), _decode(o)),
+                   self._graphs(graph_names.split('\0')))
+
+    def _graphs(self, graph_names):
+        for graph_name in graph_names:
+            yield Graph(store=self, identifier=_decode(graph_name))
+
+    def __len__(self, context=None):
+        (where, parameters) = self._where((None, None, None), context)
+        if context is not None:
+            query = 'SELECT COUNT(*) FROM quads' + where
+        else:
+            query = 'SELECT COUNT(*) FROM (SELECT DISTINCT s, p, o FROM quads)'
+        return self.backend._connection.execute(query, parameters).fetchone()[0]
+
+    def contexts(self, triple=None):
+        (where, parameters) = self._where(triple or (None, None, None), None)
+        rows = self.backend._connection.execute(
+            'SELECT DISTINCT g FROM quads' + where, parameters).fetchall()
+        for (graph_name,) in rows:
+            yield Graph(store=self, identifier=_decode(graph_name))
+
+    def add_graph(self, graph):
+        pass
+
+    def remove_graph(self, graph):
+        self.remove((None, None, None), graph)
+
+    def bind(self, prefix, namespace, override=True):
+        if not override and (prefix in self._namespaces or namespace in self._prefixes):
+            return
+        self._prefixes.pop(self._namespaces.get(prefix), None)
+        self._namespaces.pop(self._prefixes.get(namespace), None)
+        self._namespaces[prefix] = namespace
+        self._prefixes[namespace] = prefix
+
+    def namespace(self, prefix):
+        return self._namespaces.get(prefix)
+
+    def prefix(self, namespace):
+        return self._prefixes.get(namespace)
+
+    def namespaces(self):
+        return iter(list(self._namespaces.items()))
+
+class EmbeddedBackend(IndexBackend):
+    '''
+    Index backend keeping the quads in a SQLite database. The SPARQL
+    queries are evaluated over the union of all the named graphs, like
+    the Stardog database is configured to do. Every thread gets its own
+    connection to the database and the writes are serialised
+    '''
+    def __init__(self, config):
+        '''
+        Constructor
+
+        @param config: the Config object wrapping the configuration file
+        '''
+        self.path = config.index_path()
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+
+        # Create the tables, noting if they were there before
+        self._existed = self._connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'quads'").fetchone() is not None
+        self._connection.executescript(SCHEMA)
+
+        # The data set used by rdflib to evaluate the queries
+        self.store = QuadStore(self)
+        self.dataset = Dataset(store=self.store, default_union=True)
+
+    @property
+    def _connection(self):
+        '''
+        The connection of the current thread
+        '''
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=60)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    @contextmanager
+    def _measured(self, query_type):
+        '''
+        Time an operation like the requests sent to Stardog are, so that
+        the two backends can be compared
+        '''
+        count_sparql(query_type)
+        try:
+            with SPARQL_SECONDS.time(type=query_type):
+                yield
+        except Exception:
+            SPARQL_ERRORS.inc(type=query_type)
+            raise
+
+    def _insert(self, quads):
+        '''
+        Add some (graph name, subject, predicate, object) quads within the
+        current transaction
+        '''
+        rows = ((_encode(g), _encode(s), _encode(p), _encode(o),
+                 str(o) if isinstance(o, Literal) else None)
+                for (g, s, p, o) in quads)
+        self._connection.executemany(
+            'INSERT OR IGNORE INTO quads (g, s, p, o, text) VALUES (?, ?, ?, ?, ?)',
+            rows)
+
+    def exists(self):
+        return self._existed
+
+    def reset(self):
+        logger.info('Cleaning the embedded index {}'.format(self.path))
+        with self._write_lock:
+            self._connection.executescript(
+                'DROP TABLE IF EXISTS texts; DROP TABLE IF EXISTS quads;' + SCHEMA)
+        self._existed = True
+        return True
+
+    def select(self, query):
+        with self._measured('select'):
+            result = self.dataset.query(query)
+            return [dict((str(variable), _binding(value))
+                         for (variable, value) in row.asdict().items())
+                    for row in result]
+
+    def ask(self, query):
+        with self._measured('ask'):
+            return bool(self.dataset.query(query).askAnswer)
+
+    def construct(self, query):
+        with self._measured('construct'):
+            return self.dataset.query(query).graph
+
+    def update(self, query):
+        with self._measured('update'), self._write_lock, self._connection:
+            self.dataset.update(query)
+
+    def transaction(self):
+        return EmbeddedTransaction(self)
+
+    def search(self, text, collection):
+        '''
+        Find the resources of a collection with a label or a description
+        containing some text, ignoring the case. The text is looked up in
+        the full-text index unless it is too short for it
+        '''
+        if len(text) >= MIN_SEARCH_LENGTH:
+            matches = 'SELECT rowid FROM texts WHERE texts MATCH ?'
+            pattern = '"{}"'.format(text.replace('"', '""'))
+        else:
+            matches = "SELECT id FROM quads WHERE text LIKE ? ESCAPE '\\'"
+            pattern = '%{}%'.format(text.replace('\\', '\\\\').replace(
+                '%', '\\%').replace('_', '\\_'))
+        # Either the label or the description matches
+        query = '''
+            SELECT l.s, l.o, c.o FROM quads l
+            JOIN quads c ON c.s = l.s AND c.p = :comment
+            JOIN quads k ON k.s = l.s AND k.p = :part_of AND k.o = :collection
+            WHERE l.p = :label AND l.id IN ({matches})
+            UNION
+            SELECT l.s, l.o, c.o FROM quads c
+            JOIN quads l ON l.s = c.s AND l.p = :label
+            JOIN quads k ON k.s = c.s AND k.p = :part_of AND k.o = :collection
+            WHERE c.p = :comment AND c.id IN ({matches})
+            '''.format(matches=matches.replace('?', ':pattern'))
+        parameters = {'label': _encode(RDFS.label), 'comment': _encode(RDFS.comment),
+                      'part_of': _encode(DCTERMS.isPartOf),
+                      'collection': _encode(URIRef(collection)), 'pattern': pattern}
+        with self._measured('search'):
+            rows = self._connection.execute(query, parameters).fetchall()
+        return [{'proxy': _binding(_decode(proxy)), 'label': _binding(_decode(label)),
+                 'description': _binding(_decode(description))}
+                for (proxy, label, description) in rows]
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+class EmbeddedTransaction(object):
+    '''
+    Transaction over the database of an EmbeddedBackend, with the same
+    operations as the transactions of Stardog. The other writers wait for
+    it to be over
+    '''
+    def __init__(self, backend):
+        '''
+        Constructor
+
+        @param backend: the EmbeddedBackend of the database
+        '''
+        self.backend = backend
+
+    def __enter__(self):
+        self.backend._write_lock.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                with self.backend._measured('transaction_commit'):
+                    self.backend._connection.commit()
+            else:
+                logger.error('Rolling back transaction')
+                self.backend._connection.rollback()
+        finally:
+            self.backend._write_lock.release()
+        return False
+
+    def clear(self, graph_name):
+        '''
+        Remove all the triples of a named graph
+        '''
+        with self.backend._measured('transaction_clear'):
+            self.backend._connection.execute('DELETE FROM quads WHERE g = ?',
+                                             (_encode(URIRef(graph_name)),))
+
+    def add(self, nquads):
+        '''
+        Add some N-Quads, given as bytes
+        '''
+        with self.backend._measured('transaction_add'):
+            self.backend._insert(_parse(nquads))
+
+    def remove(self, nquads):
+        '''
+        Remove some N-Quads, given as bytes
+        '''
+        with self.backend._measured('transaction_remove'):
+            rows = [(_encode(s), _encode(p), _encode(o), _encode(g))
+                    for (g, s, p, o) in _parse(nquads)]
+            self.backend._connection.executemany(
+                'DELETE FROM quads WHERE s = ? AND p = ? AND o = ? AND g = ?', rows)
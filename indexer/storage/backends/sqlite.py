@@ -0,0 +1,179 @@
+'''
+Created on 18 Oct 2026
+
+Embedded SQLite backend for the cache store, for single node deployments
+and for running the whole pipeline offline
+'''
+from indexer.storage.backends.base import CacheBackend, ConflictError
+import json
+import sqlite3
+import threading
+import time
+
+import logging
+logger = logging.getLogger(__name__)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS documents (
+    id TEXT PRIMARY KEY,
+    uri TEXT,
+    processed INTEGER,
+    rev INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_uri ON documents (uri);
+CREATE INDEX IF NOT EXISTS documents_queue ON documents (processed, id);
+CREATE INDEX IF NOT EXISTS documents_seq ON documents (seq);
+CREATE TABLE IF NOT EXISTS payloads (
+    id TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    content_type TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (id, filename)
+);
+'''
+
+class SQLiteBackend(CacheBackend):
+    '''
+    Cache backend storing the documents and their payloads in a SQLite
+    database. The processing queue and the changes feed are served by
+    indexes on the "processed" flag and on a sequence number incremented
+    on every write. Every thread gets its own connection to the database
+    '''
+    def __init__(self, config):
+        '''
+        Constructor
+
+        @param config: the Config object wrapping the configuration file
+        '''
+        self.path = config.sqlite_path()
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._connection.executescript(SCHEMA)
+
+    @property
+    def _connection(self):
+        '''
+        The connection of the current thread
+        '''
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=60)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def reset(self):
+        with self._write_lock, self._connection:
+            self._connection.execute('DELETE FROM documents')
+            self._connection.execute('DELETE FROM payloads')
+
+    def contains(self, uri):
+        cursor = self._connection.execute(
+            'SELECT 1 FROM documents WHERE uri = ? LIMIT 1', (uri,))
+        return cursor.fetchone() is not None
+
+    def get(self, identifier):
+        cursor = self._connection.execute(
+            'SELECT body FROM documents WHERE id = ?', (identifier,))
+        row = cursor.fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def get_many(self, identifiers):
+        documents = {}
+        # Stay below the maximum number of parameters of SQLite
+        for start in range(0, len(identifiers), 500):
+            chunk = identifiers[start:start + 500]
+            cursor = self._connection.execute(
+                'SELECT id, body FROM documents WHERE id IN ({})'.format(
+                    ','.join('?' * len(chunk))), chunk)
+            for (identifier, body) in cursor:
+                documents[identifier] = json.loads(body)
+        return documents
+
+    def save(self, document):
+        with self._write_lock, self._connection:
+            self._save(document)
+
+    def save_many(self, documents):
+        results = []
+        with self._write_lock, self._connection:
+            for document in documents:
+                try:
+                    self._save(document)
+                    results.append((True, document['_id'], document['_rev']))
+                except ConflictError as e:
+                    results.append((False, document['_id'], e))
+        return results
+
+    def _save(self, document):
+        '''
+        Save a document within the current transaction
+        '''
+        # Check that we are updating the latest revision
+        identifier = document['_id']
+        cursor = self._connection.execute(
+            'SELECT rev FROM documents WHERE id = ?', (identifier,))
+        row = cursor.fetchone()
+        current = str(row[0]) if row is not None else None
+        if document.get('_rev') != current:
+            raise ConflictError('Document update conflict on {}'.format(identifier))
+
+        # Save the payload separately
+        payload = document.pop('_payload', None)
+        if payload is not None:
+            (filename, content_type, data) = payload
+            self._connection.execute(
+                'INSERT OR REPLACE INTO payloads VALUES (?, ?, ?, ?)',
+                (identifier, filename, content_type, sqlite3.Binary(data)))
+
+        # Save the document with a new revision and sequence number
+        document['_rev'] = str(int(current or 0) + 1)
+        (seq,) = self._connection.execute(
+            'SELECT COALESCE(MAX(seq), 0) + 1 FROM documents').fetchone()
+        processed = document.get('processed')
+        self._connection.execute(
+            'INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?)',
+            (identifier, document.get('@id'),
+             None if processed is None else int(bool(processed)),
+             int(document['_rev']), seq, json.dumps(document)))
+
+    def get_payload(self, identifier, filename):
+        cursor = self._connection.execute(
+            'SELECT data FROM payloads WHERE id = ? AND filename = ?',
+            (identifier, filename))
+        row = cursor.fetchone()
+        if row is None:
+            raise KeyError('No payload {} for {}'.format(filename, identifier))
+        return bytes(row[0])
+
+    def processing_queue(self, page_size):
+        (total,) = self._connection.execute(
+            'SELECT COUNT(*) FROM documents WHERE processed = 0').fetchone()
+        logger.info('{} entries to process'.format(total))
+        last = ''
+        while True:
+            rows = self._connection.execute(
+                'SELECT id, uri FROM documents WHERE processed = 0 AND id > ? '
+                'ORDER BY id LIMIT ?', (last, page_size)).fetchall()
+            for (_, uri) in rows:
+                yield uri
+            if len(rows) < page_size:
+                break
+            last = rows[-1][0]
+
+    def changes(self, since, timeout):
+        # Poll the database until something changes or we time out
+        deadline = time.time() + timeout / 1000.0
+        while True:
+            (last_seq,) = self._connection.execute(
+                'SELECT COALESCE(MAX(seq), ?) FROM documents', (since,)).fetchone()
+            rows = self._connection.execute(
+                'SELECT seq, uri FROM documents WHERE processed = 0 '
+                'AND seq > ? AND seq <= ? ORDER BY seq',
+                (since, last_seq)).fetchall()
+            if len(rows) > 0 or time.time() >= deadline:
+                return (rows, last_seq)
+            time.sleep(0.5)
@@ -0,0 +1,60 @@
+'''
+Created on 18 Oct 2026
+
+Stardog backend for the index, talking to a remote server over HTTP
+'''
+from indexer.storage.backends.base import IndexBackend
+from indexer.storage.sparql import SPARQLClient
+import json
+
+import logging
+logger = logging.getLogger(__name__)
+
+class StardogBackend(SPARQLClient, IndexBackend):
+    '''
+    Index backend using a database of a Stardog server. The queries and the
+    transactions go through the SPARQL protocol client, the database is
+    managed with the admin API
+    '''
+    def __init__(self, config):
+        '''
+        Constructor
+
+        @param config: the Config object wrapping the configuration file
+        '''
+        SPARQLClient.__init__(self, config)
+        self.store_url = config.stardog_url()
+        self.db_name = config.stardog_db()
+
+    def _databases(self):
+        response = self.session.get(self.store_url + 'admin/databases',
+                                    timeout=self.timeout)
+        return json.loads(response.content.decode())['databases']
+
+    def exists(self):
+        return self.db_name in self._databases()
+
+    def reset(self):
+        # If the DB is already there just delete it
+        if self.db_name in self._databases():
+            self.session.delete(self.store_url + 'admin/databases/' + self.db_name,
+                                timeout=self.timeout)
+
+        # Parameters for the reasoning DB
+        # more options http://docs.stardog.com/#_database_admin
+        parameters = {"dbname" : self.db_name,
+                      "options" : {"search.enabled" : True,
+                                   "query.all.graphs": True,
+                                   "index.type": "disk"},
+                      "files": []}
+        files = {'data': ('data', json.dumps(parameters), 'application/json')}
+
+        # Create the DB
+        response = self.session.post(self.store_url + 'admin/databases',
+                                     files=files, timeout=self.timeout)
+        if response.status_code == 201:
+            logger.info('Created DB \"{}\"'.format(self.db_name))
+            return True
+        logger.error('Could not create \"{}\"'.format(self.db_name))
+        logger.error(response.content.decode())
+        return False
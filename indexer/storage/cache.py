@@ -3,52 +3,61 @@ Created on 1 Apr 2016
 
 @author: guerec01
 '''
+import collections
 import datetime
 import hashlib
-from couchdb.client import Server
-from couchdb import http
+import itertools
+import threading
+import time
 from rdflib.graph import Graph
+from rdflib.namespace import OWL
+from rdflib.term import BNode, Literal, URIRef
+from rdflib.compare import to_canonical_graph
+from indexer.storage import codecs
+from indexer.storage.graphcache import GraphCache
+from indexer.storage.backends.base import ConflictError
+from indexer.util.rules import rule_predicates
+from indexer.util.metrics import CACHE_SECONDS, CACHE_DOCUMENTS
 
 import logging
 logger = logging.getLogger(__name__)
 
-def index_doc():
-    '''
-    This function returns the index used by CouchDB to search for metadata
-    documents based on the URI of the graph they contain
-    '''
-    return  {
-        "_id": "_design/index",
-        "views": {
-            "by_resource": {
-                "map": """
-                    function(doc) {
-                    if ('@id' in doc) {
-                        emit(doc['@id'], {'rev': doc._rev, 'g': doc._id})
-                        }
-                    }
-                    """
-            },
-            "processing_queue": {
-                "map": """
-                    function(doc) {
-                    if ('processed' in doc && !doc['processed']) {
-                        emit(doc._id, doc['@id'])
-                        }
-                    }
-                    """
-            }
-        }
-    }
+# The local document keeping track of the changes feed when following the
+# processing queue
+CHECKPOINT_ID = '_local/processing_checkpoint'
 
-def filter_triples(graph):
+def filter_triples(graph, languages=None, predicates=None):
     '''
     Utility function to remove triples that we don't need in the cache
     (essentially, literals not in Welsh or English)
     
-    TODO: Implement this
+    @param graph: the graph to filter
+    @param languages: the language tags allowed for the literals, literals
+    with another language tag are removed. None to keep all the literals
+    @param predicates: the predicates to keep, typically those used by the
+    rules. None to keep all the predicates
+    @return: the filtered graph
     '''
-    return graph
+    # Nothing to do if there is no filter
+    if languages is None and predicates is None:
+        return graph
+    
+    filtered_graph = Graph()
+    for (s, p, o) in graph:
+        if predicates is not None and p not in predicates:
+            continue
+        if languages is not None and isinstance(o, Literal) and \
+            o.language is not None:
+            # Accept a language if either its full tag or its primary
+            # subtag (e.g. "en" for "en-GB") is allowed
+            language = o.language.lower()
+            if language not in languages and \
+                language.split('-')[0] not in languages:
+                continue
+        filtered_graph.add((s, p, o))
+    
+    logger.debug('Pruned {} triple(s)'.format(len(graph) - len(filtered_graph)))
+    return filtered_graph
 
 def get_identifier(uri):
     '''
@@ -56,6 +65,77 @@ def get_identifier(uri):
     '''
     return hashlib.md5(uri.encode()).hexdigest()
 
+def get_blob_identifier(digest):
+    '''
+    Utility function to get the identifier of the document holding the
+    payload matching a given content hash
+    '''
+    return 'blob-' + digest
+
+def graph_hash(graph):
+    '''
+    Utility function to compute a hash of the content of a graph. Blank
+    nodes are canonicalised first so that two isomorphic graphs always get
+    the same hash
+    '''
+    if any(isinstance(term, BNode) for triple in graph for term in triple):
+        graph = to_canonical_graph(graph)
+    statements = sorted(' '.join(term.n3() for term in triple) for triple in graph)
+    return hashlib.sha256('\n'.join(statements).encode()).hexdigest()
+
+def same_as_links(graph):
+    '''
+    Utility function to get the sameAs links between the URIs of a graph,
+    they are kept along with the metadata of the cached entries
+    
+    @return: a sorted list of [subject, object] pairs
+    '''
+    return sorted([str(s), str(o)] for (s, o) in graph.subject_objects(OWL.sameAs)
+                  if isinstance(s, URIRef) and isinstance(o, URIRef))
+
+def prepare_entry(uri, graph, codec=None, languages=None, predicates=None):
+    '''
+    Utility function to do all the CPU intensive work needed before a graph
+    can be written to the cache: filtering, hashing and serialising. This is
+    independent from any connection to the store so that it can be done in
+    a separate process
+    
+    @param uri: the URI of the cached resource
+    @param graph: the graph describing the resource
+    @param codec: the name of the codec to serialise the graph with. If None
+    keep the graph and serialise it only if the payload has to be written
+    @param languages: the languages to keep, see filter_triples()
+    @param predicates: the predicates to keep, see filter_triples()
+    @return: a dictionary describing the entry
+    '''
+    filtered_graph = filter_triples(graph, languages, predicates)
+    entry = {'uri': uri,
+             'identifier': get_identifier(uri),
+             'hash': graph_hash(filtered_graph),
+             'size': len(filtered_graph),
+             'pruned': len(graph) - len(filtered_graph),
+             'same_as': same_as_links(filtered_graph)}
+    if codec is not None:
+        entry['payload'] = codecs.encode(filtered_graph, codec)
+        entry['codec'] = codec
+    else:
+        entry['graph'] = filtered_graph
+    return entry
+
+def get_backend(config, **client_opts):
+    '''
+    Utility function to instantiate the backend selected in the
+    configuration file
+    '''
+    backend = config.cache_backend()
+    if backend == 'couchdb':
+        from indexer.storage.backends.couch import CouchDBBackend
+        return CouchDBBackend(config, **client_opts)
+    elif backend == 'sqlite':
+        from indexer.storage.backends.sqlite import SQLiteBackend
+        return SQLiteBackend(config)
+    raise ValueError('Unknown cache backend "{}"'.format(backend))
+
 class CacheStore(object):
     '''
     Interface to the data store containing all the cached resources
@@ -67,52 +147,93 @@ class CacheStore(object):
         @param config: the Config object wrapping the configuration file
         '''
         # Get the config
-        url = config.couchdb_url()
-        self.db_name = config.couchdb_db()
+        self.codec = config.couchdb_codec()
+        codecs.get_codec(self.codec)
         
-        # Connect to CouchDB
-        self._server = Server(url=url, **client_opts)
+        # Get the optional cache of parsed graphs
+        self.graph_cache = None
+        if config.graph_cache_triples() > 0:
+            self.graph_cache = GraphCache(config.graph_cache_triples(),
+                                          config.graph_cache_directory())
         
-        # Initialise the DB if needed
-        self._init_db()
-    
-    def _init_db(self):
-        '''
-        Initialise the DB if needed. Also add the index document if that one
-        is not already there
-        '''
-        try:
-            self._db = self._server[self.db_name]
-        except http.ResourceNotFound:
-            self._db = self._server.create(self.db_name)
-            
-        if not '_design/index' in self._db:
-            self._db.save(index_doc())
+        # Get the filters to apply to the graphs before caching them
+        self.filters = {'languages': config.ingest_languages(),
+                        'predicates': None}
+        if config.ingest_prune_predicates():
+            self.filters['predicates'] = rule_predicates(config.rules())
+        
+        # Connect to the backend
+        self._backend = get_backend(config, **client_opts)
         
     def reset_db(self):
         '''
         Clean the DB of its current content
         '''
         logger.info('Cleaning the content of the cache store')
-        self._server.delete(self.db_name)
-        self._init_db()
+        self._backend.reset()
         
     def contains(self, uri):
         '''
         Returns True if the URI is already cached
         '''
-        return len(self._db.view('index/by_resource', key=uri).rows) > 0
+        return self._backend.contains(uri)
 
-    def get_processing_queue(self):
+    def get_processing_queue(self, page_size=1000):
         '''
         Returns the processing queue. This is the list of all the cache
         entries which have been marked as "processed = False" because they
-        were updated or newly inserted
+        were updated or newly inserted. The queue is returned as a generator
+        reading the queue one page at a time
+        
+        @param page_size: the number of entries to fetch in one request
+        '''
+        return self._backend.processing_queue(page_size)
+    
+    def follow_processing_queue(self, is_running, timeout=10000):
+        '''
+        Follow the processing queue using the changes feed of the backend.
+        This returns the entries already in the queue and then waits for new
+        entries to be added to it until is_running() returns False. The
+        position in the feed is saved so that the next call resumes where
+        this one stopped, but only up to the entries acknowledged with
+        done() once they are written to the index
+        
+        @param is_running: a function returning False when we should stop
+        @param timeout: how long to wait for new changes in one request, in
+        milliseconds
+        @return: a QueueFollower to iterate over
+        '''
+        return QueueFollower(self, is_running, timeout)
+    
+    def _get_checkpoint(self):
         '''
-        queue = []
-        for row in self._db.view('index/processing_queue').rows:
-            queue.append(row.value)
-        return queue
+        Get the last position in the changes feed that was processed
+        '''
+        checkpoint = self._backend.get(CHECKPOINT_ID)
+        return checkpoint['since'] if checkpoint is not None else 0
+    
+    def _save_checkpoint(self, since):
+        '''
+        Save the last position in the changes feed that was processed
+        '''
+        checkpoint = self._backend.get(CHECKPOINT_ID) or {'_id': CHECKPOINT_ID}
+        if checkpoint.get('since') != since:
+            checkpoint['since'] = since
+            self._backend.save(checkpoint)
+    
+    def mark_processed(self, uri):
+        '''
+        Remove an entry from the processing queue
+        '''
+        metadata = self._backend.get(get_identifier(uri))
+        if metadata is None or metadata.get('processed', True):
+            return
+        metadata['processed'] = True
+        try:
+            self._backend.save(metadata)
+        except ConflictError:
+            # The entry has just been updated and has to be processed again
+            logger.debug('{} changed while being processed'.format(uri))
     
     def store(self, uri, graph):
         '''
@@ -120,44 +241,259 @@ class CacheStore(object):
         The actual operation performed is either an update or an insert
         depending if the resource was already cached or not
         '''
-        # Generate an identifier based on the URI
-        identifier = get_identifier(uri)
+        self.store_many([(uri, graph)])
+    
+    def store_many(self, entries):
+        '''
+        Store a batch of payloads
         
-        # Filter out some triples from the graph
-        filtered_graph = filter_triples(graph)
+        @param entries: a list of (uri, graph) tuples
+        @return: a summary of the operation, see write_entries()
+        '''
+        return self.write_entries([prepare_entry(uri, graph, **self.filters)
+                                   for (uri, graph) in entries])
+    
+    def write_entries(self, entries):
+        '''
+        Write a batch of prepared entries using two requests to the backend:
+        one to fetch the current metadata documents and one to insert or
+        update all of them at once. The payloads are attached to documents
+        identified by the hash of their content so that identical
+        payloads are only stored once. Entries whose content did not change
+        are left untouched and are not queued for processing again
         
-        # If the resource is already there fetch the previous metadata doc
-        if self.contains(uri):
-            metadata = self._db.get(identifier)
-        else:
-            metadata = {'_id': identifier, '@id': uri}
+        @param entries: a list of entries as returned by prepare_entry()
+        @return: a summary with the number of documents written, skipped and
+        deduplicated, the number of triples pruned by the filters and the list
+        of URIs that could not be stored
+        '''
+        start = time.perf_counter()
+        summary = {'written': 0, 'skipped': 0, 'deduplicated': 0,
+                   'pruned': 0, 'conflicts': []}
+        
+        # A graph read again, for instance from a file which is not grouped
+        # by graph, replaces the version read before
+        entries = list(dict((entry['identifier'], entry) for entry in entries).values())
+        uris = dict((entry['identifier'], entry['uri']) for entry in entries)
+        
+        # Get the metadata documents and the payloads already cached
+        keys = [entry['identifier'] for entry in entries]
+        keys += [get_blob_identifier(d) for d in set(e['hash'] for e in entries)]
+        existing = self._backend.get_many(keys)
+        
+        # Prepare all the documents
+        documents = []
+        for entry in entries:
+            summary['pruned'] += entry.get('pruned', 0)
             
-        # Update the metadata
-        metadata['size'] = len(filtered_graph)
-        metadata['last_updated'] = datetime.datetime.now().isoformat()
-        metadata['processed'] = False
-
-        # Save (insert or update) the metadata
-        self._db.save(metadata)
+            # Skip the resources for which the content is unchanged
+            identifier = entry['identifier']
+            digest = entry['hash']
+            metadata = existing.get(identifier,
+                                    {'_id': identifier, '@id': entry['uri']})
+            if metadata.get('hash') == digest:
+                summary['skipped'] += 1
+                continue
+            
+            # Store the payload unless it is already there
+            blob_identifier = get_blob_identifier(digest)
+            if blob_identifier in existing:
+                summary['deduplicated'] += 1
+            else:
+                codec = entry.get('codec', self.codec)
+                if 'payload' in entry:
+                    payload = entry['payload']
+                else:
+                    payload = codecs.encode(entry['graph'], codec)
+                (_, _, content_type, extension) = codecs.get_codec(codec)
+                blob = {'_id': blob_identifier, 'codec': codec,
+                        '_payload': (digest + extension, content_type, payload)}
+                existing[blob_identifier] = blob
+                documents.append(blob)
+            
+            # Update the metadata. Legacy entries have the payload attached
+            # to the metadata, we drop it as it is now stored in a blob
+            metadata.pop('_attachments', None)
+            metadata['size'] = entry['size']
+            metadata['hash'] = digest
+            metadata['same_as'] = entry['same_as']
+            metadata['codec'] = existing[blob_identifier].get('codec',
+                                                              codecs.DEFAULT_CODEC)
+            metadata['last_updated'] = datetime.datetime.now().isoformat()
+            metadata['processed'] = False
+            documents.append(metadata)
+        
+        # Save (insert or update) all the documents at once
+        for (success, identifier, error) in self._backend.save_many(documents):
+            if identifier not in uris:
+                # Conflicts on blobs only mean the same payload got written
+                # concurrently
+                continue
+            if success:
+                summary['written'] += 1
+            else:
+                logger.warning('Could not store {} : {}'.format(uris[identifier], error))
+                summary['conflicts'].append(uris[identifier])
+        
+        # Keep track of the time spent and of the outcomes
+        CACHE_SECONDS.observe(time.perf_counter() - start, operation='write')
+        for outcome in ['written', 'skipped', 'deduplicated']:
+            CACHE_DOCUMENTS.inc(summary[outcome], outcome=outcome)
+        CACHE_DOCUMENTS.inc(len(summary['conflicts']), outcome='conflict')
         
-        # Save the graph as a binary payload attached to the metadata
-        self._db.put_attachment(metadata, filtered_graph.serialize(format='turtle'),
-                                filename=identifier + '.ttl',
-                                content_type='text/turtle')
+        return summary
     
     def retrieve(self, uri):
         '''
-        Retrieve a graph from the cache
+        Retrieve a graph from the cache. The graph returned may be shared
+        with the cache of parsed graphs and must not be modified
+        
+        @return: the graph or None if the URI is not in the cache
         '''
         logger.debug('Fetch {}'.format(uri))
         
         # Generate an identifier based on the URI
         identifier = get_identifier(uri)
+        
+        # Find the document holding the payload. Legacy entries have the
+        # payload attached to the metadata document and use Turtle
+        start = time.perf_counter()
+        metadata = self._backend.get(identifier)
+        if metadata is None:
+            return None
+        
+        # Use the parsed graph if we have it for this content. Legacy entries
+        # have no hash, their revision changes with their content
+        version = metadata.get('hash', metadata['_rev'])
+        if self.graph_cache is not None:
+            graph = self.graph_cache.get(identifier, version)
+            if graph is not None:
+                return graph
+        
+        codec = metadata.get('codec', codecs.DEFAULT_CODEC)
+        extension = codecs.get_codec(codec)[3]
+        if 'hash' in metadata:
+            blob_identifier = get_blob_identifier(metadata['hash'])
+            filename = metadata['hash'] + extension
+        else:
+            blob_identifier = identifier
+            filename = identifier + extension
 
-        # Get the attached data and parse it
-        data = self._db.get_attachment(identifier, filename=identifier + '.ttl').read()
-        graph = Graph()
-        graph.parse(data=data, format="turtle")
+        # Get the attached data and decode it
+        data = self._backend.get_payload(blob_identifier, filename)
+        CACHE_SECONDS.observe(time.perf_counter() - start, operation='fetch')
+        with CACHE_SECONDS.time(operation='decode'):
+            graph = codecs.decode(data, codec)
+        
+        # Keep the parsed graph for next time
+        if self.graph_cache is not None:
+            self.graph_cache.put(identifier, version, graph)
                 
         # Return the graph
         return graph
+    
+    def same_as_links(self, uris, page_size=1000):
+        '''
+        Get the sameAs links between the URIs of a set of cached entries
+        without fetching their payloads. The links are kept in the metadata
+        documents, only the entries cached before that are fetched in full
+        
+        @param uris: an iterable over the URIs of the entries
+        @param page_size: the number of metadata documents to get at once
+        @return: a generator of (subject, object) tuples
+        '''
+        uris = iter(uris)
+        while True:
+            page = dict((get_identifier(uri), uri) for uri in itertools.islice(uris, page_size))
+            if len(page) == 0:
+                break
+            documents = self._backend.get_many(list(page))
+            for (identifier, uri) in page.items():
+                metadata = documents.get(identifier)
+                if metadata is None:
+                    continue
+                if 'same_as' in metadata:
+                    links = metadata['same_as']
+                else:
+                    links = same_as_links(self.retrieve(uri))
+                for (s, o) in links:
+                    yield (URIRef(s), URIRef(o))
+    
+    def graph_cache_stats(self):
+        '''
+        Return the counters of the cache of parsed graphs, or None if there
+        is no such cache
+        '''
+        if self.graph_cache is None:
+            return None
+        return dict(self.graph_cache.stats)
+
+class QueueFollower(object):
+    '''
+    Iterator over the entries of the processing queue, following the changes
+    feed of the backend. The entries are handed over before they are
+    processed, possibly several at once, so the position saved in the feed
+    only moves past an entry once it has been acknowledged with done().
+    The entries which were handed over but not written when the process
+    stops are returned again by the next one
+    '''
+    def __init__(self, cache_store, is_running, timeout):
+        '''
+        Constructor
+        
+        @param cache_store: the CacheStore to follow the queue of
+        @param is_running: a function returning False when we should stop
+        @param timeout: how long to wait for new changes in one request, in
+        milliseconds
+        '''
+        self.cache_store = cache_store
+        self.is_running = is_running
+        self.timeout = timeout
+        
+        # The positions in the feed which are not saved yet, in order, as
+        # lists [seq, uri, acknowledged]. The end of every page of changes
+        # is in there as well, without URI
+        self._positions = collections.deque()
+        self._lock = threading.Lock()
+        self.since = cache_store._get_checkpoint()
+    
+    def __iter__(self):
+        logger.info('Following the processing queue since {}'.format(self.since))
+        since = self.since
+        try:
+            while self.is_running():
+                (changes, since) = self.cache_store._backend.changes(since, self.timeout)
+                for (seq, uri) in changes:
+                    if not self.is_running():
+                        return
+                    with self._lock:
+                        self._positions.append([seq, uri, False])
+                    yield uri
+                with self._lock:
+                    self._positions.append([since, None, True])
+                self.save()
+        finally:
+            self.save()
+    
+    def done(self, uri):
+        '''
+        Acknowledge an entry written to the index
+        '''
+        with self._lock:
+            for position in self._positions:
+                if position[1] == uri and not position[2]:
+                    position[2] = True
+                    break
+            
+            # Move on up to the first entry not written yet
+            while len(self._positions) > 0 and self._positions[0][2]:
+                self.since = self._positions.popleft()[0]
+    
+    def save(self):
+        '''
+        Save the position in the feed up to which all the entries have been
+        written to the index
+        '''
+        with self._lock:
+            since = self.since
+        self.cache_store._save_checkpoint(since)
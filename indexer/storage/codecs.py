@@ -0,0 +1,170 @@
+'''
+Created on 18 Oct 2026
+
+Codecs used to turn the graphs stored in the cache into binary payloads
+and back
+'''
+from rdflib.graph import Graph
+from rdflib.term import URIRef, BNode, Literal
+import gzip
+import struct
+import sys
+import zlib
+from array import array
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Header of the payloads using the binary codec
+BINARY_MAGIC = b'IDXB1'
+
+# Kinds of terms in the dictionary of the binary codec
+URI, BLANK, PLAIN, LANG, TYPED = range(5)
+
+def _serialize_nt(graph):
+    return graph.serialize(format='nt', encoding='utf-8')
+
+def _parse_nt(data):
+    graph = Graph()
+    graph.parse(data=data.decode('utf-8'), format='nt')
+    return graph
+
+def _compress_zstd(data):
+    return zstandard.ZstdCompressor().compress(data)
+
+def _decompress_zstd(data):
+    return zstandard.ZstdDecompressor().decompress(data)
+
+def _pack_string(value):
+    data = value.encode('utf-8')
+    return struct.pack('<I', len(data)) + data
+
+def encode_binary(graph):
+    '''
+    Encode a graph as a dictionary of terms followed by the triples
+    expressed as three integers pointing to entries in the dictionary. The
+    whole thing is compressed with zlib
+    '''
+    terms = {}
+    dictionary = []
+    triples = array('I')
+    for triple in graph:
+        for term in triple:
+            if term not in terms:
+                terms[term] = len(terms)
+                if isinstance(term, URIRef):
+                    dictionary.append(struct.pack('<B', URI) + _pack_string(term))
+                elif isinstance(term, BNode):
+                    dictionary.append(struct.pack('<B', BLANK) + _pack_string(term))
+                elif term.language is not None:
+                    dictionary.append(struct.pack('<B', LANG) + _pack_string(term)
+                                      + _pack_string(term.language))
+                elif term.datatype is not None:
+                    dictionary.append(struct.pack('<B', TYPED) + _pack_string(term)
+                                      + _pack_string(term.datatype))
+                else:
+                    dictionary.append(struct.pack('<B', PLAIN) + _pack_string(term))
+            triples.append(terms[term])
+    if sys.byteorder == 'big':
+        triples.byteswap()
+
+    data = BINARY_MAGIC + struct.pack('<II', len(dictionary), len(triples) // 3)
+    data += b''.join(dictionary) + triples.tobytes()
+    return zlib.compress(data, 1)
+
+def decode_binary(data):
+    '''
+    Decode a graph encoded with encode_binary()
+    '''
+    data = zlib.decompress(data)
+    if not data.startswith(BINARY_MAGIC):
+        raise ValueError('Not a binary graph payload')
+    position = len(BINARY_MAGIC)
+    (nb_terms, nb_triples) = struct.unpack_from('<II', data, position)
+    position += 8
+
+    def read_string():
+        nonlocal position
+        (length,) = struct.unpack_from('<I', data, position)
+        position += 4 + length
+        return data[position - length:position].decode('utf-8')
+
+    # Rebuild the dictionary of terms
+    dictionary = []
+    for _ in range(nb_terms):
+        kind = data[position]
+        position += 1
+        value = read_string()
+        if kind == URI:
+            dictionary.append(URIRef(value))
+        elif kind == BLANK:
+            dictionary.append(BNode(value))
+        elif kind == LANG:
+            dictionary.append(Literal(value, lang=read_string()))
+        elif kind == TYPED:
+            dictionary.append(Literal(value, datatype=URIRef(read_string())))
+        else:
+            dictionary.append(Literal(value))
+
+    # Rebuild the triples
+    triples = array('I')
+    triples.frombytes(data[position:position + nb_triples * 12])
+    if sys.byteorder == 'big':
+        triples.byteswap()
+    graph = Graph()
+    for index in range(0, len(triples), 3):
+        graph.add((dictionary[triples[index]],
+                   dictionary[triples[index + 1]],
+                   dictionary[triples[index + 2]]))
+    return graph
+
+# All the codecs, by name: (encode, decode, content type, file extension)
+CODECS = {
+    'turtle': (lambda graph: graph.serialize(format='turtle', encoding='utf-8'),
+               lambda data: Graph().parse(data=data.decode('utf-8'), format='turtle'),
+               'text/turtle', '.ttl'),
+    'nt': (_serialize_nt,
+           _parse_nt,
+           'application/n-triples', '.nt'),
+    'nt.gz': (lambda graph: gzip.compress(_serialize_nt(graph), 6),
+              lambda data: _parse_nt(gzip.decompress(data)),
+              'application/gzip', '.nt.gz'),
+    'nt.zst': (lambda graph: _compress_zstd(_serialize_nt(graph)),
+               lambda data: _parse_nt(_decompress_zstd(data)),
+               'application/zstd', '.nt.zst'),
+    'binary': (encode_binary,
+               decode_binary,
+               'application/octet-stream', '.bin')
+}
+
+# The codec used by the entries that do not say which one they use
+DEFAULT_CODEC = 'turtle'
+
+def get_codec(name):
+    '''
+    Return the codec with the given name as a tuple (encode, decode,
+    content type, file extension)
+    '''
+    if name not in CODECS:
+        raise ValueError('Unknown codec "{}"'.format(name))
+    if name == 'nt.zst' and zstandard is None:
+        raise ValueError('The "nt.zst" codec needs the optional "zstandard" '
+                         'module, install it or use another codec')
+    return CODECS[name]
+
+def encode(graph, name):
+    '''
+    Encode a graph using the codec with the given name
+    '''
+    return get_codec(name)[0](graph)
+
+def decode(data, name):
+    '''
+    Decode a payload using the codec with the given name
+    '''
+    return get_codec(name)[1](data)
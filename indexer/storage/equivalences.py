@@ -0,0 +1,177 @@
+'''
+Created on 18 Oct 2026
+
+Local persistent index of the owl:sameAs links between the proxies and the
+URIs they stand for. It mirrors what is stored in the triple store so that
+finding the proxy of a URI does not need a query to the triple store
+'''
+from rdflib.term import URIRef
+import datetime
+import sqlite3
+import threading
+
+import logging
+logger = logging.getLogger(__name__)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS links (
+    graph TEXT NOT NULL,
+    uri TEXT NOT NULL,
+    proxy TEXT NOT NULL,
+    PRIMARY KEY (graph, uri, proxy)
+);
+CREATE INDEX IF NOT EXISTS links_uri ON links (uri);
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+) WITHOUT ROWID;
+'''
+
+# Size of the memory mapped part of the database file
+MMAP_SIZE = 1 << 30
+
+class EquivalenceIndex(object):
+    '''
+    Persistent map URI -> proxy URI kept in a SQLite database. The file is
+    memory mapped so that looking a URI up does not hit the disk once the
+    pages are in the OS cache. Every link is kept with the named graph it
+    was read from so that the links of a document can be replaced along
+    with its graph
+    '''
+    def __init__(self, path):
+        '''
+        Constructor
+
+        @param path: the location of the database file
+        '''
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=60,
+                                           check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute('PRAGMA mmap_size={}'.format(MMAP_SIZE))
+        self._connection.executescript(SCHEMA)
+
+    def reset(self):
+        '''
+        Remove all the equivalences. The index is not built anymore until
+        mark_built() is called
+        '''
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM links')
+            self._connection.execute("DELETE FROM state WHERE key = 'built'")
+
+    def mark_built(self):
+        '''
+        Record that the index has all the equivalences of the triple store
+        '''
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO state VALUES ('built', ?)",
+                (datetime.datetime.now().isoformat(),))
+
+    def is_built(self):
+        '''
+        Returns True if the index has all the equivalences of the triple
+        store. A new index is empty and can not be used until it is built
+        '''
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value FROM state WHERE key = 'built'").fetchone()
+        return row is not None
+
+    def __len__(self):
+        '''
+        Number of URIs which have a proxy
+        '''
+        with self._lock:
+            (count,) = self._connection.execute(
+                'SELECT COUNT(DISTINCT uri) FROM links').fetchone()
+        return count
+
+    def get(self, uri):
+        '''
+        Get the proxy URI of a URI, or None if there is no proxy for it. As
+        for the triple store the first proxy recorded for a URI is the one
+        used
+        '''
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT proxy FROM links WHERE uri = ? ORDER BY rowid LIMIT 1',
+                (str(uri),)).fetchone()
+        return URIRef(row[0]) if row is not None else None
+
+    def get_many(self, uris):
+        '''
+        Get the proxy URIs of several URIs at once
+
+        @return: a dictionary URI -> proxy URI with only the URIs for which
+        a proxy was found
+        '''
+        proxies = {}
+        uris = list(set(str(uri) for uri in uris))
+        # Stay below the maximum number of parameters of SQLite
+        with self._lock:
+            for start in range(0, len(uris), 500):
+                chunk = uris[start:start + 500]
+                cursor = self._connection.execute(
+                    'SELECT uri, proxy FROM links WHERE uri IN ({}) '
+                    'ORDER BY rowid'.format(','.join('?' * len(chunk))), chunk)
+                for (uri, proxy) in cursor:
+                    proxies.setdefault(URIRef(uri), URIRef(proxy))
+        return proxies
+
+    def links(self):
+        '''
+        Iterate over all the recorded links
+
+        @return: an iterator over (graph URI, proxy URI, URI) tuples
+        '''
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT graph, proxy, uri FROM links').fetchall()
+        for (graph, proxy, uri) in rows:
+            yield (URIRef(graph), URIRef(proxy), URIRef(uri))
+
+    def add_many(self, links):
+        '''
+        Record some equivalences
+
+        @param links: an iterable over (graph URI, proxy URI, URI) tuples
+        '''
+        rows = [(str(graph), str(uri), str(proxy))
+                for (graph, proxy, uri) in links if proxy != uri]
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'INSERT OR IGNORE INTO links VALUES (?, ?, ?)', rows)
+
+    def replace_many(self, graphs):
+        '''
+        Replace all the equivalences read from some named graphs, the links
+        which are no longer in a graph are forgotten
+
+        @param graphs: an iterable over (graph URI, pairs) tuples with pairs
+        an iterable over the (proxy URI, URI) links now in the graph
+        '''
+        graphs = [(str(graph), set((str(uri), str(proxy))
+                                   for (proxy, uri) in pairs if proxy != uri))
+                  for (graph, pairs) in graphs]
+        with self._lock, self._connection:
+            for (graph, pairs) in graphs:
+                # Only touch the links which changed, the ones kept stay in
+                # the position they had in the order of recording
+                known = set(self._connection.execute(
+                    'SELECT uri, proxy FROM links WHERE graph = ?', (graph,)))
+                self._connection.executemany(
+                    'DELETE FROM links WHERE graph = ? AND uri = ? AND proxy = ?',
+                    [(graph, uri, proxy) for (uri, proxy) in known - pairs])
+                self._connection.executemany(
+                    'INSERT INTO links VALUES (?, ?, ?)',
+                    [(graph, uri, proxy) for (uri, proxy) in pairs - known])
+
+    def close(self):
+        '''
+        Close the database
+        '''
+        self._connection.close()
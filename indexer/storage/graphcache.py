@@ -0,0 +1,120 @@
+'''
+Created on 18 Oct 2026
+
+Cache of parsed graphs kept in front of the cache store to avoid fetching
+and parsing popular documents over and over again
+'''
+from collections import OrderedDict
+from indexer.storage.codecs import encode_binary, decode_binary
+import glob
+import os
+import threading
+
+import logging
+logger = logging.getLogger(__name__)
+
+class GraphCache(object):
+    '''
+    Two tiers cache of parsed graphs. The first tier is kept in memory and
+    holds at most a given number of triples, the least recently used graphs
+    being evicted first. The second, optional, tier is a directory with the
+    graphs encoded in the binary format. The graphs are identified by a
+    document identifier and the version of their content, its hash, so that
+    getting a graph for a new version of a document automatically
+    invalidates the previous one.
+
+    The graphs returned by the cache are shared and must not be modified.
+    The cache can be used from several threads.
+    '''
+    def __init__(self, max_triples, directory=None):
+        '''
+        Constructor
+
+        @param max_triples: the maximum number of triples kept in memory
+        @param directory: the directory to use for the disk tier, None to
+        disable it
+        '''
+        self.max_triples = max_triples
+        self.directory = directory
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        # The memory tier, graphs and their version indexed by identifier
+        self._graphs = OrderedDict()
+        self._triples = 0
+        self._lock = threading.Lock()
+
+        # The counters
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0,
+                      'evictions': 0}
+
+    def get(self, identifier, version):
+        '''
+        Get a graph from the cache
+
+        @return: the graph or None if it is not cached
+        '''
+        # Look in memory first
+        with self._lock:
+            if identifier in self._graphs:
+                (cached_version, graph) = self._graphs[identifier]
+                if cached_version == version:
+                    self._graphs.move_to_end(identifier)
+                    self.stats['memory_hits'] += 1
+                    return graph
+
+        # Then look on disk
+        if self.directory is not None:
+            file_name = self._file_name(identifier, version)
+            if os.path.exists(file_name):
+                with open(file_name, 'rb') as graph_file:
+                    graph = decode_binary(graph_file.read())
+                self._keep(identifier, version, graph, 'disk_hits')
+                return graph
+
+        with self._lock:
+            self.stats['misses'] += 1
+        return None
+
+    def put(self, identifier, version, graph):
+        '''
+        Add a graph to the cache, replacing the graphs cached for previous
+        versions of the same document
+        '''
+        self._keep(identifier, version, graph)
+
+        # Write the graph on disk
+        if self.directory is not None:
+            for file_name in glob.glob(self._file_name(identifier, '*')):
+                os.remove(file_name)
+            file_name = self._file_name(identifier, version)
+            with open(file_name + '.tmp', 'wb') as graph_file:
+                graph_file.write(encode_binary(graph))
+            os.replace(file_name + '.tmp', file_name)
+
+    def _keep(self, identifier, version, graph, counter=None):
+        '''
+        Keep a graph in memory, evicting the least recently used ones if
+        there are too many triples
+
+        @param counter: the name of a counter to increment, if any
+        '''
+        with self._lock:
+            if counter is not None:
+                self.stats[counter] += 1
+
+            # Forget about the previous version
+            if identifier in self._graphs:
+                self._triples -= len(self._graphs.pop(identifier)[1])
+            if len(graph) > self.max_triples:
+                return
+
+            self._graphs[identifier] = (version, graph)
+            self._triples += len(graph)
+            while self._triples > self.max_triples:
+                (_, (_, evicted)) = self._graphs.popitem(last=False)
+                self._triples -= len(evicted)
+                self.stats['evictions'] += 1
+
+    def _file_name(self, identifier, version):
+        return os.path.join(self.directory, '{}-{}.bin'.format(identifier, version))
@@ -9,13 +9,35 @@ from rdflib.namespace import OWL, RDF, RDFS
 from indexer.util.namespaces import OLO
 from rdflib.graph import Graph
 from rdflib.term import URIRef, BNode, Literal
-from SPARQLWrapper import SPARQLWrapper, JSON, POST
+from indexer.util.metrics import PROCESS_SECONDS
+from indexer.storage.equivalences import EquivalenceIndex
+from indexer.storage.rewrites import RewriteLog, collapse
+from indexer.storage.outputs import OutputStore
 
 import logging
-import requests
-import json
+import os
 logger = logging.getLogger(__name__)
 
+# Maximum number of URIs resolved in one proxy lookup query
+PROXY_LOOKUP_CHUNK = 500
+
+# Number of equivalences read at once when rebuilding the local index
+EQUIVALENCES_PAGE_SIZE = 10000
+
+def get_backend(config):
+    '''
+    Utility function to instantiate the index backend selected in the
+    configuration file
+    '''
+    backend = config.index_backend()
+    if backend == 'stardog':
+        from indexer.storage.backends.stardog import StardogBackend
+        return StardogBackend(config)
+    elif backend == 'embedded':
+        from indexer.storage.backends.embedded import EmbeddedBackend
+        return EmbeddedBackend(config)
+    raise ValueError('Unknown index backend "{}"'.format(backend))
+
 class IndexStore(object):
     '''
     Interface to the store containing the data about the proxy entities, the
@@ -29,50 +51,57 @@ class IndexStore(object):
         @param base: the base for all the minted URIs
         @param store: location of the triple store
         '''
-        # The URIs for the store
-        self.store_url = config.stardog_url()
-        self.db_name = config.stardog_db()
-        self.sparql = config.stardog_url() + config.stardog_db() + '/query'
-        self.sparul = config.stardog_url() + config.stardog_db() + '/update'
+        # The store selected in the configuration
+        self.backend = get_backend(config)
+        
+        # The local copy of the equivalences, if there is one. It is only
+        # used once it has been built
+        self.equivalences = None
+        self._equivalences_built = False
+        if config.equivalences_path() is not None:
+            self.equivalences = EquivalenceIndex(config.equivalences_path())
+        
+        # The log of the references to rewrite, if they are deferred
+        self.rewrites = None
+        if config.rewrites_path() is not None:
+            self.rewrites = RewriteLog(config.rewrites_path())
+        self.rewrites_batch_size = config.rewrites_batch_size()
+        self.rewrites_threshold = config.rewrites_threshold()
+        
+        # The previous outputs of the documents, if only the changes are
+        # written when they are processed again
+        self.outputs = None
+        if config.outputs_path() is not None:
+            self.outputs = OutputStore(config.outputs_path())
+        
+        # Load the queries
+        self._queries = {}
+        queries_dir = os.path.join(os.path.dirname(__file__), 'queries')
+        for file_name in os.listdir(queries_dir):
+            with open(os.path.join(queries_dir, file_name)) as query_file:
+                self._queries[file_name] = query_file.read()
 
         # The base for all the URIs
         self.base = config.base()
     
-        # Get the list of DBs and check if our DB is already there
-        response = requests.get(self.store_url + 'admin/databases')
-        databases = json.loads(response.content.decode())['databases']
-        
-        # If not initialise it
-        if not self.db_name in databases:
+        # Initialise the database if it is not there yet
+        if not self.backend.exists():
             self.reset_db()
+        if self.equivalences is not None and self.local_equivalences() is None:
+            logger.warning('The local index of equivalences {} is not built, '
+                           'the triple store is queried until "equivalences '
+                           'rebuild" is run'.format(self.equivalences.path))
             
     def reset_db(self):
         '''
         Initialise the database
         '''
-        # Get the list of DBs and check if our DB is already there
-        # if it is there just delete it
-        response = requests.get(self.store_url + 'admin/databases')
-        databases = json.loads(response.content.decode())['databases']
-        if self.db_name in databases:
-            requests.delete(self.store_url + 'admin/databases/' + self.db_name)
-        
-        # Parameters for the reasoning DB
-        # more options http://docs.stardog.com/#_database_admin
-        parameters = {"dbname" : self.db_name,
-                      "options" : {"search.enabled" : True,
-                                   "query.all.graphs": True,
-                                   "index.type": "disk"},
-                      "files": []}
-        files = {'data': ('data', json.dumps(parameters), 'application/json')}
-
-        # Create the DB
-        response = requests.post(self.store_url + 'admin/databases', files=files)
-        if response.status_code == 201:
-            logger.info('Created DB \"{}\"'.format(self.db_name))
-        else:
-            logger.error('Could not create \"{}\"'.format(self.db_name))
-            logger.error(response.content.decode())
+        if self.backend.reset():
+            if self.equivalences is not None:
+                self.equivalences.reset()
+                self.equivalences.mark_built()
+            if self.outputs is not None:
+                self.outputs.reset()
         
     def store(self, dataset):
         '''
@@ -87,26 +116,50 @@ class IndexStore(object):
         
         @return: True if successful
         '''
+        return self.store_many([dataset])
+    
+    def store_many(self, datasets, additions=(), removals=()):
+        '''
+        Persist several data sets in a single transaction. Every non empty
+        named graph of the data sets replaces the graph with the same name
+        in the triple store, and either all of them are replaced or none.
+        Changes to the other graphs can be sent along in the same
+        transaction
         
-        for graph in dataset.graphs():
-            # Skip empty graphs
-            if len(graph) == 0:
-                continue
-            
-            # Get the name of the graph and its content
-            graph_name = graph.identifier.toPython()
-            payload = graph.serialize(format="nt").decode()
-            
-            # Store the graph
-            # TODO Use rdflib tricks to optimise that part
-            logger.info("Storing {} triples into <{}>".format(len(graph), graph_name))            
-            query = """
-                INSERT DATA { GRAPH <__NAME__> { __PAYLOAD__ } }
-            """.replace("__PAYLOAD__", payload).replace("__NAME__", graph_name)
-            sparql = SPARQLWrapper(self.sparul)
-            sparql.setQuery(query)
-            sparql.setMethod(POST)
-            sparql.query()
+        @param datasets: the data sets to store
+        @param additions: data sets with quads to add to the graphs
+        @param removals: data sets with quads to remove from the graphs
+        
+        @return: True if successful
+        '''
+        # Get the names of the graphs to replace and their content
+        graph_names = set()
+        payload = []
+        for dataset in datasets:
+            for graph in dataset.graphs():
+                # Skip empty graphs
+                if len(graph) == 0:
+                    continue
+                graph_names.add(graph.identifier)
+            payload.append(dataset.serialize(format="nquads", encoding="utf-8"))
+        
+        # Get the changes to the other graphs
+        added = [d.serialize(format="nquads", encoding="utf-8")
+                 for d in additions if len(d) > 0]
+        removed = [d.serialize(format="nquads", encoding="utf-8")
+                   for d in removals if len(d) > 0]
+        if len(graph_names) == 0 and len(added) == 0 and len(removed) == 0:
+            return True
+        
+        # Replace the graphs then apply the changes
+        logger.info("Storing {} graphs and {} changes of {} documents".format(
+            len(graph_names), len(added) + len(removed), len(datasets)))
+        with self.backend.transaction() as transaction:
+            for graph_name in sorted(graph_names):
+                transaction.clear(graph_name.toPython())
+            if len(removed) > 0:
+                transaction.remove(b''.join(removed))
+            transaction.add(b''.join(payload + added))
         
         return True
     
@@ -121,16 +174,16 @@ class IndexStore(object):
         Find a proxy referring to the given URI
         '''
         logger.info('Lookup {}'.format(uri))
+        if self.local_equivalences() is not None:
+            proxy = self.equivalences.get(uri)
+            return proxy.toPython() if proxy is not None else None
         query = self._queries['find_proxy.rq'].replace("__TARGET__", uri)
-        sparql = SPARQLWrapper(self.sparql)
-        sparql.setQuery(query)
-        sparql.setReturnFormat(JSON)
-        bindings = sparql.query().convert()["results"]["bindings"]
+        bindings = self.backend.select(query)
         if len(bindings) == 0:
             return None
         
         proxy = bindings[0]["proxy"]["value"]
-        print ('Found the proxy {}'.format(proxy))
+        logger.debug('Found the proxy {}'.format(proxy))
         return proxy
     
     def search(self, search_uri, params, collection='everything'):
@@ -142,17 +195,8 @@ class IndexStore(object):
         graph = Graph()
         graph.namespace_manager.bind('olo', OLO)
         
-        # Prepare the query
-        query = self._queries['full_text_search.rq']
-        query = query.replace("__TEXT__", params.get('q'))
-        query = query.replace("__COLLECTION__", self.base + collection)        
-        logger.debug('Executing \n{}'.format(query))
-        
-        # Execute the query
-        sparql = SPARQLWrapper(self.sparql)
-        sparql.setQuery(query)
-        sparql.setReturnFormat(JSON)
-        bindings = sparql.query().convert()["results"]["bindings"]
+        # Execute the search
+        bindings = self.backend.search(params.get('q'), self.base + collection)
         
         # Build the OLO slots
         index = 0
@@ -191,49 +235,191 @@ class IndexStore(object):
         '''
         logger.info('Get proxy data about {}'.format(uri))
         query = self._queries['get_proxy.rq'].replace("__URI__", uri)
-        sparql = SPARQLWrapper(self.sparql)
-        sparql.setQuery(query)
-        data = sparql.query().convert()
+        data = self.backend.construct(query)
         return data
     
     def get_proxy_uri(self, uri):
         '''
         Returns the location of the proxy containing that URI
         '''
-        # TODO Use rdflib tricks to optimise that part
-        query = """
-        PREFIX owl: <http://www.w3.org/2002/07/owl#>
-        SELECT ?proxy WHERE { ?proxy owl:sameAs <__TARGET__>.}
-        """.replace("__TARGET__", uri)
-        sparql = SPARQLWrapper(self.sparql)
-        sparql.setQuery(query)
-        sparql.setReturnFormat(JSON)
-        bindings = sparql.query().convert()["results"]["bindings"]
-        if len(bindings) > 0:
-            return URIRef(bindings[0]["proxy"]["value"])
-        else:
+        return self.get_proxy_uris([uri]).get(URIRef(uri))
+
+    def get_proxy_uris(self, uris, chunk_size=PROXY_LOOKUP_CHUNK):
+        '''
+        Returns the location of the proxies containing a set of URIs. The
+        URIs are resolved with one query per chunk of chunk_size URIs instead
+        of one query per URI
+
+        @param uris: the URIs to find a proxy for
+        @param chunk_size: the maximum number of URIs to send in one query
+        @return: a dictionary URI -> proxy URI with only the URIs for which a
+        proxy was found
+        '''
+        if self.local_equivalences() is not None:
+            return self.equivalences.get_many(uris)
+        
+        proxies = {}
+        uris = sorted(set(URIRef(uri) for uri in uris))
+        for start in range(0, len(uris), chunk_size):
+            values = ' '.join(uri.n3() for uri in uris[start:start + chunk_size])
+            query = """
+            PREFIX owl: <http://www.w3.org/2002/07/owl#>
+            SELECT ?target ?proxy WHERE {
+                VALUES ?target { __VALUES__ }
+                ?proxy owl:sameAs ?target.
+            }
+            """.replace("__VALUES__", values)
+            for b in self.backend.select(query):
+                target = URIRef(b["target"]["value"])
+                proxies.setdefault(target, URIRef(b["proxy"]["value"]))
+        return proxies
+    
+    def local_equivalences(self):
+        '''
+        Get the local index of the equivalences if there is one and it has
+        been built, otherwise the triple store has to be used
+        '''
+        if self.equivalences is None:
             return None
-     
+        if not self._equivalences_built:
+            self._equivalences_built = self.equivalences.is_built()
+        return self.equivalences if self._equivalences_built else None
+    
+    def _equivalences(self):
+        '''
+        Iterate over all the (graph URI, proxy URI, URI) equivalences of the
+        triple store
+        '''
+        offset = 0
+        while True:
+            query = """
+            PREFIX owl: <http://www.w3.org/2002/07/owl#>
+            SELECT ?g ?proxy ?target WHERE { GRAPH ?g { ?proxy owl:sameAs ?target. } }
+            ORDER BY ?target ?proxy ?g LIMIT __LIMIT__ OFFSET __OFFSET__
+            """.replace("__LIMIT__", str(EQUIVALENCES_PAGE_SIZE))
+            query = query.replace("__OFFSET__", str(offset))
+            bindings = self.backend.select(query)
+            for b in bindings:
+                yield (URIRef(b["g"]["value"]), URIRef(b["proxy"]["value"]),
+                       URIRef(b["target"]["value"]))
+            if len(bindings) < EQUIVALENCES_PAGE_SIZE:
+                break
+            offset = offset + EQUIVALENCES_PAGE_SIZE
+    
+    def rebuild_equivalences(self):
+        '''
+        Rebuild the local index of equivalences from the triple store
+        
+        @return: the number of equivalences in the index
+        '''
+        self.equivalences.reset()
+        batch = []
+        for link in self._equivalences():
+            batch.append(link)
+            if len(batch) == EQUIVALENCES_PAGE_SIZE:
+                self.equivalences.add_many(batch)
+                batch = []
+        self.equivalences.add_many(batch)
+        self.equivalences.mark_built()
+        logger.info('Rebuilt {} equivalences'.format(len(self.equivalences)))
+        return len(self.equivalences)
+    
+    def check_equivalences(self):
+        '''
+        Compare the local index of equivalences with the triple store
+        
+        @return: a dictionary with the number of URIs checked, missing from
+        the local index, pointing to another proxy in the local index, only
+        found in the local index and of links kept locally for a graph which
+        no longer has them
+        '''
+        report = {'checked': 0, 'missing': 0, 'different': 0, 'extra': 0,
+                  'stale': 0}
+        proxies = {}
+        links = set()
+        for (graph, proxy, target) in self._equivalences():
+            proxies.setdefault(target, set()).add(proxy)
+            links.add((graph, proxy, target))
+        
+        # Compare the links graph by graph
+        local_links = set(self.equivalences.links())
+        for (graph, proxy, target) in local_links - links:
+            logger.warning('<{}> is a sameAs of <{}> in <{}> in the local index only'.format(proxy, target, graph))
+            report['stale'] += 1
+        
+        # Compare the proxies returned for every URI
+        local = self.equivalences.get_many(proxies.keys())
+        for (target, proxy) in local.items():
+            if proxy not in proxies[target]:
+                logger.warning('<{}> is a sameAs of <{}> in the index only'.format(proxy, target))
+                report['different'] += 1
+        report['checked'] = len(proxies)
+        report['missing'] = len(proxies) - len(local)
+        report['extra'] = len(set(target for (_, _, target) in local_links) - set(proxies))
+        return report
+
     def update_uris(self, replacement_map):
         '''
         This function takes as a parameter a set of mapping old->new for URIs.
         This is used to update references to a URI for which a proxy was not
         available at the time of processing but has been created afterwards.
+        The mappings are applied with one update per rewrites_batch_size of
+        them, after following the chains of mappings.
         '''
-        for (old_uri, new_uri) in replacement_map.items():
-            logger.info("Update {} -> {}".format(old_uri, new_uri))
+        with PROCESS_SECONDS.time(stage='update_uris'):
+            self._update_uris(sorted(collapse(replacement_map).items()))
+    
+    def _update_uris(self, mappings):
+        for start in range(0, len(mappings), self.rewrites_batch_size):
+            chunk = mappings[start:start + self.rewrites_batch_size]
+            logger.info("Update {} URIs".format(len(chunk)))
+            values = ' '.join('({} {})'.format(URIRef(old_uri).n3(), URIRef(new_uri).n3())
+                              for (old_uri, new_uri) in chunk)
+            # The references are rewritten in the graph they are in, so
+            # that they are replaced with it when the document is stored again
             query = """
-                DELETE {?s ?p <OLD_URI>.}
-                INSERT {?s ?p <NEW_URI>.}
-                WHERE {?s ?p <OLD_URI>.}
-                """.replace("OLD_URI", old_uri).replace("NEW_URI", new_uri)
-            sparql = SPARQLWrapper(self.sparul)
-            sparql.setQuery(query)
-            sparql.setMethod(POST)
-            sparql.query()
+                PREFIX owl: <http://www.w3.org/2002/07/owl#>
+                DELETE { GRAPH ?g {?s ?p ?old.} }
+                INSERT { GRAPH ?g {?s ?p ?new.} }
+                WHERE {
+                    VALUES (?old ?new) { __VALUES__ }
+                    GRAPH ?g {?s ?p ?old.} FILTER (?p != owl:sameAs)
+                }
+                """.replace("__VALUES__", values)
+            self.backend.update(query)
+    
+    def defer_update_uris(self, replacement_map):
+        '''
+        Same as update_uris but the mappings are only recorded in the log of
+        rewrites, if there is one. The log is applied once it has more than
+        rewrites_threshold mappings
+        '''
+        if self.rewrites is None:
+            self.update_uris(replacement_map)
+            return
+        self.rewrites.add(replacement_map)
+        if len(self.rewrites) >= self.rewrites_threshold:
+            self.apply_rewrites()
+    
+    def apply_rewrites(self):
+        '''
+        Apply the rewrites waiting in the log
+        
+        @return: the number of rewrites applied
+        '''
+        if self.rewrites is None:
+            return 0
+        pending = self.rewrites.pending()
+        self.update_uris(pending)
+        self.rewrites.remove(pending)
+        return len(pending)
     
     def close(self):
         '''
         Close open connections 
         '''
-        pass
+        if self.equivalences is not None:
+            self.equivalences.close()
+        if self.outputs is not None:
+            self.outputs.close()
+        self.backend.close()
@@ -0,0 +1,102 @@
+'''
+Created on 18 Oct 2026
+
+Local store of what was last written to the index for every processed
+document. It is used to send only the changes to the index when a document
+is processed again
+'''
+from indexer.storage.codecs import encode_binary, decode_binary
+from rdflib.term import URIRef
+import json
+import sqlite3
+import threading
+
+import logging
+logger = logging.getLogger(__name__)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS outputs (
+    graph TEXT PRIMARY KEY,
+    triples BLOB NOT NULL,
+    terms TEXT NOT NULL
+) WITHOUT ROWID;
+'''
+
+class OutputStore(object):
+    '''
+    Persistent map named graph base -> previous output kept in a SQLite
+    database. The output of a document is the data graph written to the
+    index, after the proxies were resolved, and the proxies used for its
+    subjects and objects
+    '''
+    def __init__(self, path):
+        '''
+        Constructor
+
+        @param path: the location of the database file
+        '''
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=60,
+                                           check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript(SCHEMA)
+
+    def reset(self):
+        '''
+        Forget all the outputs
+        '''
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM outputs')
+
+    def __len__(self):
+        with self._lock:
+            (count,) = self._connection.execute(
+                'SELECT COUNT(*) FROM outputs').fetchone()
+        return count
+
+    def get(self, graph_name):
+        '''
+        Get the previous output of a document
+
+        @param graph_name: the base of the named graphs of the document
+        @return: a dictionary with the 'triples' as a graph and the
+        'subjects' and 'objects' maps URI -> proxy URI, or None if the
+        document was never processed
+        '''
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT triples, terms FROM outputs WHERE graph = ?',
+                (str(graph_name),)).fetchone()
+        if row is None:
+            return None
+        output = {'triples': decode_binary(row[0])}
+        for (position, terms) in json.loads(row[1]).items():
+            output[position] = dict((URIRef(term), URIRef(proxy))
+                                    for (term, proxy) in terms.items())
+        return output
+
+    def put_many(self, outputs):
+        '''
+        Record the outputs of several documents, replacing their previous
+        ones
+
+        @param outputs: an iterable over tuples (graph name, triples,
+        subjects map, objects map)
+        '''
+        rows = []
+        for (graph_name, triples, subjects, objects) in outputs:
+            terms = {'subjects': dict((str(k), str(v)) for (k, v) in subjects.items()),
+                     'objects': dict((str(k), str(v)) for (k, v) in objects.items())}
+            rows.append((str(graph_name), encode_binary(triples),
+                         json.dumps(terms)))
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO outputs VALUES (?, ?, ?)', rows)
+
+    def close(self):
+        '''
+        Close the database
+        '''
+        self._connection.close()
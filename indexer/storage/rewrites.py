@@ -0,0 +1,98 @@
+'''
+Created on 18 Oct 2026
+
+Durable log of the references to rewrite in the index. The rewrites are
+collected while processing and applied later on in a few large updates
+'''
+from rdflib.term import URIRef
+import sqlite3
+import threading
+
+import logging
+logger = logging.getLogger(__name__)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS rewrites (
+    old TEXT PRIMARY KEY,
+    new TEXT NOT NULL
+) WITHOUT ROWID;
+'''
+
+def collapse(mapping):
+    '''
+    Follow the chains of rewrites so that every URI is rewritten directly
+    into the last URI of its chain. Cycles are broken by dropping the
+    rewrites that are part of them
+
+    @param mapping: a dictionary old URI -> new URI
+    @return: the collapsed dictionary
+    '''
+    collapsed = {}
+    for old in mapping:
+        seen = set([old])
+        new = mapping[old]
+        while new in mapping and new not in seen:
+            seen.add(new)
+            new = mapping[new]
+        if new not in seen:
+            collapsed[old] = new
+    return collapsed
+
+class RewriteLog(object):
+    '''
+    Pending rewrites old URI -> new URI kept in a SQLite database. A newer
+    rewrite of the same URI replaces the previous one
+    '''
+    def __init__(self, path):
+        '''
+        Constructor
+
+        @param path: the location of the database file
+        '''
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=60,
+                                           check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.executescript(SCHEMA)
+
+    def __len__(self):
+        with self._lock:
+            (count,) = self._connection.execute(
+                'SELECT COUNT(*) FROM rewrites').fetchone()
+        return count
+
+    def add(self, mapping):
+        '''
+        Record some rewrites
+
+        @param mapping: a dictionary old URI -> new URI
+        '''
+        rows = [(str(old), str(new)) for (old, new) in mapping.items()
+                if old != new]
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO rewrites VALUES (?, ?)', rows)
+
+    def pending(self):
+        '''
+        Get all the pending rewrites, as they were recorded
+
+        @return: a dictionary old URI -> new URI
+        '''
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT old, new FROM rewrites').fetchall()
+        return dict((URIRef(old), URIRef(new)) for (old, new) in rows)
+
+    def remove(self, mapping):
+        '''
+        Forget about rewrites which have been applied. Rewrites of the same
+        URIs recorded in the meantime are kept
+
+        @param mapping: the dictionary old URI -> new URI returned by pending
+        '''
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'DELETE FROM rewrites WHERE old = ? AND new = ?',
+                [(str(old), str(new)) for (old, new) in mapping.items()])
@@ -0,0 +1,131 @@
+'''
+Created on 18 Oct 2026
+
+Minimal SPARQL protocol client using the shared HTTP session
+'''
+from rdflib.graph import Graph
+from indexer.util.connections import get_session
+from indexer.util.metrics import SPARQL_SECONDS, SPARQL_ERRORS
+from indexer.util.profiling import count_sparql
+
+import logging
+logger = logging.getLogger(__name__)
+
+class SPARQLClient(object):
+    '''
+    Client for the query and update endpoints of a SPARQL store
+    '''
+    def __init__(self, config):
+        '''
+        Constructor
+
+        @param config: the Config object wrapping the configuration file
+        '''
+        self.db_url = config.stardog_url() + config.stardog_db() + '/'
+        self.query_url = config.stardog_url() + config.stardog_db() + '/query'
+        self.update_url = config.stardog_url() + config.stardog_db() + '/update'
+        self.timeout = config.http_timeout()
+        self.session = get_session(config)
+
+    def _post(self, query_type, url, **kwargs):
+        # Time every request, by type, and count the failed ones
+        count_sparql(query_type)
+        try:
+            with SPARQL_SECONDS.time(type=query_type):
+                response = self.session.post(url, timeout=self.timeout, **kwargs)
+                response.raise_for_status()
+        except Exception:
+            SPARQL_ERRORS.inc(type=query_type)
+            raise
+        return response
+
+    def _query(self, query_type, query, accept):
+        return self._post(query_type, self.query_url, data={'query': query},
+                          headers={'Accept': accept})
+
+    def select(self, query):
+        '''
+        Execute a SELECT query and return the bindings
+        '''
+        response = self._query('select', query, 'application/sparql-results+json')
+        return response.json()['results']['bindings']
+
+    def ask(self, query):
+        '''
+        Execute an ASK query and return the answer
+        '''
+        response = self._query('ask', query, 'application/sparql-results+json')
+        return response.json()['boolean']
+
+    def construct(self, query):
+        '''
+        Execute a CONSTRUCT query and return the resulting graph
+        '''
+        response = self._query('construct', query, 'application/n-triples')
+        graph = Graph()
+        graph.parse(data=response.content.decode('utf-8'), format='nt')
+        return graph
+
+    def update(self, query):
+        '''
+        Execute an update
+        '''
+        self._post('update', self.update_url, data={'update': query})
+
+    def transaction(self):
+        '''
+        Start a transaction. It is committed at the end of a "with" block
+        and rolled back if the block raises an exception
+        '''
+        return Transaction(self)
+
+class Transaction(object):
+    '''
+    Transaction of the Stardog HTTP API. The changes sent within a
+    transaction are only visible once it is committed, and all of them are
+    applied or none
+    '''
+    def __init__(self, client):
+        '''
+        Constructor
+
+        @param client: the SPARQLClient of the database
+        '''
+        self.client = client
+        self.identifier = None
+
+    def _post(self, operation, path, **kwargs):
+        return self.client._post('transaction_' + operation,
+                                 self.client.db_url + path, **kwargs)
+
+    def __enter__(self):
+        self.identifier = self._post('begin', 'transaction/begin').content.decode().strip()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self._post('commit', 'transaction/commit/' + self.identifier)
+        else:
+            logger.error('Rolling back transaction {}'.format(self.identifier))
+            self._post('rollback', 'transaction/rollback/' + self.identifier)
+        return False
+
+    def clear(self, graph_name):
+        '''
+        Remove all the triples of a named graph
+        '''
+        self._post('clear', self.identifier + '/clear', params={'graph-uri': graph_name})
+
+    def add(self, nquads):
+        '''
+        Add some N-Quads, given as bytes
+        '''
+        self._post('add', self.identifier + '/add', data=nquads,
+                   headers={'Content-Type': 'application/n-quads'})
+
+    def remove(self, nquads):
+        '''
+        Remove some N-Quads, given as bytes
+        '''
+        self._post('remove', self.identifier + '/remove', data=nquads,
+                   headers={'Content-Type': 'application/n-quads'})
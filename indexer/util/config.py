@@ -5,6 +5,7 @@ Created on 21 May 2016
 @author: guerec01
 '''
 from configparser import ConfigParser
+import os
 
 import logging
 logger = logging.getLogger(__name__)
@@ -19,6 +20,9 @@ class Config(object):
         '''
         self.config = ConfigParser()
         self.config.read(file_name)
+        
+        # Relative paths are relative to the configuration file
+        self.directory = os.path.dirname(os.path.abspath(file_name))
         logger.debug(self.config.sections())
         
     def base(self):
@@ -42,6 +46,34 @@ class Config(object):
         '''
         return self.config.get('stardog', 'db')
     
+    def stardog_transaction_size(self):
+        '''
+        Get the number of processed documents written to StarDog in a single
+        transaction
+        '''
+        return self._get_int('stardog', 'transaction_size', 100)
+    
+    def rewrites_path(self):
+        '''
+        Get the location of the log of references to rewrite in the index,
+        or None if they should be rewritten straight away
+        '''
+        if self.config.has_option('rewrites', 'path'):
+            return self.config.get('rewrites', 'path') or None
+        return None
+    
+    def rewrites_batch_size(self):
+        '''
+        Get the number of references rewritten by a single update
+        '''
+        return self._get_int('rewrites', 'batch_size', 1000)
+    
+    def rewrites_threshold(self):
+        '''
+        Get the number of rewrites to wait for before applying the log
+        '''
+        return self._get_int('rewrites', 'threshold', 10000)
+    
     def couchdb_url(self):
         '''
         Get the location of CouchDB
@@ -54,6 +86,170 @@ class Config(object):
         '''
         return self.config.get('couchdb', 'db')
     
+    def cache_backend(self):
+        '''
+        Get the name of the backend used by the cache store
+        '''
+        if self.config.has_option('cache', 'backend'):
+            return self.config.get('cache', 'backend')
+        return 'couchdb'
+    
+    def sqlite_path(self):
+        '''
+        Get the location of the SQLite database used by the cache store
+        '''
+        if self.config.has_option('cache', 'path'):
+            return self.config.get('cache', 'path')
+        return 'indexer-cache.sqlite'
+    
+    def equivalences_path(self):
+        '''
+        Get the location of the local index of the equivalences between the
+        proxies and the URIs they stand for, or None if the triple store
+        should be queried instead
+        '''
+        return self._get_path('equivalences', 'path')
+    
+    def outputs_path(self):
+        '''
+        Get the location of the store of the previous outputs of the
+        processed documents, or None to always write documents in full
+        '''
+        if self.config.has_option('outputs', 'path'):
+            return self.config.get('outputs', 'path') or None
+        return None
+    
+    def index_backend(self):
+        '''
+        Get the name of the backend used by the index
+        '''
+        if self.config.has_option('index', 'backend'):
+            return self.config.get('index', 'backend')
+        return 'stardog'
+    
+    def index_path(self):
+        '''
+        Get the location of the database used by the embedded index
+        '''
+        if self.config.has_option('index', 'path'):
+            return self.config.get('index', 'path')
+        return 'indexer-index.sqlite'
+    
+    def couchdb_batch_size(self):
+        '''
+        Get the number of documents to write to CouchDB in a single request
+        '''
+        return self._get_int('couchdb', 'batch_size', 100)
+    
+    def couchdb_codec(self):
+        '''
+        Get the name of the codec used to store the payloads in CouchDB
+        '''
+        if self.config.has_option('couchdb', 'codec'):
+            return self.config.get('couchdb', 'codec')
+        return 'turtle'
+    
+    def graph_cache_triples(self):
+        '''
+        Get the maximum number of triples of the parsed graphs kept in memory
+        when retrieving graphs from the cache, 0 to disable that cache
+        '''
+        return self._get_int('couchdb', 'graph_cache_triples', 0)
+    
+    def graph_cache_directory(self):
+        '''
+        Get the directory where parsed graphs are kept on disk, or None if
+        they should only be kept in memory
+        '''
+        if self.config.has_option('couchdb', 'graph_cache_directory'):
+            return self.config.get('couchdb', 'graph_cache_directory') or None
+        return None
+    
+    def http_pools(self):
+        '''
+        Get the number of hosts to keep a pool of HTTP connections for
+        '''
+        return self._get_int('http', 'pools', 10)
+    
+    def http_pool_size(self):
+        '''
+        Get the maximum number of HTTP connections kept open to a host
+        '''
+        return self._get_int('http', 'pool_size', 10)
+    
+    def http_timeout(self):
+        '''
+        Get the timeout of the HTTP requests, in seconds
+        '''
+        return self._get_int('http', 'timeout', 60)
+    
+    def http_retries(self):
+        '''
+        Get the number of times a failed HTTP connection is retried
+        '''
+        return self._get_int('http', 'retries', 3)
+    
+    def process_concurrency(self):
+        '''
+        Get the number of entries every network stage of the processing
+        pipeline works on at the same time
+        '''
+        return self._get_int('process', 'concurrency', 4)
+    
+    def process_queue_size(self):
+        '''
+        Get the maximum number of entries waiting between two stages of the
+        processing pipeline
+        '''
+        return self._get_int('process', 'queue_size', 16)
+    
+    def ingest_chunk_size(self):
+        '''
+        Get the number of quads sorted in memory before spilling them to disk
+        when streaming an NQuads file into the cache
+        '''
+        return self._get_int('ingest', 'chunk_size', 500000)
+    
+    def ingest_languages(self):
+        '''
+        Get the language tags of the literals to keep in the cache, or None
+        to keep all of them
+        '''
+        if not self.config.has_option('ingest', 'languages'):
+            return None
+        languages = self.config.get('ingest', 'languages')
+        return set(l.strip().lower() for l in languages.split(',') if l.strip())
+    
+    def ingest_prune_predicates(self):
+        '''
+        Returns True if the triples using predicates no rule can match
+        should be removed from the cache
+        '''
+        if self.config.has_option('ingest', 'prune_predicates'):
+            return self.config.getboolean('ingest', 'prune_predicates')
+        return False
+    
+    def _get_int(self, section, option, default):
+        '''
+        Get an integer option, falling back to a default value if the option
+        is not set in the configuration file
+        '''
+        if self.config.has_option(section, option):
+            return self.config.getint(section, option)
+        return default
+    
+    def _get_path(self, section, option):
+        '''
+        Get the location of a file, relative to the directory of the
+        configuration file, or None if the option is not set or empty
+        '''
+        if not self.config.has_option(section, option):
+            return None
+        path = self.config.get(section, option)
+        if not path:
+            return None
+        return os.path.join(self.directory, path)
+    
     def _store_section(self, store_name, hostname, port):    
         # Default values
         p = {}
@@ -0,0 +1,136 @@
+'''
+Created on 18 Oct 2026
+
+Connection pools shared by all the stores of a process. Every store talking
+to Stardog or CouchDB gets its HTTP session from here so that connections
+are kept alive and reused instead of being opened for every request.
+'''
+from requests.adapters import HTTPAdapter
+import couchdb.http
+import couchdb.json
+import io
+import os
+import requests
+import threading
+
+import logging
+logger = logging.getLogger(__name__)
+
+# The sessions of the current process. They are indexed by process id as
+# connections can not be shared with the forked processes
+_sessions = {}
+_lock = threading.Lock()
+
+def get_session(config):
+    '''
+    Get the shared session used for the HTTP calls to Stardog and CouchDB
+
+    @param config: the Config object wrapping the configuration file
+    '''
+    key = (os.getpid(), 'requests')
+    with _lock:
+        if key not in _sessions:
+            adapter = HTTPAdapter(pool_connections=config.http_pools(),
+                                  pool_maxsize=config.http_pool_size(),
+                                  max_retries=config.http_retries(),
+                                  pool_block=True)
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _sessions[key] = session
+        return _sessions[key]
+
+def get_couchdb_session(config):
+    '''
+    Get the shared session used for the HTTP calls to CouchDB. It sends
+    the requests through the same session as the calls to Stardog, with
+    the same pools of connections and retries
+
+    @param config: the Config object wrapping the configuration file
+    '''
+    key = (os.getpid(), 'couchdb')
+    session = get_session(config)
+    with _lock:
+        if key not in _sessions:
+            _sessions[key] = CouchDBSession(session, config.http_timeout())
+        return _sessions[key]
+
+class CouchDBSession(couchdb.http.Session):
+    '''
+    Session of the CouchDB client sending its requests with a requests
+    session instead of its own connections. Only what the client needs is
+    supported: there is no caching of the responses and the bodies are
+    always read in full
+    '''
+    def __init__(self, session, timeout):
+        '''
+        Constructor
+
+        @param session: the requests session to use
+        @param timeout: the timeout of the requests, in seconds
+        '''
+        couchdb.http.Session.__init__(self, timeout=timeout)
+        self.session = session
+
+    def request(self, method, url, body=None, headers=None, credentials=None,
+                num_redirects=0):
+        method = method.upper()
+        headers = dict(headers or {})
+        headers.setdefault('Accept', 'application/json')
+        headers['User-Agent'] = self.user_agent
+
+        # Documents are sent as JSON
+        if body is not None and not isinstance(body, (str, bytes)) and \
+            not hasattr(body, 'read'):
+            body = couchdb.json.encode(body).encode('utf-8')
+            headers.setdefault('Content-Type', 'application/json')
+        elif isinstance(body, str):
+            body = body.encode('utf-8')
+
+        response = self.session.request(method, url, data=body, headers=headers,
+                                        auth=credentials, timeout=self._timeout)
+
+        # Raise the same errors as the client does
+        if response.status_code >= 400:
+            error = ''
+            if method == 'HEAD':
+                pass
+            elif 'application/json' in response.headers.get('content-type', ''):
+                data = response.json()
+                error = (data.get('error'), data.get('reason'))
+            else:
+                error = response.content
+            errors = {401: couchdb.http.Unauthorized, 403: couchdb.http.Forbidden,
+                      404: couchdb.http.ResourceNotFound,
+                      409: couchdb.http.ResourceConflict,
+                      412: couchdb.http.PreconditionFailed}
+            if response.status_code in errors:
+                raise errors[response.status_code](error)
+            raise couchdb.http.ServerError((response.status_code, error))
+
+        data = None
+        if method != 'HEAD':
+            data = io.BytesIO(response.content)
+        return (response.status_code, response.headers, data)
+
+def pool_stats():
+    '''
+    Get some statistics about the connection pools of the current process
+
+    @return: a dictionary indexed by host with the number of requests sent
+    and the number of connections opened
+    '''
+    stats = {}
+    session = _sessions.get((os.getpid(), 'requests'))
+    if session is not None:
+        for adapter in set(session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                stats['{}:{}'.format(pool.host, pool.port)] = {
+                    'requests': pool.num_requests,
+                    'connections': pool.num_connections
+                }
+    return stats
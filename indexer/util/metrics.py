@@ -0,0 +1,298 @@
+'''
+Created on 18 Oct 2026
+
+Counters and histograms describing what the indexer is doing, exposed in
+the Prometheus text format. The metrics are defined once at the module level
+and shared by all the threads of a process. Worker processes send the
+values they collected back to the main process with snapshot() and merge()
+'''
+from contextlib import contextmanager
+from indexer.util.connections import get_session
+import bisect
+import functools
+import os
+import threading
+import time
+
+import logging
+logger = logging.getLogger(__name__)
+
+# The upper bounds of the buckets of the histograms, in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if len(pairs) == 0:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, str(value).replace('"', '\\"'))
+                          for (name, value) in pairs) + '}'
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric(object):
+    '''
+    A metric with a value per combination of the values of its labels
+    '''
+    kind = None
+
+    def __init__(self, name, description, labels=()):
+        '''
+        Constructor
+
+        @param name: the name of the metric
+        @param description: what the metric counts
+        @param labels: the names of the labels
+        '''
+        self.name = name
+        self.description = description
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError('{} needs the labels {}'.format(self.name, self.label_names))
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def snapshot(self):
+        '''
+        Get the values collected so far and start again from zero
+        '''
+        with self._lock:
+            (values, self._values) = (self._values, {})
+        return values
+
+    def render(self):
+        '''
+        Get the lines of the metric in the Prometheus text format
+        '''
+        lines = ['# HELP {} {}'.format(self.name, self.description),
+                 '# TYPE {} {}'.format(self.name, self.kind)]
+        with self._lock:
+            for (key, value) in sorted(self._values.items()):
+                lines.extend(self._render_value(key, value))
+        return lines
+
+class Counter(Metric):
+    '''
+    A value which only goes up
+    '''
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def merge(self, values):
+        with self._lock:
+            for (key, value) in values.items():
+                self._values[key] = self._values.get(key, 0) + value
+
+    def _render_value(self, key, value):
+        return ['{}{} {}'.format(self.name, _format_labels(self.label_names, key),
+                                 _format_value(value))]
+
+class Histogram(Metric):
+    '''
+    The distribution of some durations, in seconds
+    '''
+    kind = 'histogram'
+
+    def __init__(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        '''
+        Constructor
+
+        @param buckets: the upper bounds of the buckets
+        '''
+        Metric.__init__(self, name, description, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            if key not in self._values:
+                self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            (counts, _, _) = entry = self._values[key]
+            counts[index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        '''
+        Observe how long the body of a "with" block takes
+        '''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def timed(self, **labels):
+        '''
+        Decorate a function to observe how long every call takes
+        '''
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count(self, **labels):
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            return entry[2] if entry is not None else 0
+
+    def merge(self, values):
+        with self._lock:
+            for (key, (counts, total, count)) in values.items():
+                if key not in self._values:
+                    self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                entry = self._values[key]
+                entry[0] = [a + b for (a, b) in zip(entry[0], counts)]
+                entry[1] += total
+                entry[2] += count
+
+    def _render_value(self, key, value):
+        (counts, total, count) = value
+        lines = []
+        cumulated = 0
+        for (bound, bucket) in zip(self.buckets + (float('inf'),), counts):
+            cumulated += bucket
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append('{}_bucket{} {}'.format(
+                self.name, _format_labels(self.label_names, key, [('le', le)]),
+                cumulated))
+        labels = _format_labels(self.label_names, key)
+        lines.append('{}_sum{} {}'.format(self.name, labels, _format_value(total)))
+        lines.append('{}_count{} {}'.format(self.name, labels, count))
+        return lines
+
+class Registry(object):
+    '''
+    All the metrics of the process
+    '''
+    def __init__(self):
+        '''
+        Constructor
+        '''
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, description, labels=()):
+        return self.register(Counter(name, description, labels))
+
+    def histogram(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, description, labels, buckets))
+
+    def render(self):
+        '''
+        Get all the metrics in the Prometheus text format
+        '''
+        lines = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        '''
+        Get the values collected so far by all the metrics and start again
+        from zero, to send them to another process
+        '''
+        return dict((name, metric.snapshot())
+                    for (name, metric) in self._metrics.items())
+
+    def merge(self, snapshot):
+        '''
+        Add the values of a snapshot taken in another process
+        '''
+        for (name, values) in snapshot.items():
+            if name in self._metrics:
+                self._metrics[name].merge(values)
+
+    def dump(self, file_name):
+        '''
+        Write all the metrics to a file, in the format of the textfile
+        collector of the Prometheus node exporter
+        '''
+        with open(file_name + '.tmp', 'w') as metrics_file:
+            metrics_file.write(self.render())
+        # Replace the file in one go so that it is never read half written
+        os.replace(file_name + '.tmp', file_name)
+
+    def push(self, url, job, config):
+        '''
+        Send all the metrics to a Prometheus push gateway
+
+        @param url: the location of the push gateway
+        @param job: the name of the job to group the metrics under
+        @param config: the Config object wrapping the configuration file
+        '''
+        response = get_session(config).put(
+            '{}/metrics/job/{}'.format(url.rstrip('/'), job),
+            data=self.render().encode('utf-8'),
+            headers={'Content-Type': 'text/plain; version=0.0.4'},
+            timeout=config.http_timeout())
+        response.raise_for_status()
+
+# The metrics of the process
+REGISTRY = Registry()
+
+INGEST_SECONDS = REGISTRY.histogram(
+    'indexer_ingest_seconds',
+    'Time spent ingesting graphs, by step (parse, prepare)',
+    ['step'])
+CACHE_DOCUMENTS = REGISTRY.counter(
+    'indexer_cache_documents_total',
+    'Documents given to the cache store, by outcome',
+    ['outcome'])
+CACHE_SECONDS = REGISTRY.histogram(
+    'indexer_cache_seconds',
+    'Time spent in the cache store, by operation (write, fetch, decode)',
+    ['operation'])
+PROCESS_SECONDS = REGISTRY.histogram(
+    'indexer_process_seconds',
+    'Time spent processing entries, by stage (retrieve, rules, resolve, '
+    'write, store, update_uris)',
+    ['stage'])
+PROCESS_DOCUMENTS = REGISTRY.counter(
+    'indexer_process_documents_total',
+    'Entries processed, by outcome (stored, failed)',
+    ['outcome'])
+PROXIES_MINTED = REGISTRY.counter(
+    'indexer_proxies_minted_total',
+    'New proxies created')
+SPARQL_SECONDS = REGISTRY.histogram(
+    'indexer_sparql_seconds',
+    'Latency of the requests to the triple store, by type of request',
+    ['type'])
+SPARQL_ERRORS = REGISTRY.counter(
+    'indexer_sparql_errors_total',
+    'Failed requests to the triple store, by type of request',
+    ['type'])
+
+def export(target, job, config):
+    '''
+    Dump the metrics to a file or push them to a gateway, depending on the
+    target being a URL or not
+    '''
+    try:
+        if target.startswith('http://') or target.startswith('https://'):
+            REGISTRY.push(target, job, config)
+        else:
+            REGISTRY.dump(target)
+    except Exception:
+        logger.exception('Could not export the metrics to {}'.format(target))
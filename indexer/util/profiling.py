@@ -0,0 +1,265 @@
+'''
+Created on 18 Oct 2026
+
+Profiling of the processing. A Profiler records the wall and CPU time of
+every rule applied and of every stage of every document, along with the
+number of SPARQL requests sent while working on a document, and reports
+on the most expensive ones. The whole run can also be dumped for cProfile
+tools or, by sampling the stacks, for flame graphs
+'''
+from contextlib import contextmanager
+import cProfile
+import sys
+import threading
+import time
+
+import logging
+logger = logging.getLogger(__name__)
+
+# The document the current thread is working on, as a tuple (profiler,
+# uri) while a stage is profiled
+_current = threading.local()
+
+def count_sparql(query_type):
+    '''
+    Count a SPARQL request against the document the current thread is
+    working on, if it is being profiled
+    '''
+    working_on = getattr(_current, 'document', None)
+    if working_on is not None:
+        (profiler, uri) = working_on
+        profiler._count_sparql(uri, query_type)
+
+@contextmanager
+def _unprofiled(name):
+    yield {}
+
+def rule_timer(profiler):
+    '''
+    Get the context used to time the rules, which does nothing when there
+    is no profiler
+    '''
+    return profiler.rule if profiler is not None else _unprofiled
+
+class Profiler(object):
+    '''
+    The cost of the rules and of the documents processed
+    '''
+    def __init__(self):
+        '''
+        Constructor
+        '''
+        self._lock = threading.Lock()
+        self.rules = {}
+        self.documents = {}
+
+    @contextmanager
+    def rule(self, name):
+        '''
+        Time the application of a rule. The body of the "with" block can
+        set 'matches' in the dictionary it gets
+        '''
+        stats = {'matches': 0}
+        (wall, cpu) = (time.perf_counter(), time.thread_time())
+        try:
+            yield stats
+        finally:
+            (wall, cpu) = (time.perf_counter() - wall, time.thread_time() - cpu)
+            with self._lock:
+                record = self.rules.setdefault(name, {'calls': 0, 'matches': 0,
+                                                      'wall': 0.0, 'cpu': 0.0})
+                record['calls'] += 1
+                record['matches'] += stats['matches']
+                record['wall'] += wall
+                record['cpu'] += cpu
+
+    @contextmanager
+    def stage(self, uri, name):
+        '''
+        Time a stage of the processing of a document. The SPARQL requests
+        sent by the current thread in the meantime are counted against the
+        document
+        '''
+        previous = getattr(_current, 'document', None)
+        _current.document = (self, uri)
+        _current.excluded = (0.0, 0.0)
+        (wall, cpu) = (time.perf_counter(), time.thread_time())
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall - _current.excluded[0]
+            cpu = time.thread_time() - cpu - _current.excluded[1]
+            _current.document = previous
+            with self._lock:
+                record = self._document(uri)
+                record['wall'][name] = record['wall'].get(name, 0.0) + wall
+                record['cpu'][name] = record['cpu'].get(name, 0.0) + cpu
+
+    @contextmanager
+    def detached(self):
+        '''
+        Leave out of the stage being timed the work done in the body of a
+        "with" block, such as writing a batch of several documents
+        '''
+        previous = getattr(_current, 'document', None)
+        _current.document = None
+        (wall, cpu) = (time.perf_counter(), time.thread_time())
+        try:
+            yield
+        finally:
+            _current.document = previous
+            (excluded_wall, excluded_cpu) = getattr(_current, 'excluded', (0.0, 0.0))
+            _current.excluded = (excluded_wall + time.perf_counter() - wall,
+                                 excluded_cpu + time.thread_time() - cpu)
+
+    def _document(self, uri):
+        return self.documents.setdefault(str(uri), {'wall': {}, 'cpu': {},
+                                                    'sparql': {}})
+
+    def _count_sparql(self, uri, query_type):
+        with self._lock:
+            sparql = self._document(uri)['sparql']
+            sparql[query_type] = sparql.get(query_type, 0) + 1
+
+    def snapshot(self):
+        '''
+        Get what was recorded so far and start again from nothing, to send
+        it to another process
+        '''
+        with self._lock:
+            (rules, self.rules) = (self.rules, {})
+            (documents, self.documents) = (self.documents, {})
+        return {'rules': rules, 'documents': documents}
+
+    def merge(self, snapshot):
+        '''
+        Add what was recorded by another process
+        '''
+        with self._lock:
+            for (name, stats) in snapshot['rules'].items():
+                record = self.rules.setdefault(name, {'calls': 0, 'matches': 0,
+                                                      'wall': 0.0, 'cpu': 0.0})
+                for (key, value) in stats.items():
+                    record[key] += value
+            for (uri, stats) in snapshot['documents'].items():
+                record = self._document(uri)
+                for (kind, values) in stats.items():
+                    for (key, value) in values.items():
+                        record[kind][key] = record[kind].get(key, 0) + value
+
+    def report(self, top=20):
+        '''
+        Describe the most expensive rules and documents
+
+        @param top: the number of rules and documents to list
+        @return: the report, as text
+        '''
+        with self._lock:
+            rules = sorted(self.rules.items(), key=lambda r: -r[1]['wall'])
+            documents = sorted(self.documents.items(),
+                               key=lambda d: -sum(d[1]['wall'].values()))
+        stages = []
+        for (_, stats) in documents:
+            stages.extend(s for s in stats['wall'] if s not in stages)
+
+        lines = ['Rules: {} applied, {:.3f}s wall and {:.3f}s CPU in total'.format(
+            len(rules), sum(r['wall'] for (_, r) in rules),
+            sum(r['cpu'] for (_, r) in rules))]
+        lines.append('{:>10} {:>10} {:>8} {:>8} {:>10}  {}'.format(
+            'wall (s)', 'cpu (s)', 'calls', 'matches', 'mean (ms)', 'rule'))
+        for (name, stats) in rules[:top]:
+            lines.append('{:>10.3f} {:>10.3f} {:>8} {:>8} {:>10.3f}  {}'.format(
+                stats['wall'], stats['cpu'], stats['calls'], stats['matches'],
+                1000 * stats['wall'] / max(1, stats['calls']), name))
+
+        sparql = sum(sum(d['sparql'].values()) for (_, d) in documents)
+        lines.append('')
+        lines.append('Documents: {} processed, {} SPARQL request(s), {:.1f} '
+                     'per document'.format(len(documents), sparql,
+                                           sparql / max(1, len(documents))))
+        lines.append(' '.join(['{:>10}'.format('wall (ms)'),
+                               '{:>10}'.format('cpu (ms)')] +
+                              ['{:>10}'.format(s) for s in stages] +
+                              ['{:>7}'.format('sparql'), ' document']))
+        for (uri, stats) in documents[:top]:
+            lines.append(' '.join(
+                ['{:>10.1f}'.format(1000 * sum(stats['wall'].values())),
+                 '{:>10.1f}'.format(1000 * sum(stats['cpu'].values()))] +
+                ['{:>10.1f}'.format(1000 * stats['wall'].get(s, 0)) for s in stages] +
+                ['{:>7}'.format(sum(stats['sparql'].values())), ' ' + uri]))
+        return '\n'.join(lines) + '\n'
+
+class StackSampler(object):
+    '''
+    Sample the stacks of all the threads at a regular interval and count
+    them in the folded format used by flame graph tools
+    '''
+    def __init__(self, interval=0.005):
+        '''
+        Constructor
+
+        @param interval: the number of seconds between two samples
+        '''
+        self.interval = interval
+        self.stacks = {}
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._thread.join()
+
+    def _run(self):
+        me = threading.get_ident()
+        while self._running:
+            for (thread, frame) in sys._current_frames().items():
+                if thread == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append('{} ({}:{})'.format(code.co_name, code.co_filename,
+                                                     code.co_firstlineno))
+                    frame = frame.f_back
+                key = ';'.join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+            time.sleep(self.interval)
+
+    def dump(self, file_name):
+        '''
+        Write the stacks sampled, one per line followed by its count
+        '''
+        with open(file_name, 'w') as folded:
+            for (stack, count) in sorted(self.stacks.items()):
+                folded.write('{} {}\n'.format(stack, count))
+
+@contextmanager
+def dumping(file_name):
+    '''
+    Profile the body of a "with" block and write the result to a file. A
+    ".prof" file gets the statistics of cProfile, which only cover the
+    current thread. Any other file gets the sampled stacks of all the
+    threads, in the folded format of flame graph tools
+    '''
+    if file_name.endswith('.prof'):
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            profile.dump_stats(file_name)
+    else:
+        sampler = StackSampler()
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            sampler.dump(file_name)
+    logger.info('Wrote the profile to {}'.format(file_name))
@@ -0,0 +1,74 @@
+'''
+Created on 18 Oct 2026
+
+Helpers to read the rule base
+'''
+from rdflib.graph import Graph
+from rdflib.namespace import RDF
+from rdflib.term import URIRef
+from rdflib.plugins.sparql.processor import prepareQuery
+from indexer.util.namespaces import INDEXER
+
+import logging
+logger = logging.getLogger(__name__)
+
+def read_rules(rules_file_name):
+    '''
+    Read the rule base and turn every rule into a SPARQL CONSTRUCT query
+
+    @param rules_file_name: the name of the Turtle file with the rules
+    @return: a tuple (rules, namespaces) with the text of the queries indexed
+    by the URI of the rules and the namespaces declared in the rule base
+    '''
+    # Load the rule base into memory
+    logger.debug('Loading {}'.format(rules_file_name))
+    g = Graph().parse(rules_file_name, format="turtle")
+
+    # Extract the namespaces from the rule base
+    r_ns = {}
+    for (ns, uri) in g.namespaces():
+        r_ns[ns] = uri
+
+    # Compose the SPARQL queries
+    rules = {}
+    for s in g.subjects(RDF.type, INDEXER.Rule):
+        # Extract the components of the rule
+        r_if = g.value(s, INDEXER['if']).toPython().replace('\t', '')
+        r_then = g.value(s, INDEXER['then']).toPython().replace('\t', '')
+        rules[s.toPython()] = 'CONSTRUCT {' + r_then + '} WHERE {' + r_if + '}'
+
+    return (rules, r_ns)
+
+def _patterns(node):
+    '''
+    Find all the triple patterns in a parsed SPARQL algebra expression
+    '''
+    if isinstance(node, dict):
+        if getattr(node, 'name', None) == 'BGP':
+            for pattern in node['triples']:
+                yield pattern
+        for value in node.values():
+            for pattern in _patterns(value):
+                yield pattern
+    elif isinstance(node, (list, tuple)):
+        for value in node:
+            for pattern in _patterns(value):
+                yield pattern
+
+def rule_predicates(rules_file_name):
+    '''
+    Get all the predicates the conditions of the rules can match
+
+    @param rules_file_name: the name of the Turtle file with the rules
+    @return: a set of URIs or None if at least one rule can match any
+    predicate
+    '''
+    (rules, r_ns) = read_rules(rules_file_name)
+    predicates = set()
+    for rule in rules.values():
+        query = prepareQuery(rule, initNs=r_ns)
+        for (_, p, _) in _patterns(query.algebra['p']):
+            if not isinstance(p, URIRef):
+                return None
+            predicates.add(p)
+    return predicates
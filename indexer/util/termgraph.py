@@ -0,0 +1,190 @@
+'''
+Created on 18 Oct 2026
+
+Compact graph used as working memory when processing a document. The terms
+are interned into integer identifiers and the triples are kept in three
+arrays of identifiers, one per position
+'''
+from array import array
+
+class TermGraph(object):
+    '''
+    Set of triples with interned terms. It implements the part of the rdflib
+    Graph interface used by the processor, plus rewriting all the subjects or
+    objects at once. The graph is only turned into rdflib objects when it is
+    written out with to_graph
+    '''
+    def __init__(self):
+        '''
+        Constructor
+        '''
+        # The dictionary of terms
+        self._terms = []
+        self._ids = {}
+
+        # The columns of the triples and the keys of the triples, to avoid
+        # adding the same triple twice
+        self._s = array('I')
+        self._p = array('I')
+        self._o = array('I')
+        self._keys = set()
+
+    @classmethod
+    def from_graph(cls, graph):
+        '''
+        Create a TermGraph with the triples of an rdflib graph
+        '''
+        term_graph = cls()
+        for triple in graph:
+            term_graph.add(triple)
+        return term_graph
+
+    def to_graph(self, graph):
+        '''
+        Add all the triples to an rdflib graph
+
+        @return: the graph
+        '''
+        terms = self._terms
+        for i in range(len(self._s)):
+            graph.add((terms[self._s[i]], terms[self._p[i]], terms[self._o[i]]))
+        return graph
+
+    def _intern(self, term):
+        '''
+        Get the identifier of a term, adding it to the dictionary if needed
+        '''
+        identifier = self._ids.get(term)
+        if identifier is None:
+            identifier = len(self._terms)
+            self._terms.append(term)
+            self._ids[term] = identifier
+        return identifier
+
+    def _key(self, s, p, o):
+        return (s << 64) | (p << 32) | o
+
+    def add(self, triple):
+        '''
+        Add a triple made of rdflib terms
+        '''
+        (s, p, o) = [self._intern(t) for t in triple]
+        key = self._key(s, p, o)
+        if key not in self._keys:
+            self._keys.add(key)
+            self._s.append(s)
+            self._p.append(p)
+            self._o.append(o)
+
+    def __len__(self):
+        return len(self._s)
+
+    def __iter__(self):
+        return self.triples((None, None, None))
+
+    def __contains__(self, triple):
+        ids = [self._ids.get(t) for t in triple]
+        return None not in ids and self._key(*ids) in self._keys
+
+    def _positions(self, pattern):
+        '''
+        Get the positions of the triples matching a pattern of rdflib terms,
+        None being a wildcard
+        '''
+        positions = range(len(self._s))
+        for (column, term) in zip((self._s, self._p, self._o), pattern):
+            if term is None:
+                continue
+            identifier = self._ids.get(term)
+            if identifier is None:
+                return []
+            positions = [i for i in positions if column[i] == identifier]
+        return positions
+
+    def triples(self, pattern):
+        '''
+        Generator over the triples matching a pattern
+        '''
+        terms = self._terms
+        for i in self._positions(pattern):
+            yield (terms[self._s[i]], terms[self._p[i]], terms[self._o[i]])
+
+    def subjects(self, predicate=None, object=None):
+        '''
+        Get the distinct subjects of the triples matching a pattern
+        '''
+        if predicate is None and object is None:
+            ids = set(self._s)
+        else:
+            ids = set(self._s[i] for i in self._positions((None, predicate, object)))
+        return [self._terms[i] for i in sorted(ids)]
+
+    def objects(self, subject=None, predicate=None):
+        '''
+        Get the distinct objects of the triples matching a pattern
+        '''
+        if subject is None and predicate is None:
+            ids = set(self._o)
+        else:
+            ids = set(self._o[i] for i in self._positions((subject, predicate, None)))
+        return [self._terms[i] for i in sorted(ids)]
+
+    def subject_objects(self, predicate=None):
+        '''
+        Get the (subject, object) pairs of the triples using a predicate
+        '''
+        terms = self._terms
+        return [(terms[self._s[i]], terms[self._o[i]])
+                for i in self._positions((None, predicate, None))]
+
+    def _table(self, mapping):
+        '''
+        Turn a mapping of terms into a mapping of identifiers, as an array
+        indexed by identifier
+        '''
+        table = array('I', range(len(self._terms)))
+        for (old, new) in mapping.items():
+            if old in self._ids:
+                table[self._ids[old]] = self._intern(new)
+        # Terms added by the mapping map to themselves
+        table.extend(range(len(table), len(self._terms)))
+        return table
+
+    def remap_subjects(self, mapping):
+        '''
+        Replace all the subjects found in a mapping old term -> new term
+        '''
+        table = self._table(mapping)
+        self._s = array('I', map(table.__getitem__, self._s))
+        self._deduplicate()
+
+    def remap_objects(self, mapping, skip_predicate=None):
+        '''
+        Replace all the objects found in a mapping old term -> new term,
+        except in the triples using skip_predicate
+        '''
+        table = self._table(mapping)
+        skip = self._ids.get(skip_predicate, -1)
+        self._o = array('I', [o if p == skip else table[o]
+                              for (p, o) in zip(self._p, self._o)])
+        self._deduplicate()
+
+    def _deduplicate(self):
+        '''
+        Remove the triples which became identical after a rewrite
+        '''
+        keys = set(map(self._key, self._s, self._p, self._o))
+        if len(keys) == len(self._s):
+            self._keys = keys
+            return
+        keys = set()
+        (s_column, p_column, o_column) = (array('I'), array('I'), array('I'))
+        for (s, p, o) in zip(self._s, self._p, self._o):
+            key = self._key(s, p, o)
+            if key not in keys:
+                keys.add(key)
+                s_column.append(s)
+                p_column.append(p)
+                o_column.append(o)
+        (self._s, self._p, self._o, self._keys) = (s_column, p_column,
+                                                   o_column, keys)
@@ -0,0 +1,58 @@
+'''
+Created on 18 Oct 2026
+
+Disjoint-set structure used to group equivalent resources together
+'''
+
+class UnionFind(object):
+    '''
+    Union-find over hashable items with path compression and union by size
+    '''
+    def __init__(self):
+        '''
+        Constructor
+        '''
+        self._parent = {}
+        self._size = {}
+
+    def find(self, item):
+        '''
+        Returns the representative of the set containing the item, adding the
+        item as a set of its own if it is not known yet
+        '''
+        if item not in self._parent:
+            self._parent[item] = item
+            self._size[item] = 1
+            return item
+
+        # Find the root then point all the items on the path directly to it
+        root = item
+        while self._parent[root] != root:
+            root = self._parent[root]
+        while self._parent[item] != root:
+            (self._parent[item], item) = (root, self._parent[item])
+        return root
+
+    def union(self, a, b):
+        '''
+        Merge the sets containing a and b
+        '''
+        (root_a, root_b) = (self.find(a), self.find(b))
+        if root_a == root_b:
+            return
+        if self._size[root_a] < self._size[root_b]:
+            (root_a, root_b) = (root_b, root_a)
+        self._parent[root_b] = root_a
+        self._size[root_a] += self._size.pop(root_b)
+
+    def groups(self):
+        '''
+        Returns the sets as a dictionary representative -> list of items
+        '''
+        groups = {}
+        for item in self._parent:
+            groups.setdefault(self.find(item), []).append(item)
+        return groups
+
+    def __len__(self):
+        return len(self._parent)
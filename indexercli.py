@@ -8,6 +8,10 @@ such as ingesting NQuads or adding new URIs to the crawling queue
 @author: guerec01
 '''
 import argparse
+import contextlib
+import glob
+import signal
+import time
 from argparse import RawTextHelpFormatter
 
 import logging
@@ -16,14 +20,45 @@ logger = logging.getLogger(__file__)
 from indexer.util.config import Config
 from indexer.component.ingest import Ingest
 from indexer.component.process import Process
+from indexer.component.pipeline import Pipeline
 from indexer.storage.cache import CacheStore
+from indexer.storage.index import IndexStore
+from indexer.util.connections import pool_stats
+from indexer.util import metrics
+from indexer.util.profiling import Profiler, dumping
+
+# Number of seconds between two exports of the metrics when following the
+# queue
+METRICS_INTERVAL = 60
 
 COMMANDS="""
 Commands:
-    ingest FILE.NQ
-        Ingest the content of FILE.NQ into Indexer
+    ingest FILE.NQ [FILE.NQ ...]
+        Ingest the content of the FILE.NQ files into Indexer. File names can
+        be glob patterns (use --stream for large files that do not fit in
+        memory, --workers and --shards to spread the work over several cores)
     process
-        Process the URIs in the queue
+        Process the URIs in the queue (use --follow to keep on processing
+        new entries as soon as they are added to the queue, --cluster to
+        assign the proxies to the equivalence classes of the whole queue
+        before processing it, --workers to spread the entries over several
+        processes, --pipeline to overlap the stages of the processing)
+    rewrites
+        Apply the rewrites of references to URIs waiting in the log
+    equivalences rebuild|check
+        Rebuild the local index of the equivalences between proxies and URIs
+        from Stardog, or check that this index is consistent with Stardog
+
+Use --metrics FILE to dump the metrics of the ingestion or the processing
+to a file once done, or --metrics URL to push them to a Prometheus push
+gateway.
+
+Use --profile REPORT when processing to write the --profile-top most
+expensive rules and documents to REPORT, with the time spent by each
+document in every stage and the number of SPARQL requests it sent. Use
+--profile-dump FILE.prof to save the statistics of cProfile for the main
+thread of any command, or --profile-dump FILE.folded to sample the stacks
+of all its threads for a flame graph.
 """
 
 def init_login(debug=False):
@@ -33,35 +68,166 @@ def init_login(debug=False):
     logging.getLogger("urllib3").setLevel(logging.WARNING)
     logging.getLogger("rdflib").setLevel(logging.WARNING)
     
-def ingest(config, nquad_file_name, clean=False):
+def ingest(config, nquad_file_names, clean=False, stream=False, workers=1,
+           shards=1, metrics_target=None):
     '''
-    Ingest the content of the NQuads file passed as parameter
+    Ingest the content of the NQuads files passed as parameter
     
-    @param nquad_file_name: the file name to ingest
+    @param nquad_file_names: the file names or glob patterns to ingest
     @param clean: if True clean the cache DB before ingesting
+    @param stream: if True stream the file instead of loading it in memory
+    @param workers: the number of processes to use
+    @param shards: the number of shards to split every file into
+    @param metrics_target: a file to dump the metrics to or the URL of a
+    push gateway to send them to, once done
     '''
-    logger.info('Ingesting {}'.format(nquad_file_name))
+    # Expand the patterns into a list of file names
+    file_names = []
+    for pattern in nquad_file_names:
+        file_names.extend(sorted(glob.glob(pattern)) or [pattern])
+    
     ingest = Ingest(config, clean)
-    ingest.load(nquad_file_name)
+    if workers > 1 or shards > 1:
+        # Spread the parsing over several processes, they always stream
+        ingest.load_all(file_names, workers, shards)
+    else:
+        for nquad_file_name in file_names:
+            logger.info('Ingesting {}'.format(nquad_file_name))
+            ingest.load(nquad_file_name, stream)
+    
+    # Export the metrics
+    if metrics_target is not None:
+        metrics.export(metrics_target, 'indexer_ingest', config)
 
-def process(config, clean=False):
+def process(config, clean=False, follow=False, cluster=False, workers=1,
+            pipeline=False, metrics_target=None, profile_report=None,
+            profile_top=20):
     '''
     Get the list of cached entries to be processed and process all of them
     one after the other
 
     @param clean: if True clean the proxy and collection DB before processing
+    @param follow: if True keep on processing new entries as they are added
+    to the queue, until a SIGINT or SIGTERM is received
+    @param cluster: if True find the equivalence classes over the whole
+    queue first and assign one proxy to each of them
+    @param workers: the number of processes to use
+    @param pipeline: if True overlap the stages of the processing of
+    several entries
+    @param metrics_target: a file to dump the metrics to or the URL of a
+    push gateway to send them to, once done and every minute when following
+    the queue
+    @param profile_report: a file to write the report on the most
+    expensive rules and documents to, once done
+    @param profile_top: the number of rules and documents in that report
     '''
     logger.info('Start processing the queue')
     
-    # Get the list of cache entries to process
+    # Create an instance of the data processor
+    processor = Process(config, clean)
+    if profile_report is not None:
+        processor.profiler = Profiler()
+    
+    # Go through the cache entries to process and process them one by one
     cache = CacheStore(config)
-    entries = cache.get_processing_queue()
-    logger.info('{} entries to process'.format(len(entries)))
+    if cluster:
+        processor.plan_proxies(cache.get_processing_queue())
+    if follow:
+        # Stop cleanly after the current entry when asked to
+        running = [True]
+        def stop(signum, frame):
+            logger.info('Stopping after the current entry')
+            running[0] = False
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+        follower = cache.follow_processing_queue(lambda: running[0])
+        entries = follower
+        if metrics_target is not None:
+            entries = _exporting(entries, metrics_target, config)
+        
+        # Entries come one at a time, write them to the index straight away.
+        # The position in the queue only moves on once they are written
+        processor.batch_size = 1
+        processor.acknowledge = follower.done
+    else:
+        entries = cache.get_processing_queue()
+    try:
+        if workers > 1:
+            processor.process_all(entries, workers)
+        elif pipeline:
+            Pipeline(processor, config.process_concurrency(),
+                     config.process_queue_size()).run(entries)
+        elif follow:
+            processor.process_following(entries)
+        else:
+            for entry in entries:
+                processor.process(entry)
+            processor.flush()
+    finally:
+        # Save the position of the entries written since the end of the feed
+        if follow:
+            follower.save()
     
-    # Create an instance of the data processor and process all the entries one by one
-    processor = Process(config, clean)
+    # Apply the rewrites still waiting in the log
+    applied = processor.index_store.apply_rewrites()
+    if applied > 0:
+        logger.info('Rewrote the references to {} URIs'.format(applied))
+    
+    # Report on the use of the cache of parsed graphs and of the connections
+    stats = processor.cache_store.graph_cache_stats()
+    if stats is not None:
+        logger.info('Graph cache: {}'.format(stats))
+    logger.info('Connection pools: {}'.format(pool_stats()))
+    
+    # Export the metrics
+    if metrics_target is not None:
+        metrics.export(metrics_target, 'indexer_process', config)
+    
+    # Write the report on the most expensive rules and documents
+    if profile_report is not None:
+        with open(profile_report, 'w') as report:
+            report.write(processor.profiler.report(profile_top))
+        logger.info('Wrote the profiling report to {}'.format(profile_report))
+    
+def _exporting(entries, metrics_target, config):
+    '''
+    Go through the entries exporting the metrics every now and then
+    '''
+    last_export = time.time()
     for entry in entries:
-        processor.process(entry)
+        yield entry
+        if time.time() - last_export > METRICS_INTERVAL:
+            metrics.export(metrics_target, 'indexer_process', config)
+            last_export = time.time()
+    
+def rewrites(config):
+    '''
+    Apply the rewrites of references waiting in the log
+    '''
+    index_store = IndexStore(config)
+    applied = index_store.apply_rewrites()
+    logger.info('Rewrote the references to {} URIs'.format(applied))
+    index_store.close()
+    
+def equivalences(config, action):
+    '''
+    Maintain the local index of the equivalences between proxies and URIs
+    
+    @param action: "rebuild" to load it again from Stardog or "check" to
+    compare it with the content of Stardog
+    '''
+    index_store = IndexStore(config)
+    if index_store.equivalences is None:
+        logger.error('No local index of equivalences is configured')
+        return
+    if action == 'rebuild':
+        index_store.rebuild_equivalences()
+    elif action == 'check':
+        report = index_store.check_equivalences()
+        logger.info('Consistency check: {}'.format(report))
+    else:
+        logger.error('Unknown action "{}"'.format(action))
+    index_store.close()
     
 if __name__ == '__main__':
     # Parse the command line arguments
@@ -76,6 +242,26 @@ if __name__ == '__main__':
                         help='configuration file')
     parser.add_argument('--clean', action='store_true',
                         help='Clean the relevant DB(s) before performing the command')
+    parser.add_argument('--stream', action='store_true',
+                        help='Stream the NQuads file with bounded memory when ingesting')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of processes to use when ingesting or processing')
+    parser.add_argument('--shards', type=int, default=1,
+                        help='Number of shards to split every ingested file into')
+    parser.add_argument('--follow', action='store_true',
+                        help='Keep on processing new entries of the queue')
+    parser.add_argument('--cluster', action='store_true',
+                        help='Group equivalent URIs over the whole queue before processing')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='Run the stages of the processing concurrently')
+    parser.add_argument('--metrics', default=None,
+                        help='File to dump the metrics to, or URL of a push gateway')
+    parser.add_argument('--profile', dest='profile_report', default=None,
+                        help='File to write the most expensive rules and documents to')
+    parser.add_argument('--profile-top', type=int, default=20,
+                        help='Number of rules and documents in the profiling report')
+    parser.add_argument('--profile-dump', default=None,
+                        help='File to write a cProfile (.prof) or flame graph dump to')
     parser.add_argument('--debug', action='store_true',
                         help='Switch debugging on (overrides the config file value)')
     args = parser.parse_args()
@@ -84,10 +270,23 @@ if __name__ == '__main__':
     config = Config(args.file)
     init_login(args.debug)
 
+    # Profile the whole command if asked to
+    profiling = contextlib.nullcontext()
+    if args.profile_dump is not None:
+        profiling = dumping(args.profile_dump)
+
     # Execute the command
-    if args.command[0] == 'ingest':
-        ingest(config, args.param[0], args.clean)
-    elif args.command[0] == 'process':
-        process(config, args.clean)
-    else:
-        parser.print_help()
+    with profiling:
+        if args.command[0] == 'ingest':
+            ingest(config, args.param, args.clean, args.stream, args.workers,
+                   args.shards, args.metrics)
+        elif args.command[0] == 'process':
+            process(config, args.clean, args.follow, args.cluster, args.workers,
+                    args.pipeline, args.metrics, args.profile_report,
+                    args.profile_top)
+        elif args.command[0] == 'rewrites':
+            rewrites(config)
+        elif args.command[0] == 'equivalences' and len(args.param) == 1:
+            equivalences(config, args.param[0])
+        else:
+            parser.print_help()
@@ -0,0 +1,3 @@
+'''
+Created on 18 Oct 2026
+'''
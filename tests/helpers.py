@@ -0,0 +1,62 @@
+'''
+Created on 18 Oct 2026
+
+Configuration shared by the tests. They run the whole indexer offline
+with the embedded cache and index, keeping all the files in a temporary
+directory
+'''
+from configparser import ConfigParser
+from indexer.util.config import Config
+from rdflib.graph import Graph
+import os
+import shutil
+import tempfile
+import unittest
+
+# The root of the project, to find the default configuration and rules
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def write_config(directory, **options):
+    '''
+    Write a configuration file using the embedded stores and keeping all
+    the local files in a directory
+
+    @param options: values overriding the configuration, as "section_option"
+    @return: the Config object wrapping the file
+    '''
+    config = ConfigParser()
+    config.read(os.path.join(ROOT, 'config.cfg'))
+    config['indexer']['rules'] = os.path.join(ROOT, 'rulebase.ttl')
+    config['cache']['backend'] = 'sqlite'
+    config['cache']['path'] = os.path.join(directory, 'cache.sqlite')
+    config['index']['backend'] = 'embedded'
+    config['index']['path'] = os.path.join(directory, 'index.sqlite')
+    for section in ['equivalences', 'rewrites', 'outputs']:
+        config[section]['path'] = os.path.join(directory, section + '.sqlite')
+    for (key, value) in options.items():
+        (section, option) = key.split('_', 1)
+        config[section][option] = str(value)
+    file_name = os.path.join(directory, 'test.cfg')
+    with open(file_name, 'w') as config_file:
+        config.write(config_file)
+    return Config(file_name)
+
+def parse(turtle):
+    '''
+    Get a graph from some Turtle
+    '''
+    graph = Graph()
+    graph.parse(data=turtle, format='turtle')
+    return graph
+
+class OfflineTestCase(unittest.TestCase):
+    '''
+    Base class of the tests needing a configuration, with a temporary
+    directory removed at the end of every test
+    '''
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='indexer-test-')
+        self.addCleanup(shutil.rmtree, self.directory, True)
+
+    def config(self, **options):
+        return write_config(self.directory, **options)
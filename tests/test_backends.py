@@ -0,0 +1,86 @@
+'''
+Created on 18 Oct 2026
+'''
+from benchmarks.standins import CouchDBStandIn
+from indexer.storage.backends.base import ConflictError
+from indexer.storage.cache import CacheStore, get_identifier
+from tests.helpers import OfflineTestCase, parse
+
+class ConflictsTest(OfflineTestCase):
+    '''
+    Concurrent updates of the documents of the cache, with the embedded
+    backend
+    '''
+    def options(self):
+        return {}
+
+    def setUp(self):
+        OfflineTestCase.setUp(self)
+        self.cache_store = CacheStore(self.config(**self.options()))
+        self.backend = self.cache_store._backend
+
+    def test_insert_twice(self):
+        self.backend.save({'_id': 'doc', 'value': 1})
+        with self.assertRaises(ConflictError):
+            self.backend.save({'_id': 'doc', 'value': 2})
+        self.assertEqual(self.backend.get('doc')['value'], 1)
+
+    def test_stale_revision(self):
+        self.backend.save({'_id': 'doc', 'value': 1})
+        first = self.backend.get('doc')
+        second = self.backend.get('doc')
+        first['value'] = 2
+        self.backend.save(first)
+        second['value'] = 3
+        with self.assertRaises(ConflictError):
+            self.backend.save(second)
+        self.assertEqual(self.backend.get('doc')['value'], 2)
+        
+        # Updating the latest revision works
+        latest = self.backend.get('doc')
+        latest['value'] = 3
+        self.backend.save(latest)
+        self.assertEqual(self.backend.get('doc')['value'], 3)
+
+    def test_save_many(self):
+        self.backend.save({'_id': 'doc1', 'value': 1})
+        results = self.backend.save_many([{'_id': 'doc1', 'value': 2},
+                                          {'_id': 'doc2', 'value': 2}])
+        self.assertEqual([(success, identifier) for (success, identifier, _) in results],
+                         [(False, 'doc1'), (True, 'doc2')])
+        self.assertIsInstance(results[0][2], Exception)
+        
+        # The documents without conflict are written
+        self.assertEqual(self.backend.get('doc1')['value'], 1)
+        self.assertEqual(self.backend.get('doc2')['value'], 2)
+
+    def test_conflicts_reported(self):
+        (uri, graph) = ('http://x.org/doc', parse('<http://x.org/A> <http://x.org/p> "a" .'))
+        
+        # Another writer updates the entry between the read and the write
+        get_many = self.backend.get_many
+        def concurrent(identifiers):
+            documents = get_many(identifiers)
+            self.backend.save({'_id': get_identifier(uri), '@id': uri})
+            return documents
+        self.backend.get_many = concurrent
+        summary = self.cache_store.store_many([(uri, graph)])
+        self.assertEqual(summary['conflicts'], [uri])
+        self.assertEqual(summary['written'], 0)
+        
+        # Writing it again works
+        del self.backend.get_many
+        summary = self.cache_store.store_many([(uri, graph)])
+        self.assertEqual((summary['written'], summary['conflicts']), (1, []))
+        self.assertEqual(len(self.cache_store.retrieve(uri)), 1)
+
+class CouchDBConflictsTest(ConflictsTest):
+    '''
+    Concurrent updates of the documents of the cache, with the CouchDB
+    backend
+    '''
+    def options(self):
+        self.couchdb = CouchDBStandIn().start()
+        self.addCleanup(self.couchdb.stop)
+        return {'cache_backend': 'couchdb', 'couchdb_hostname': '127.0.0.1',
+                'couchdb_port': self.couchdb.port}
@@ -0,0 +1,233 @@
+'''
+Created on 18 Oct 2026
+'''
+from benchmarks.standins import CouchDBStandIn
+from indexer.storage.cache import CacheStore, graph_hash, get_blob_identifier, filter_triples
+from indexer.util.rules import rule_predicates
+from rdflib.namespace import DCTERMS, RDFS
+from rdflib.graph import Graph
+from tests.helpers import ROOT, OfflineTestCase, parse
+import os
+import unittest
+
+def document(index):
+    return ('http://x.org/doc{}'.format(index), parse(
+        '<http://x.org/s{}> <http://x.org/p> "{}" .'.format(index, index)))
+
+class QueueTest(OfflineTestCase):
+    '''
+    Paging through the processing queue, with the embedded backend
+    '''
+    def options(self):
+        return {}
+
+    def setUp(self):
+        OfflineTestCase.setUp(self)
+        self.cache_store = CacheStore(self.config(**self.options()))
+        self.uris = set(document(i)[0] for i in range(25))
+        self.cache_store.store_many([document(i) for i in range(25)])
+
+    def test_all_pages(self):
+        entries = list(self.cache_store.get_processing_queue(page_size=5))
+        self.assertEqual(len(entries), 25)
+        self.assertEqual(set(entries), self.uris)
+
+    def test_processed_while_paging(self):
+        entries = []
+        for uri in self.cache_store.get_processing_queue(page_size=5):
+            entries.append(uri)
+            self.cache_store.mark_processed(uri)
+        self.assertEqual(len(entries), 25)
+        self.assertEqual(set(entries), self.uris)
+        self.assertEqual(list(self.cache_store.get_processing_queue()), [])
+
+class CouchDBQueueTest(QueueTest):
+    '''
+    Paging through the processing queue, with the CouchDB backend
+    '''
+    def options(self):
+        self.couchdb = CouchDBStandIn().start()
+        self.addCleanup(self.couchdb.stop)
+        return {'cache_backend': 'couchdb', 'couchdb_hostname': '127.0.0.1',
+                'couchdb_port': self.couchdb.port}
+
+class RetrieveTest(OfflineTestCase):
+    '''
+    Getting the graphs from the cache, through the cache of parsed graphs
+    '''
+    def test_unknown(self):
+        cache_store = CacheStore(self.config())
+        self.assertIsNone(cache_store.retrieve('http://x.org/missing'))
+
+    def test_parsed_graph_kept_once_processed(self):
+        options = {'couchdb_graph_cache_triples': 10,
+                   'couchdb_graph_cache_directory': self.directory + '/graphs'}
+        cache_store = CacheStore(self.config(**options))
+        (uri, graph) = document(0)
+        cache_store.store(uri, graph)
+        cache_store.retrieve(uri)
+        cache_store.mark_processed(uri)
+        
+        # Marking the entry as processed does not change its content
+        self.assertEqual(len(cache_store.retrieve(uri)), 1)
+        self.assertEqual(cache_store.graph_cache_stats()['memory_hits'], 1)
+        cache_store = CacheStore(self.config(**options))
+        self.assertEqual(len(cache_store.retrieve(uri)), 1)
+        self.assertEqual(cache_store.graph_cache_stats()['disk_hits'], 1)
+
+class FollowTest(OfflineTestCase):
+    '''
+    Following the processing queue
+    '''
+    def setUp(self):
+        OfflineTestCase.setUp(self)
+        self.cache_store = CacheStore(self.config())
+        self.cache_store.store_many([document(i) for i in range(3)])
+
+    def _follow(self, count):
+        # Stop once count entries have been read
+        entries = []
+        follower = self.cache_store.follow_processing_queue(
+            lambda: len(entries) < count, timeout=100)
+        for uri in follower:
+            entries.append(uri)
+        return (follower, entries)
+
+    def test_resume_after_acknowledged(self):
+        (follower, entries) = self._follow(3)
+        self.assertEqual(len(entries), 3)
+
+        # Only the first entry was written to the index
+        self.cache_store.mark_processed(entries[0])
+        follower.done(entries[0])
+        follower.save()
+        (_, again) = self._follow(2)
+        self.assertEqual(again, entries[1:])
+
+    def test_resume_after_all_acknowledged(self):
+        (follower, entries) = self._follow(3)
+        for uri in entries:
+            self.cache_store.mark_processed(uri)
+            follower.done(uri)
+        follower.save()
+        self.cache_store.store_many([document(3)])
+        (_, again) = self._follow(1)
+        self.assertEqual(again, [document(3)[0]])
+
+    def test_nothing_acknowledged(self):
+        (_, entries) = self._follow(3)
+        (_, again) = self._follow(3)
+        self.assertEqual(again, entries)
+
+LABELS = '''
+<http://x.org/A> <http://www.w3.org/2000/01/rdf-schema#label> "A", "A"@en,
+    "A"@en-GB, "A"@cy, "A"@fr, "A"@fr-CA ;
+    <http://purl.org/dc/terms/isPartOf> <http://x.org/C> ;
+    <http://x.org/unused> "A"@en, <http://x.org/B> .
+'''
+
+class FilterTest(OfflineTestCase):
+    '''
+    Pruning the triples not worth keeping in the cache
+    '''
+    def _labels(self, graph):
+        return sorted(str(o.language) for o in graph.objects(None, RDFS.label))
+
+    def test_no_filter(self):
+        graph = parse(LABELS)
+        self.assertIs(filter_triples(graph), graph)
+
+    def test_languages(self):
+        graph = filter_triples(parse(LABELS), languages=set(['en', 'cy']))
+        
+        # The literals without language and the URIs are always kept
+        self.assertEqual(self._labels(graph), ['None', 'cy', 'en', 'en-GB'])
+        self.assertEqual(len(graph), 7)
+
+    def test_full_language_tag(self):
+        graph = filter_triples(parse(LABELS), languages=set(['fr-ca']))
+        self.assertEqual(self._labels(graph), ['None', 'fr-CA'])
+
+    def test_predicates(self):
+        predicates = rule_predicates(os.path.join(ROOT, 'rulebase.ttl'))
+        graph = filter_triples(parse(LABELS), predicates=predicates)
+        self.assertEqual(set(graph.predicates()), set([RDFS.label, DCTERMS.isPartOf]))
+        self.assertEqual(len(graph), 7)
+
+    def test_pruned_when_cached(self):
+        cache_store = CacheStore(self.config(ingest_languages='en, cy',
+                                             ingest_prune_predicates='true'))
+        summary = cache_store.store_many([('http://x.org/doc', parse(LABELS))])
+        self.assertEqual(summary['pruned'], 4)
+        self.assertEqual(len(cache_store.retrieve('http://x.org/doc')), 5)
+
+class HashTest(unittest.TestCase):
+    '''
+    The hash of the content of the graphs
+    '''
+    def test_order_independent(self):
+        triples = list(parse('''
+            <http://x.org/A> <http://x.org/p> "a", "b" .
+            <http://x.org/B> <http://x.org/p> <http://x.org/A> .
+            '''))
+        (first, second) = (Graph(), Graph())
+        for triple in triples:
+            first.add(triple)
+        for triple in reversed(triples):
+            second.add(triple)
+        self.assertEqual(graph_hash(first), graph_hash(second))
+
+    def test_blank_nodes(self):
+        turtle = '''
+            <http://x.org/A> <http://x.org/p> [ <http://x.org/q> "a" ] .
+            '''
+        self.assertEqual(graph_hash(parse(turtle)), graph_hash(parse(turtle)))
+        self.assertNotEqual(graph_hash(parse(turtle)), graph_hash(parse(
+            turtle.replace('"a"', '"b"'))))
+
+    def test_content_change(self):
+        self.assertNotEqual(graph_hash(document(0)[1]), graph_hash(document(1)[1]))
+
+class WriteTest(OfflineTestCase):
+    '''
+    Writing the entries to the cache
+    '''
+    def setUp(self):
+        OfflineTestCase.setUp(self)
+        self.cache_store = CacheStore(self.config())
+
+    def _queue(self):
+        return sorted(self.cache_store.get_processing_queue())
+
+    def test_unchanged_skipped(self):
+        summary = self.cache_store.store_many([document(0), document(1)])
+        self.assertEqual((summary['written'], summary['skipped']), (2, 0))
+        for uri in self._queue():
+            self.cache_store.mark_processed(uri)
+        
+        # Only the document whose content changed is queued again
+        (uri, graph) = document(1)
+        graph += parse('<http://x.org/s1> <http://x.org/p> "new" .')
+        summary = self.cache_store.store_many([document(0), (uri, graph)])
+        self.assertEqual((summary['written'], summary['skipped']), (1, 1))
+        self.assertEqual(self._queue(), [uri])
+        self.assertEqual(len(self.cache_store.retrieve(uri)), 2)
+
+    def test_identical_payloads_shared(self):
+        graph = document(0)[1]
+        summary = self.cache_store.store_many([('http://x.org/doc0', graph)])
+        self.assertEqual(summary['deduplicated'], 0)
+        summary = self.cache_store.store_many([('http://x.org/copy', graph)])
+        self.assertEqual((summary['written'], summary['deduplicated']), (1, 1))
+        self.assertTrue(graph.isomorphic(self.cache_store.retrieve('http://x.org/copy')))
+        
+        # A single blob holds the payload of both documents
+        backend = self.cache_store._backend
+        self.assertIsNotNone(backend.get(get_blob_identifier(graph_hash(graph))))
+
+    def test_same_graph_twice_in_batch(self):
+        (uri, graph) = document(0)
+        summary = self.cache_store.store_many([(uri, parse('')), (uri, graph)])
+        self.assertEqual(summary['written'], 1)
+        self.assertEqual(summary['conflicts'], [])
+        self.assertTrue(graph.isomorphic(self.cache_store.retrieve(uri)))
@@ -0,0 +1,75 @@
+'''
+Created on 18 Oct 2026
+'''
+from indexer.storage import codecs
+from indexer.storage.cache import CacheStore
+from rdflib.term import Literal
+from tests.helpers import OfflineTestCase, parse
+from unittest import mock
+import unittest
+import zlib
+
+GRAPH = '''
+@prefix xsd: <http://www.w3.org/2001/XMLSchema#> .
+<http://x.org/A> <http://x.org/label> "plain", "étiquette"@fr, "label"@en-GB ;
+    <http://x.org/count> "42"^^xsd:integer ;
+    <http://x.org/date> "2016-04-01"^^xsd:date ;
+    <http://x.org/text> "two\\nlines with \\"quotes\\"" ;
+    <http://x.org/part> <http://x.org/B>, [ <http://x.org/label> "blank" ] .
+'''
+
+class CodecsTest(unittest.TestCase):
+    '''
+    Encoding the graphs stored in the cache and decoding them back
+    '''
+    def _check_round_trip(self, name):
+        graph = parse(GRAPH)
+        payload = codecs.encode(graph, name)
+        self.assertIsInstance(payload, bytes)
+        decoded = codecs.decode(payload, name)
+        self.assertTrue(graph.isomorphic(decoded))
+        
+        # The literals keep their language and datatype
+        literals = set(o for o in graph.objects() if isinstance(o, Literal))
+        self.assertEqual(len(literals), 7)
+        self.assertEqual(set(o for o in decoded.objects() if isinstance(o, Literal)),
+                         literals)
+
+    def test_turtle(self):
+        self._check_round_trip('turtle')
+
+    def test_nt(self):
+        self._check_round_trip('nt')
+
+    def test_nt_gz(self):
+        self._check_round_trip('nt.gz')
+
+    def test_binary(self):
+        self._check_round_trip('binary')
+
+    @unittest.skipIf(codecs.zstandard is None, 'zstandard is not installed')
+    def test_nt_zst(self):
+        self._check_round_trip('nt.zst')
+
+    def test_empty_graph(self):
+        for name in ['turtle', 'nt', 'nt.gz', 'binary']:
+            self.assertEqual(len(codecs.decode(codecs.encode(parse(''), name), name)), 0)
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            codecs.get_codec('xml')
+
+    def test_binary_magic(self):
+        with self.assertRaises(ValueError):
+            codecs.decode_binary(zlib.compress(b'something else'))
+
+class MissingZstandardTest(OfflineTestCase):
+    '''
+    Selecting the zstd codec without the module installed
+    '''
+    def test_clear_error(self):
+        with mock.patch.object(codecs, 'zstandard', None):
+            with self.assertRaisesRegex(ValueError, 'zstandard'):
+                codecs.get_codec('nt.zst')
+            with self.assertRaisesRegex(ValueError, 'zstandard'):
+                CacheStore(self.config(couchdb_codec='nt.zst'))
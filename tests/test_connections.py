@@ -0,0 +1,39 @@
+'''
+Created on 18 Oct 2026
+'''
+from benchmarks.standins import CouchDBStandIn
+from indexer.storage.cache import CacheStore
+from indexer.util.connections import get_couchdb_session, get_session, pool_stats
+from indexer.storage.backends.base import ConflictError
+from tests.helpers import OfflineTestCase, parse
+
+class CouchDBSessionTest(OfflineTestCase):
+    '''
+    The calls to CouchDB going through the shared pool of connections
+    '''
+    def setUp(self):
+        OfflineTestCase.setUp(self)
+        self.couchdb = CouchDBStandIn().start()
+        self.addCleanup(self.couchdb.stop)
+        self.config = self.config(cache_backend='couchdb', couchdb_hostname='127.0.0.1',
+                                  couchdb_port=self.couchdb.port)
+
+    def test_shared_pool(self):
+        cache_store = CacheStore(self.config)
+        graph = parse('<http://x.org/A> <http://x.org/p> "a" .')
+        cache_store.store('http://x.org/doc', graph)
+        self.assertEqual(len(cache_store.retrieve('http://x.org/doc')), 1)
+        self.assertEqual(list(cache_store.get_processing_queue()), ['http://x.org/doc'])
+
+        self.assertIs(get_couchdb_session(self.config).session, get_session(self.config))
+        stats = pool_stats()['127.0.0.1:{}'.format(self.couchdb.port)]
+        self.assertGreater(stats['requests'], 0)
+        self.assertEqual(stats['connections'], 1)
+
+    def test_errors(self):
+        backend = CacheStore(self.config)._backend
+        self.assertIsNone(backend.get('missing'))
+        self.assertIsNone(backend._db.get_attachment('missing', 'missing.nt'))
+        backend.save({'_id': 'doc'})
+        with self.assertRaises(ConflictError):
+            backend.save({'_id': 'doc'})
@@ -0,0 +1,100 @@
+'''
+Created on 18 Oct 2026
+'''
+from indexer.component.engine import RuleEngine
+from indexer.util.rules import read_rules
+from rdflib.graph import Graph
+from rdflib.plugins.sparql.processor import prepareQuery
+from rdflib.term import Literal
+from tests.helpers import ROOT, parse
+import os
+import unittest
+
+DATA = '''
+@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
+@prefix foaf: <http://xmlns.com/foaf/0.1/> .
+@prefix dct: <http://purl.org/dc/terms/> .
+@prefix mrss: <http://search.yahoo.com/mrss/> .
+@prefix po: <http://purl.org/ontology/po/> .
+@prefix owl: <http://www.w3.org/2002/07/owl#> .
+@prefix void: <http://rdfs.org/ns/void#> .
+
+<http://x.org/image> a foaf:Image ;
+    rdfs:label "Image"@en, "Delwedd"@cy ;
+    dct:description "An image" ;
+    dct:subject <http://x.org/topic1>, <http://x.org/topic2> ;
+    foaf:depicts <http://x.org/person> ;
+    mrss:player <http://x.org/player> ;
+    dct:isPartOf <http://x.org/collection> .
+
+# Missing a player, this is not a complete image
+<http://x.org/partial> a foaf:Image ;
+    rdfs:label "Partial" ;
+    dct:description "An image" ;
+    dct:subject <http://x.org/topic1> ;
+    foaf:depicts <http://x.org/person> .
+
+<http://x.org/episode> a po:Episode ;
+    rdfs:label "Episode" ;
+    po:synopsis "An episode" ;
+    po:credit <http://x.org/person>, [ rdfs:label "Someone" ] ;
+    mrss:player <http://x.org/player> ;
+    owl:sameAs <http://y.org/episode> .
+
+<http://x.org/collection> void:subset <http://x.org/sub>, _:sub, "not a collection" .
+<http://x.org/thing> dct:isPartOf "a literal", _:sub .
+'''
+
+class EngineTest(unittest.TestCase):
+    '''
+    The native matcher giving the same output as SPARQL on the rule base
+    '''
+    def setUp(self):
+        (queries, namespaces) = read_rules(os.path.join(ROOT, 'rulebase.ttl'))
+        self.rules = dict((name, prepareQuery(query, initNs=namespaces))
+                          for (name, query) in queries.items())
+
+    def _sparql(self, rules, graph):
+        # Evaluate the rules with SPARQL. The triples with a literal subject
+        # are not valid RDF and not part of the result of a CONSTRUCT
+        output = Graph()
+        for query in rules.values():
+            for (s, p, o) in graph.query(query).graph:
+                if not isinstance(s, Literal):
+                    output.add((s, p, o))
+        return output
+
+    def test_all_rules_compiled(self):
+        engine = RuleEngine(self.rules)
+        self.assertEqual(len(engine.compiled), len(self.rules))
+        self.assertEqual(engine.fallback, {})
+
+    def test_same_output(self):
+        graph = parse(DATA)
+        native = Graph()
+        RuleEngine(self.rules).apply(native, graph)
+        expected = self._sparql(self.rules, graph)
+        self.assertEqual(len(expected), 20)
+        self.assertTrue(native.isomorphic(expected))
+        self.assertFalse(any(isinstance(s, Literal) for s in native.subjects()))
+
+    def test_same_output_by_rule(self):
+        graph = parse(DATA)
+        for (name, query) in self.rules.items():
+            native = Graph()
+            RuleEngine({name: query}).apply(native, graph)
+            self.assertTrue(native.isomorphic(self._sparql({name: query}, graph)), name)
+
+    def test_fallback(self):
+        # A rule the native matcher can not run is evaluated with SPARQL
+        rules = {'optional': prepareQuery('''
+            CONSTRUCT { ?o <http://x.org/of> ?s } WHERE {
+                ?s <http://rdfs.org/ns/void#subset> ?o
+                OPTIONAL { ?o <http://x.org/missing> ?x }
+            }''')}
+        engine = RuleEngine(rules)
+        self.assertEqual(list(engine.fallback), ['optional'])
+        native = Graph()
+        engine.apply(native, parse(DATA))
+        self.assertEqual(len(native), 2)
+        self.assertTrue(native.isomorphic(self._sparql(rules, parse(DATA))))
@@ -0,0 +1,62 @@
+'''
+Created on 18 Oct 2026
+'''
+from indexer.storage.graphcache import GraphCache
+from tests.helpers import OfflineTestCase, parse
+import os
+
+def graph(size):
+    return parse('\n'.join('<http://x.org/s> <http://x.org/p> "{}" .'.format(i)
+                           for i in range(size)))
+
+class GraphCacheTest(OfflineTestCase):
+    '''
+    The two tiers cache of parsed graphs
+    '''
+    def test_memory_hit(self):
+        cache = GraphCache(10)
+        cached = graph(2)
+        cache.put('doc', 'v1', cached)
+        self.assertIs(cache.get('doc', 'v1'), cached)
+        self.assertEqual(cache.stats['memory_hits'], 1)
+
+    def test_miss(self):
+        cache = GraphCache(10)
+        self.assertIsNone(cache.get('doc', 'v1'))
+        
+        # Another version of the content is a miss too
+        cache.put('doc', 'v1', graph(2))
+        self.assertIsNone(cache.get('doc', 'v2'))
+        self.assertEqual(cache.stats['misses'], 2)
+
+    def test_eviction(self):
+        cache = GraphCache(5)
+        cache.put('doc1', 'v1', graph(2))
+        cache.put('doc2', 'v1', graph(2))
+        
+        # doc1 is used again so doc2 is the least recently used
+        cache.get('doc1', 'v1')
+        cache.put('doc3', 'v1', graph(2))
+        self.assertEqual(cache.stats['evictions'], 1)
+        self.assertIsNone(cache.get('doc2', 'v1'))
+        self.assertIsNotNone(cache.get('doc1', 'v1'))
+        self.assertIsNotNone(cache.get('doc3', 'v1'))
+
+    def test_too_large(self):
+        cache = GraphCache(5)
+        cache.put('doc', 'v1', graph(6))
+        self.assertIsNone(cache.get('doc', 'v1'))
+
+    def test_disk_hit(self):
+        directory = os.path.join(self.directory, 'graphs')
+        GraphCache(10, directory).put('doc', 'v1', graph(2))
+        
+        # Another process finds the graph on disk
+        cache = GraphCache(10, directory)
+        self.assertEqual(len(cache.get('doc', 'v1')), 2)
+        self.assertEqual(cache.stats['disk_hits'], 1)
+        
+        # Only the last version is kept
+        cache.put('doc', 'v2', graph(3))
+        self.assertEqual(os.listdir(directory), ['doc-v2.bin'])
+        self.assertIsNone(GraphCache(10, directory).get('doc', 'v1'))
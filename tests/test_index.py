@@ -0,0 +1,152 @@
+'''
+Created on 18 Oct 2026
+'''
+from benchmarks.standins import StardogStandIn
+from indexer.component.process import Process
+from indexer.storage.index import IndexStore
+from rdflib.graph import Dataset
+from rdflib.namespace import DCTERMS, OWL
+from rdflib.term import URIRef
+from tests.helpers import OfflineTestCase, parse
+import hashlib
+
+GRAPH = URIRef('http://localhost:8080/doc#data')
+(A, B, PROXY) = (URIRef('http://x.org/A'), URIRef('http://x.org/B'),
+                 URIRef('http://localhost:8080/proxy#id'))
+
+def quads(index_store):
+    '''
+    Get all the quads of the index, as (graph, subject, predicate, object)
+    '''
+    bindings = index_store.backend.select(
+        'SELECT ?g ?s ?p ?o WHERE { GRAPH ?g { ?s ?p ?o } }')
+    return set(tuple(URIRef(b[v]['value']) for v in 'gspo') for b in bindings)
+
+def triples(index_store):
+    '''
+    Get all the triples of the index, whatever graph they are in
+    '''
+    bindings = index_store.backend.select('SELECT ?s ?p ?o WHERE { ?s ?p ?o }')
+    return set(tuple(URIRef(b[v]['value']) for v in 'spo') for b in bindings)
+
+def data_graph(uri):
+    '''
+    Get the name of the graph with the data derived from a document
+    '''
+    return URIRef('http://localhost:8080/{}#data'.format(
+        hashlib.sha256(uri.encode()).hexdigest()))
+
+class RewritesTest(OfflineTestCase):
+    '''
+    The rewriting of the references to URIs which got a proxy, in the
+    embedded index
+    '''
+    def options(self):
+        return {}
+
+    def setUp(self):
+        OfflineTestCase.setUp(self)
+        self.index_store = IndexStore(self.config(**self.options()))
+        self.addCleanup(self.index_store.close)
+        dataset = Dataset()
+        dataset.graph(GRAPH).add((B, DCTERMS.isPartOf, A))
+        dataset.graph(GRAPH).add((B, OWL.sameAs, A))
+        self.index_store.store(dataset)
+
+    def test_rewrite_in_named_graph(self):
+        self.index_store.update_uris({A: PROXY})
+        self.assertEqual(quads(self.index_store),
+                         set([(GRAPH, B, DCTERMS.isPartOf, PROXY),
+                              (GRAPH, B, OWL.sameAs, A)]))
+        self.assertEqual(len(triples(self.index_store)), 2)
+
+    def test_rewrite_replaced_with_graph(self):
+        self.index_store.update_uris({A: PROXY})
+        dataset = Dataset()
+        dataset.graph(GRAPH).add((B, DCTERMS.isPartOf, B))
+        self.index_store.store(dataset)
+        self.assertEqual(triples(self.index_store),
+                         set([(B, DCTERMS.isPartOf, B)]))
+
+    def test_apply_rewrites(self):
+        # The first document refers to a URI which only gets a proxy when
+        # the second one is processed, the rewrite is deferred
+        documents = {'http://x.org/doc1': '''
+                         <http://x.org/B> <http://purl.org/dc/terms/isPartOf> <http://x.org/A> .''',
+                     'http://x.org/doc2': '''
+                         <http://x.org/A> <http://purl.org/dc/terms/isPartOf> <http://x.org/C> .'''}
+        processor = Process(self.config(stardog_transaction_size=1,
+                                        rewrites_threshold=100, **self.options()))
+        self.addCleanup(processor.index_store.close)
+        processor.cache_store.store_many(
+            [(uri, parse(turtle)) for (uri, turtle) in documents.items()])
+        for uri in sorted(documents):
+            processor.process(uri)
+        processor.flush()
+        processor.index_store.apply_rewrites()
+
+        # Name the proxies after the URI they stand for
+        graphs = [data_graph(uri) for uri in documents]
+        found = [quad for quad in quads(processor.index_store) if quad[0] in graphs]
+        names = dict((s, 'proxy of ' + o) for (_, s, p, o) in found if p == OWL.sameAs)
+        found = set(tuple(names.get(t, t) for t in quad) for quad in found)
+        (doc1, doc2) = (data_graph('http://x.org/doc1'), data_graph('http://x.org/doc2'))
+        self.assertEqual(found, set([
+            (doc1, 'proxy of ' + B, DCTERMS.isPartOf, 'proxy of ' + A),
+            (doc1, 'proxy of ' + B, OWL.sameAs, B),
+            (doc2, 'proxy of ' + A, DCTERMS.isPartOf, URIRef('http://x.org/C')),
+            (doc2, 'proxy of ' + A, OWL.sameAs, A)]))
+
+class StardogRewritesTest(RewritesTest):
+    '''
+    The same in Stardog, or rather in its stand-in
+    '''
+    def setUp(self):
+        self.stardog = StardogStandIn().start()
+        self.addCleanup(self.stardog.stop)
+        RewritesTest.setUp(self)
+
+    def options(self):
+        return {'index_backend': 'stardog', 'stardog_hostname': '127.0.0.1',
+                'stardog_port': self.stardog.port}
+
+class ProxyLookupTest(OfflineTestCase):
+    '''
+    The proxies of a set of URIs, looked up in the index in chunks
+    '''
+    def options(self):
+        return {}
+
+    def setUp(self):
+        OfflineTestCase.setUp(self)
+        self.index_store = IndexStore(self.config(equivalences_path='', **self.options()))
+        self.addCleanup(self.index_store.close)
+        self.uris = [URIRef('http://x.org/U{}'.format(i)) for i in range(5)]
+        dataset = Dataset()
+        for uri in self.uris:
+            dataset.graph(GRAPH).add((URIRef(uri + '/proxy'), OWL.sameAs, uri))
+        self.index_store.store(dataset)
+
+    def test_chunks(self):
+        select = self.index_store.backend.select
+        queries = []
+        def counted(query):
+            queries.append(query)
+            return select(query)
+        self.index_store.backend.select = counted
+        proxies = self.index_store.get_proxy_uris(self.uris + [A], chunk_size=2)
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(proxies, dict((uri, URIRef(uri + '/proxy')) for uri in self.uris))
+
+class StardogProxyLookupTest(ProxyLookupTest):
+    '''
+    The same in Stardog, or rather in its stand-in
+    '''
+    def setUp(self):
+        self.stardog = StardogStandIn().start()
+        self.addCleanup(self.stardog.stop)
+        ProxyLookupTest.setUp(self)
+
+    def options(self):
+        return {'index_backend': 'stardog', 'stardog_hostname': '127.0.0.1',
+                'stardog_port': self.stardog.port}
@@ -0,0 +1,138 @@
+'''
+Created on 18 Oct 2026
+'''
+from benchmarks.standins import CouchDBStandIn
+from concurrent.futures.process import BrokenProcessPool
+from indexer.component.ingest import Ingest, read_graphs
+from rdflib.term import URIRef
+from tests.helpers import OfflineTestCase
+from unittest import mock
+import os
+import threading
+
+def nquad(graph, subject):
+    return '<http://x.org/{}> <http://x.org/p> "{}" <http://x.org/{}> .\n'.format(
+        subject, subject, graph)
+
+class ReadGraphsTest(OfflineTestCase):
+    '''
+    The streaming of the graphs of an NQuads file
+    '''
+    def _write(self, lines):
+        file_name = os.path.join(self.directory, 'input.nq')
+        with open(file_name, 'w', encoding='utf-8') as nquad_file:
+            nquad_file.writelines(lines)
+        return file_name
+
+    def _subjects(self, graphs):
+        return [(str(uri), sorted(str(s) for s in graph.subjects()))
+                for (uri, graph) in graphs]
+
+    def test_first_graph_before_end_of_file(self):
+        # Write the file through a pipe which is only closed once the first
+        # graph was read
+        file_name = os.path.join(self.directory, 'input.nq')
+        os.mkfifo(file_name)
+        first_read = threading.Event()
+        def writer():
+            with open(file_name, 'w', encoding='utf-8') as pipe:
+                pipe.write(nquad('g1', 'a') + nquad('g1', 'b') + nquad('g2', 'c'))
+                pipe.flush()
+                first_read.wait(10)
+                pipe.write(nquad('g2', 'd'))
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            graphs = read_graphs(file_name, 10)
+            (uri, graph) = next(graphs)
+            self.assertEqual(uri, URIRef('http://x.org/g1'))
+            self.assertEqual(len(graph), 2)
+            self.assertTrue(thread.is_alive())
+        finally:
+            first_read.set()
+            thread.join()
+        self.assertEqual(self._subjects(graphs),
+                         [('http://x.org/g2', ['http://x.org/c', 'http://x.org/d'])])
+
+    def test_ungrouped_graphs(self):
+        file_name = self._write([nquad('g2', 'a'), nquad('g1', 'b'),
+                                 nquad('g2', 'c'), nquad('g3', 'd')])
+        graphs = self._subjects(read_graphs(file_name, 2))
+
+        # The graph which came back is returned again with all its triples
+        self.assertEqual(graphs, [('http://x.org/g2', ['http://x.org/a']),
+                                  ('http://x.org/g1', ['http://x.org/b']),
+                                  ('http://x.org/g2', ['http://x.org/a', 'http://x.org/c']),
+                                  ('http://x.org/g3', ['http://x.org/d'])])
+
+    def test_shards(self):
+        file_name = self._write([nquad('g{}'.format(i), 's{}'.format(i))
+                                 for i in range(10)])
+        graphs = [uri for shard in range(3)
+                  for (uri, _) in read_graphs(file_name, 4, shard, 3)]
+        self.assertEqual(sorted(graphs),
+                         sorted(URIRef('http://x.org/g{}'.format(i)) for i in range(10)))
+
+def _killed(*args):
+    # Leave the worker process without notice, as if it was killed
+    os._exit(1)
+
+class LoadTest(OfflineTestCase):
+    '''
+    The ingestion of a file in the current process
+    '''
+    def test_stream_ungrouped(self):
+        file_name = os.path.join(self.directory, 'input.nq')
+        with open(file_name, 'w', encoding='utf-8') as nquad_file:
+            nquad_file.writelines([nquad('g1', 'a'), nquad('g2', 'b'), nquad('g1', 'c')])
+        ingest = Ingest(self.config())
+        ingest.load(file_name, stream=True)
+        self.assertEqual(ingest.summary['conflicts'], [])
+        self.assertEqual(len(ingest.cache.retrieve('http://x.org/g1')), 2)
+
+class BatchTest(OfflineTestCase):
+    '''
+    The graphs written to CouchDB in batches
+    '''
+    def test_bulk_writes(self):
+        couchdb = CouchDBStandIn().start()
+        self.addCleanup(couchdb.stop)
+        file_name = os.path.join(self.directory, 'input.nq')
+        with open(file_name, 'w', encoding='utf-8') as nquad_file:
+            nquad_file.writelines(nquad('g{}'.format(i), 's{}'.format(i))
+                                  for i in range(5))
+        ingest = Ingest(self.config(cache_backend='couchdb', couchdb_hostname='127.0.0.1',
+                                    couchdb_port=couchdb.port, couchdb_batch_size=2))
+        couchdb.requests.clear()
+        ingest.load(file_name)
+        self.assertEqual(ingest.summary['written'], 5)
+        
+        # Every batch costs one request to get the existing documents and
+        # one to write them with their payloads inlined
+        self.assertEqual(couchdb.requests, {'all_docs': 3, 'bulk_docs': 3})
+        graph = ingest.cache.retrieve('http://x.org/g4')
+        self.assertEqual([str(o) for o in graph.objects()], ['s4'])
+
+class LoadAllTest(OfflineTestCase):
+    '''
+    The ingestion of several files by a pool of processes
+    '''
+    def setUp(self):
+        OfflineTestCase.setUp(self)
+        self.file_names = []
+        for index in range(2):
+            file_name = os.path.join(self.directory, 'input{}.nq'.format(index))
+            with open(file_name, 'w', encoding='utf-8') as nquad_file:
+                nquad_file.writelines(nquad('g{}{}'.format(index, i), 's{}'.format(i))
+                                      for i in range(5))
+            self.file_names.append(file_name)
+        self.ingest = Ingest(self.config())
+
+    def test_load_all(self):
+        self.ingest.load_all(self.file_names, 2, 2)
+        self.assertEqual(self.ingest.summary['written'], 10)
+
+    def test_worker_killed(self):
+        with mock.patch('indexer.component.ingest.read_graphs', _killed):
+            with self.assertRaises(BrokenProcessPool):
+                self.ingest.load_all(self.file_names, 2)
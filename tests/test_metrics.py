@@ -0,0 +1,130 @@
+'''
+Created on 18 Oct 2026
+'''
+from indexer.component.process import Process
+from indexer.util.metrics import Registry, REGISTRY, PROCESS_DOCUMENTS, PROCESS_SECONDS
+from tests.helpers import OfflineTestCase, write_config, parse
+import importlib
+import os
+import shutil
+import tempfile
+import unittest
+
+class RegistryTest(unittest.TestCase):
+    '''
+    The counters and histograms and their Prometheus text format
+    '''
+    def setUp(self):
+        self.registry = Registry()
+        self.counter = self.registry.counter('test_total', 'Things counted', ['outcome'])
+        self.histogram = self.registry.histogram('test_seconds', 'Time spent',
+                                                 ['step'], buckets=(0.1, 1.0))
+
+    def test_counter(self):
+        self.counter.inc(outcome='stored')
+        self.counter.inc(2, outcome='stored')
+        self.counter.inc(outcome='failed')
+        self.assertEqual(self.counter.value(outcome='stored'), 3)
+        self.assertEqual(self.counter.value(outcome='failed'), 1)
+        self.assertEqual(self.counter.value(outcome='other'), 0)
+        self.assertRaises(ValueError, self.counter.inc, step='parse')
+
+    def test_render(self):
+        self.counter.inc(outcome='stored')
+        for value in [0.05, 0.5, 0.5, 5]:
+            self.histogram.observe(value, step='parse')
+        lines = self.registry.render().splitlines()
+        self.assertIn('# TYPE test_total counter', lines)
+        self.assertIn('test_total{outcome="stored"} 1', lines)
+        self.assertIn('# TYPE test_seconds histogram', lines)
+        
+        # The buckets are cumulated
+        self.assertIn('test_seconds_bucket{step="parse",le="0.1"} 1', lines)
+        self.assertIn('test_seconds_bucket{step="parse",le="1.0"} 3', lines)
+        self.assertIn('test_seconds_bucket{step="parse",le="+Inf"} 4', lines)
+        self.assertIn('test_seconds_sum{step="parse"} 6.05', lines)
+        self.assertIn('test_seconds_count{step="parse"} 4', lines)
+
+    def test_snapshot_merge(self):
+        self.counter.inc(outcome='stored')
+        self.histogram.observe(0.5, step='parse')
+        snapshot = self.registry.snapshot()
+        
+        # Taking a snapshot starts again from zero
+        self.assertEqual(self.counter.value(outcome='stored'), 0)
+        self.assertEqual(self.histogram.count(step='parse'), 0)
+        
+        # The snapshot of another process is added to the values
+        self.counter.inc(outcome='stored')
+        self.registry.merge(snapshot)
+        self.registry.merge(snapshot)
+        self.assertEqual(self.counter.value(outcome='stored'), 3)
+        self.assertEqual(self.histogram.count(step='parse'), 2)
+        self.assertIn('test_seconds_bucket{step="parse",le="1.0"} 2',
+                      self.registry.render().splitlines())
+
+    def test_dump(self):
+        self.counter.inc(outcome='stored')
+        directory = tempfile.mkdtemp(prefix='indexer-test-')
+        self.addCleanup(shutil.rmtree, directory)
+        file_name = os.path.join(directory, 'metrics.prom')
+        self.registry.dump(file_name)
+        with open(file_name) as metrics_file:
+            self.assertEqual(metrics_file.read(), self.registry.render())
+
+class ProcessTest(OfflineTestCase):
+    '''
+    The metrics collected when processing entries, in this process or in
+    a pool of workers
+    '''
+    def setUp(self):
+        OfflineTestCase.setUp(self)
+        self.processor = Process(self.config(stardog_transaction_size=2))
+        self.processor.cache_store.store_many([('http://x.org/doc{}'.format(i), parse('''
+            <http://x.org/A{}> <http://purl.org/dc/terms/isPartOf> <http://x.org/C> .
+            '''.format(i))) for i in range(4)])
+        REGISTRY.snapshot()
+
+    def test_process(self):
+        for uri in self.processor.cache_store.get_processing_queue():
+            self.processor.process(uri)
+        self.assertTrue(self.processor.flush())
+        self.assertEqual(PROCESS_DOCUMENTS.value(outcome='stored'), 4)
+        self.assertEqual(PROCESS_SECONDS.count(stage='rules'), 4)
+
+    def test_process_all(self):
+        self.processor.process_all(self.processor.cache_store.get_processing_queue(), 2)
+        self.assertEqual(PROCESS_DOCUMENTS.value(outcome='stored'), 4)
+        self.assertEqual(PROCESS_SECONDS.count(stage='rules'), 4)
+
+class ViewTest(OfflineTestCase):
+    '''
+    The metrics exposed by the web application
+    '''
+    def setUp(self):
+        OfflineTestCase.setUp(self)
+        try:
+            importlib.import_module('flask')
+            importlib.import_module('flask_bootstrap')
+        except ImportError:
+            self.skipTest('The web application needs flask')
+        
+        # The application reads config.cfg from the working directory
+        write_config(self.directory)
+        os.rename(os.path.join(self.directory, 'test.cfg'),
+                  os.path.join(self.directory, 'config.cfg'))
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.directory)
+        from indexer.app import application
+        importlib.import_module('indexer.app.views')
+        self.client = application.test_client()
+
+    def test_metrics(self):
+        PROCESS_DOCUMENTS.inc(outcome='stored')
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['Content-Type'].startswith('text/plain'))
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertIn('# TYPE indexer_process_documents_total counter', lines)
+        self.assertIn('indexer_process_documents_total{{outcome="stored"}} {}'.format(
+            PROCESS_DOCUMENTS.value(outcome='stored')), lines)
@@ -0,0 +1,64 @@
+'''
+Created on 18 Oct 2026
+'''
+from indexer.component.pipeline import Pipeline
+from indexer.component.process import Process
+from tests.helpers import OfflineTestCase, parse
+from unittest import mock
+
+class PipelineTest(OfflineTestCase):
+    '''
+    Processing the queue with the stages running concurrently
+    '''
+    def setUp(self):
+        OfflineTestCase.setUp(self)
+        self.processor = Process(self.config(stardog_transaction_size=2))
+        self.uris = ['http://x.org/doc{}'.format(i) for i in range(5)]
+        self.processor.cache_store.store_many([(uri, parse('''
+            <http://x.org/A{}> <http://purl.org/dc/terms/isPartOf> <http://x.org/C> .
+            '''.format(i))) for (i, uri) in enumerate(self.uris)])
+        self.acknowledged = []
+        self.processor.acknowledge = self.acknowledged.append
+
+    def _run(self):
+        pipeline = Pipeline(self.processor, concurrency=2, queue_size=2)
+        stored = pipeline.run(self.processor.cache_store.get_processing_queue())
+        return (pipeline, stored)
+
+    def _queue(self):
+        return sorted(self.processor.cache_store.get_processing_queue())
+
+    def test_all_stored(self):
+        (pipeline, stored) = self._run()
+        self.assertEqual(stored, 5)
+        self.assertEqual(pipeline.stats['write']['jobs'], 5)
+        self.assertEqual(sorted(self.acknowledged), self.uris)
+        self.assertEqual(self._queue(), [])
+
+    def test_failed_stage(self):
+        derive = self.processor.derive
+        def failing(job):
+            if job['uri'] == self.uris[1]:
+                raise ValueError('Broken document')
+            return derive(job)
+        self.processor.derive = failing
+        (pipeline, stored) = self._run()
+        self.assertEqual(stored, 4)
+        self.assertEqual(pipeline.stats['derive']['failed'], 1)
+        
+        # The entry is skipped but stays in the queue
+        self.assertEqual(sorted(self.acknowledged), self.uris)
+        self.assertEqual(self._queue(), [self.uris[1]])
+
+    def test_failed_store(self):
+        index_store = self.processor.index_store
+        with mock.patch.object(index_store, 'store_many',
+                               side_effect=IOError('Index down')):
+            (pipeline, stored) = self._run()
+        self.assertEqual(stored, 0)
+        
+        # Every batch written is a failure, none of the entries is
+        # acknowledged and they all stay in the queue
+        self.assertEqual(pipeline.stats['write']['failed'], 3)
+        self.assertEqual(self.acknowledged, [])
+        self.assertEqual(self._queue(), self.uris)
@@ -0,0 +1,355 @@
+'''
+Created on 18 Oct 2026
+'''
+from indexer.component.process import Process
+from indexer.storage.index import IndexStore
+from rdflib.namespace import DCTERMS, OWL
+from rdflib.term import URIRef
+from indexer.storage.cache import get_identifier
+from tests.helpers import OfflineTestCase, parse
+from tests.test_index import quads, data_graph
+from unittest import mock
+import itertools
+import os
+import time
+
+SHARED = URIRef('http://x.org/A')
+
+class ProxiesTest(OfflineTestCase):
+    '''
+    The proxies assigned to the subjects of the documents
+    '''
+    def _process(self, documents, **options):
+        processor = Process(self.config(**options))
+        processor.cache_store.store_many(
+            [(uri, parse(turtle)) for (uri, turtle) in documents])
+        for uri in processor.cache_store.get_processing_queue():
+            processor.process(uri)
+        self.assertTrue(processor.flush())
+        return processor
+
+    def _proxies(self, processor, uri):
+        bindings = processor.index_store.backend.select('''
+            SELECT DISTINCT ?proxy WHERE {{ ?proxy <{}> <{}> }}
+            '''.format(OWL.sameAs, uri))
+        return set(binding['proxy']['value'] for binding in bindings)
+
+    def test_shared_subject_in_one_batch(self):
+        documents = [('http://x.org/doc1', '''
+                         <http://x.org/A> <http://purl.org/dc/terms/isPartOf> <http://x.org/C1> .'''),
+                     ('http://x.org/doc2', '''
+                         <http://x.org/A> <http://purl.org/dc/terms/isPartOf> <http://x.org/C2> .''')]
+        processor = self._process(documents, stardog_transaction_size=100)
+        self.assertEqual(len(self._proxies(processor, SHARED)), 1)
+
+    def test_shared_subject_in_several_batches(self):
+        documents = [('http://x.org/doc{}'.format(i), '''
+                         <http://x.org/A> <http://purl.org/dc/terms/isPartOf> <http://x.org/C{}> .'''.format(i))
+                     for i in range(5)]
+        processor = self._process(documents, stardog_transaction_size=2)
+        self.assertEqual(len(self._proxies(processor, SHARED)), 1)
+
+class WorkersTest(OfflineTestCase):
+    '''
+    The proxies assigned by a pool of workers
+    '''
+    def test_registry_shared(self):
+        processor = Process(self.config(stardog_transaction_size=2))
+        documents = [('http://x.org/doc{}'.format(i), parse('''
+            <http://x.org/A> <http://purl.org/dc/terms/isPartOf> <http://x.org/C{}> .
+            '''.format(i))) for i in range(4)]
+        processor.cache_store.store_many(documents)
+        
+        # Writing to the index is slow, the batch of a worker is still
+        # being written when the other one looks for a proxy for A
+        store_many = IndexStore.store_many
+        def slow(index_store, *args, **kwargs):
+            time.sleep(0.5)
+            return store_many(index_store, *args, **kwargs)
+        with mock.patch.object(IndexStore, 'store_many', slow):
+            progress = processor.process_all(processor.cache_store.get_processing_queue(), 2)
+        self.assertEqual(len(progress), 2)
+        self.assertEqual(sum(stats['processed'] for stats in progress.values()), 4)
+        bindings = processor.index_store.backend.select('''
+            SELECT DISTINCT ?proxy WHERE {{ ?proxy <{}> <{}> }}
+            '''.format(OWL.sameAs, SHARED))
+        self.assertEqual(len(bindings), 1)
+
+class FollowTest(OfflineTestCase):
+    '''
+    Processing the entries while following the queue
+    '''
+    def test_only_written_entries_acknowledged(self):
+        processor = Process(self.config(stardog_transaction_size=2))
+        processor.cache_store.store_many([('http://x.org/doc{}'.format(i), parse('''
+            <http://x.org/A{}> <http://purl.org/dc/terms/isPartOf> <http://x.org/C> .
+            '''.format(i))) for i in range(3)])
+        def follow(count):
+            # Process entries until count of them have been read
+            entries = []
+            follower = processor.cache_store.follow_processing_queue(
+                lambda: len(entries) < count, timeout=100)
+            processor.acknowledge = follower.done
+            for uri in follower:
+                entries.append(uri)
+                processor.process(uri)
+            follower.save()
+            return entries
+
+        # The last entry is still waiting in the batch when we stop, as if
+        # the process was killed
+        follow(3)
+        self.assertEqual(len(processor._batch), 1)
+        waiting = processor._batch[0]['uri']
+        processor._batch = []
+        self.assertEqual(follow(1), [waiting])
+
+    def _failing_derive(self):
+        # The second document can not be processed
+        derive = Process.derive
+        def failing(processor, job):
+            if job['uri'] == 'http://x.org/doc1':
+                raise ValueError('Broken document')
+            return derive(processor, job)
+        return mock.patch.object(Process, 'derive', failing)
+
+    def _check_skipped(self, processor):
+        # Following again does not return to the failed entry, which is
+        # still waiting for the next run over the whole queue
+        deadline = time.time() + 0.5
+        follower = processor.cache_store.follow_processing_queue(
+            lambda: time.time() < deadline, timeout=100)
+        self.assertEqual(list(follower), [])
+        self.assertEqual(list(processor.cache_store.get_processing_queue()),
+                         ['http://x.org/doc1'])
+
+    def test_failed_entry_skipped(self):
+        processor = Process(self.config(stardog_transaction_size=1))
+        processor.cache_store.store_many([('http://x.org/doc{}'.format(i), parse('''
+            <http://x.org/A{}> <http://purl.org/dc/terms/isPartOf> <http://x.org/C> .
+            '''.format(i))) for i in range(3)])
+        entries = []
+        follower = processor.cache_store.follow_processing_queue(
+            lambda: len(entries) < 3, timeout=100)
+        processor.acknowledge = follower.done
+        def following():
+            for uri in follower:
+                entries.append(uri)
+                yield uri
+        with self._failing_derive():
+            self.assertEqual(processor.process_following(following()), 1)
+        follower.save()
+        self.assertEqual(len(entries), 3)
+        self._check_skipped(processor)
+
+    def test_failed_entry_skipped_by_workers(self):
+        processor = Process(self.config(stardog_transaction_size=1))
+        processor.cache_store.store_many([('http://x.org/doc{}'.format(i), parse('''
+            <http://x.org/A{}> <http://purl.org/dc/terms/isPartOf> <http://x.org/C> .
+            '''.format(i))) for i in range(3)])
+        follower = processor.cache_store.follow_processing_queue(
+            lambda: True, timeout=100)
+        processor.acknowledge = follower.done
+        entries = list(itertools.islice(follower, 3))
+        with self._failing_derive():
+            progress = processor.process_all(entries, 2)
+        follower.save()
+        self.assertEqual(sum(stats['failed'] for stats in progress.values()), 1)
+        self._check_skipped(processor)
+
+class PlanTest(OfflineTestCase):
+    '''
+    Assigning the proxies to the equivalence classes of the whole queue
+    '''
+    def setUp(self):
+        OfflineTestCase.setUp(self)
+        self.processor = Process(self.config())
+        self.processor.cache_store.store_many([
+            ('http://x.org/doc1', parse('<http://x.org/A> <{}> <http://x.org/B> .'.format(OWL.sameAs))),
+            ('http://x.org/doc2', parse('<http://x.org/C> <{}> <http://x.org/B> .'.format(OWL.sameAs)))])
+        self.uris = ['http://x.org/doc1', 'http://x.org/doc2']
+
+    def _check_plan(self):
+        self.assertEqual(self.processor.plan_proxies(self.uris), 1)
+        plan = self.processor.proxy_plan
+        self.assertEqual(sorted(plan), [URIRef('http://x.org/' + n) for n in 'ABC'])
+        self.assertEqual(len(set(plan.values())), 1)
+
+    def test_plan_without_payloads(self):
+        with mock.patch.object(self.processor.cache_store, 'retrieve',
+                               side_effect=AssertionError('payload fetched')):
+            self._check_plan()
+
+    def test_plan_legacy_entries(self):
+        # Entries cached before the links were kept with the metadata
+        backend = self.processor.cache_store._backend
+        metadata = backend.get(get_identifier('http://x.org/doc2'))
+        del metadata['same_as']
+        backend.save(metadata)
+        self._check_plan()
+
+class EquivalencesTest(OfflineTestCase):
+    '''
+    The local index of the equivalences kept in sync with the triple store
+    '''
+    def _process(self, processor, turtle):
+        processor.cache_store.store_many([('http://x.org/doc1', parse(turtle))])
+        for uri in processor.cache_store.get_processing_queue():
+            processor.process(uri)
+        self.assertTrue(processor.flush())
+
+    def test_reprocessed_link_dropped(self):
+        processor = Process(self.config())
+        self._process(processor, '''
+            <http://x.org/A> <{}> <http://x.org/B> .
+            <http://x.org/A> <http://purl.org/dc/terms/isPartOf> <http://x.org/C> .
+            '''.format(OWL.sameAs))
+        index_store = processor.index_store
+        self.assertIsNotNone(index_store.lookup('http://x.org/B'))
+        
+        # The document no longer says A is a sameAs of B
+        self._process(processor, '''
+            <http://x.org/A> <http://purl.org/dc/terms/isPartOf> <http://x.org/C> .
+            ''')
+        self.assertIsNone(index_store.lookup('http://x.org/B'))
+        self.assertIsNotNone(index_store.lookup('http://x.org/A'))
+        report = index_store.check_equivalences()
+        self.assertEqual(report['different'], 0)
+        self.assertEqual(report['missing'], 0)
+        self.assertEqual(report['extra'], 0)
+        self.assertEqual(report['stale'], 0)
+
+    def test_not_built(self):
+        processor = Process(self.config())
+        self._process(processor, '''
+            <http://x.org/A> <{}> <http://x.org/B> .
+            '''.format(OWL.sameAs))
+        proxy = processor.index_store.lookup('http://x.org/B')
+        
+        # A new local index on an existing store is not used until built
+        processor = Process(self.config(equivalences_path='other.sqlite'))
+        index_store = processor.index_store
+        self.assertEqual(index_store.equivalences.path,
+                         os.path.join(self.directory, 'other.sqlite'))
+        self.assertIsNone(index_store.local_equivalences())
+        self.assertEqual(index_store.lookup('http://x.org/B'), proxy)
+        self._process(processor, '''
+            <http://x.org/A> <{}> <http://x.org/B> .
+            <http://x.org/A> <http://purl.org/dc/terms/isPartOf> <http://x.org/C> .
+            '''.format(OWL.sameAs))
+        self.assertEqual(len(index_store.equivalences), 0)
+        self.assertEqual(index_store.lookup('http://x.org/B'), proxy)
+        
+        index_store.rebuild_equivalences()
+        self.assertIs(index_store.local_equivalences(), index_store.equivalences)
+        self.assertEqual(index_store.lookup('http://x.org/B'), proxy)
+
+    def test_rebuild(self):
+        processor = Process(self.config())
+        self._process(processor, '''
+            <http://x.org/A> <{}> <http://x.org/B> .
+            '''.format(OWL.sameAs))
+        index_store = processor.index_store
+        links = set(index_store.equivalences.links())
+        self.assertEqual(index_store.rebuild_equivalences(), 2)
+        self.assertEqual(set(index_store.equivalences.links()), links)
+
+class DeltaTest(OfflineTestCase):
+    '''
+    Sending only the changes to the index when a document is processed again
+    '''
+    def setUp(self):
+        OfflineTestCase.setUp(self)
+        self.processor = Process(self.config())
+
+    def _process(self, uri, turtle):
+        processor = self.processor
+        processor.cache_store.store_many([(uri, parse(turtle))])
+        with mock.patch.object(processor.index_store, 'store_many',
+                               wraps=processor.index_store.store_many) as store_many:
+            for entry in processor.cache_store.get_processing_queue():
+                processor.process(entry)
+            self.assertTrue(processor.flush())
+        processor.index_store.apply_rewrites()
+        return store_many.call_args
+
+    def _data(self, uri):
+        # The triples of the data graph of a document, without its proxy
+        graph = data_graph(uri)
+        return set((p, o) for (g, _, p, o) in quads(self.processor.index_store)
+                   if g == graph)
+
+    def _changes(self, call, name):
+        return set((p, o) for dataset in call[1][name] for (_, p, o, _) in dataset.quads())
+
+    def test_only_changes_written(self):
+        self._process('http://x.org/doc1', '''
+            <http://x.org/A> <http://purl.org/dc/terms/isPartOf> <http://x.org/C1>, <http://x.org/C2> .
+            ''')
+        call = self._process('http://x.org/doc1', '''
+            <http://x.org/A> <http://purl.org/dc/terms/isPartOf> <http://x.org/C2>, <http://x.org/C3> .
+            ''')
+        
+        # The data graph is not replaced, only the changes are sent
+        (datasets,) = call[0]
+        self.assertNotIn(data_graph('http://x.org/doc1'),
+                         [g.identifier for d in datasets for g in d.graphs() if len(g) > 0])
+        self.assertEqual(self._changes(call, 'additions'),
+                         set([(DCTERMS.isPartOf, URIRef('http://x.org/C3'))]))
+        self.assertEqual(self._changes(call, 'removals'),
+                         set([(DCTERMS.isPartOf, URIRef('http://x.org/C1'))]))
+        self.assertEqual(self._data('http://x.org/doc1'),
+                         set([(OWL.sameAs, SHARED),
+                              (DCTERMS.isPartOf, URIRef('http://x.org/C2')),
+                              (DCTERMS.isPartOf, URIRef('http://x.org/C3'))]))
+
+    def test_rewritten_reference_removed(self):
+        self._process('http://x.org/doc1', '''
+            <http://x.org/A> <http://purl.org/dc/terms/isPartOf> <http://x.org/B> .
+            ''')
+        
+        # B gets a proxy and the reference to it is rewritten in the index
+        self._process('http://x.org/doc2', '''
+            <http://x.org/B> <http://purl.org/dc/terms/isPartOf> <http://x.org/C> .
+            ''')
+        proxy = self.processor.index_store.get_proxy_uri('http://x.org/B')
+        self.assertIn((DCTERMS.isPartOf, proxy), self._data('http://x.org/doc1'))
+        
+        self._process('http://x.org/doc1', '''
+            <http://x.org/A> <http://purl.org/dc/terms/isPartOf> <http://x.org/C> .
+            ''')
+        self.assertEqual(self._data('http://x.org/doc1'),
+                         set([(OWL.sameAs, SHARED),
+                              (DCTERMS.isPartOf, URIRef('http://x.org/C'))]))
+
+    def test_new_reference_uses_proxy(self):
+        self._process('http://x.org/doc1', '''
+            <http://x.org/A> <http://purl.org/dc/terms/isPartOf> <http://x.org/C> .
+            <http://x.org/E> <http://purl.org/dc/terms/isPartOf> <http://x.org/B> .
+            ''')
+        self._process('http://x.org/doc2', '''
+            <http://x.org/B> <http://purl.org/dc/terms/isPartOf> <http://x.org/C> .
+            ''')
+        proxy = self.processor.index_store.get_proxy_uri('http://x.org/B')
+        
+        # The document now also says A is part of B, which has a proxy since
+        # the last time it was processed
+        self._process('http://x.org/doc1', '''
+            <http://x.org/A> <http://purl.org/dc/terms/isPartOf> <http://x.org/C>, <http://x.org/B> .
+            <http://x.org/E> <http://purl.org/dc/terms/isPartOf> <http://x.org/B> .
+            ''')
+        graph = data_graph('http://x.org/doc1')
+        data = set((s, o) for (g, s, p, o) in quads(self.processor.index_store)
+                   if g == graph and p == DCTERMS.isPartOf)
+        self.assertEqual(set(o for (_, o) in data), set([proxy, URIRef('http://x.org/C')]))
+        self.assertEqual(len(data), 3)
+
+    def test_blank_nodes_written_in_full(self):
+        self._process('http://x.org/doc1', '''
+            <http://x.org/A> <http://purl.org/dc/terms/isPartOf> [ <http://purl.org/dc/terms/title> "c" ] .
+            ''')
+        call = self._process('http://x.org/doc1', '''
+            <http://x.org/A> <http://purl.org/dc/terms/isPartOf> [ <http://purl.org/dc/terms/title> "d" ] .
+            ''')
+        self.assertEqual(call[1]['additions'], [])
+        self.assertEqual(call[1]['removals'], [])
@@ -0,0 +1,127 @@
+'''
+Created on 18 Oct 2026
+'''
+from indexer.component.process import Process
+from indexer.util.profiling import Profiler, count_sparql, dumping
+from tests.helpers import OfflineTestCase, parse
+import os
+import pstats
+import time
+import unittest
+
+class ProfilerTest(unittest.TestCase):
+    '''
+    The costs recorded for the rules and the documents
+    '''
+    def setUp(self):
+        self.profiler = Profiler()
+
+    def test_rules(self):
+        for matches in [1, 2]:
+            with self.profiler.rule('rule') as stats:
+                stats['matches'] = matches
+        stats = self.profiler.rules['rule']
+        self.assertEqual((stats['calls'], stats['matches']), (2, 3))
+        self.assertGreaterEqual(stats['wall'], 0)
+
+    def test_stages(self):
+        with self.profiler.stage('http://x.org/doc', 'rules'):
+            count_sparql('select')
+            count_sparql('select')
+            
+            # The work done for a whole batch is left out
+            with self.profiler.detached():
+                count_sparql('update')
+                time.sleep(0.2)
+        
+        # Nothing is counted outside of a stage
+        count_sparql('select')
+        stats = self.profiler.documents['http://x.org/doc']
+        self.assertEqual(stats['sparql'], {'select': 2})
+        self.assertLess(stats['wall']['rules'], 0.1)
+
+    def test_snapshot_merge(self):
+        with self.profiler.rule('rule'):
+            pass
+        with self.profiler.stage('http://x.org/doc', 'rules'):
+            count_sparql('select')
+        snapshot = self.profiler.snapshot()
+        self.assertEqual((self.profiler.rules, self.profiler.documents), ({}, {}))
+        self.profiler.merge(snapshot)
+        self.profiler.merge(snapshot)
+        self.assertEqual(self.profiler.rules['rule']['calls'], 2)
+        self.assertEqual(self.profiler.documents['http://x.org/doc']['sparql'],
+                         {'select': 2})
+
+    def test_report(self):
+        for (name, pause) in [('cheap', 0), ('expensive', 0.05), ('other', 0)]:
+            with self.profiler.rule(name):
+                time.sleep(pause)
+        for uri in ['http://x.org/doc1', 'http://x.org/doc2']:
+            with self.profiler.stage(uri, 'rules'):
+                count_sparql('select')
+        lines = self.profiler.report(top=2).splitlines()
+        self.assertTrue(lines[0].startswith('Rules: 3 applied'))
+        
+        # The most expensive rule comes first and only the top ones are listed
+        self.assertTrue(lines[2].endswith('expensive'))
+        self.assertEqual(lines.index(''), 4)
+        self.assertTrue(lines[5].startswith('Documents: 2 processed, 2 SPARQL'))
+        self.assertEqual(len(lines), 9)
+
+class ProcessTest(OfflineTestCase):
+    '''
+    The costs recorded when processing entries, in this process or in a
+    pool of workers
+    '''
+    def setUp(self):
+        OfflineTestCase.setUp(self)
+        # Look the proxies up in the index, sending SPARQL requests
+        self.processor = Process(self.config(stardog_transaction_size=2,
+                                             equivalences_path=''))
+        self.uris = ['http://x.org/doc{}'.format(i) for i in range(4)]
+        self.processor.cache_store.store_many([(uri, parse('''
+            <http://x.org/A{}> <http://purl.org/dc/terms/isPartOf> <http://x.org/C> .
+            '''.format(i))) for (i, uri) in enumerate(self.uris)])
+        self.processor.profiler = Profiler()
+
+    def _check(self):
+        profiler = self.processor.profiler
+        self.assertEqual(sorted(profiler.documents), self.uris)
+        for stats in profiler.documents.values():
+            self.assertTrue(set(['retrieve', 'rules', 'resolve']) <= set(stats['wall']))
+            self.assertGreater(sum(stats['sparql'].values()), 0)
+        self.assertTrue(all(stats['calls'] == 4 for stats in profiler.rules.values()))
+
+    def test_process(self):
+        for uri in self.processor.cache_store.get_processing_queue():
+            self.processor.process(uri)
+        self.assertTrue(self.processor.flush())
+        self._check()
+
+    def test_process_all(self):
+        self.processor.process_all(self.processor.cache_store.get_processing_queue(), 2)
+        self._check()
+
+class DumpTest(OfflineTestCase):
+    '''
+    The profiles dumped for other tools
+    '''
+    def _work(self):
+        return sum(i * i for i in range(100000))
+
+    def test_cprofile(self):
+        file_name = os.path.join(self.directory, 'run.prof')
+        with dumping(file_name):
+            self._work()
+        functions = [function for (_, _, function) in pstats.Stats(file_name).stats]
+        self.assertIn('_work', functions)
+
+    def test_folded(self):
+        file_name = os.path.join(self.directory, 'run.folded')
+        with dumping(file_name):
+            time.sleep(0.1)
+        with open(file_name) as folded:
+            lines = folded.read().splitlines()
+        self.assertGreater(len(lines), 0)
+        self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in lines))
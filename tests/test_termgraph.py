@@ -0,0 +1,91 @@
+'''
+Created on 18 Oct 2026
+'''
+from indexer.util.termgraph import TermGraph
+from rdflib.graph import Graph
+from rdflib.namespace import OWL
+from rdflib.term import URIRef, Literal
+from tests.helpers import parse
+import unittest
+
+DATA = '''
+<http://x.org/A> <http://x.org/p> <http://x.org/B>, "A"@en ;
+    <http://www.w3.org/2002/07/owl#sameAs> <http://x.org/B> .
+<http://x.org/B> <http://x.org/p> <http://x.org/C>, <http://x.org/A> ;
+    <http://www.w3.org/2002/07/owl#sameAs> <http://x.org/A> .
+<http://x.org/P> <http://x.org/p> <http://x.org/C> .
+'''
+
+def x(name):
+    return URIRef('http://x.org/' + name)
+
+class TermGraphTest(unittest.TestCase):
+    '''
+    The compact graph used as working memory when processing a document
+    '''
+    def setUp(self):
+        self.graph = parse(DATA)
+        self.term_graph = TermGraph.from_graph(self.graph)
+
+    def _expected(self, rewrite):
+        # The triples expected after a rewrite, computed with rdflib
+        expected = Graph()
+        for triple in self.graph:
+            expected.add(rewrite(*triple))
+        return expected
+
+    def test_round_trip(self):
+        self.assertEqual(len(self.term_graph), len(self.graph))
+        self.assertTrue(self.term_graph.to_graph(Graph()).isomorphic(self.graph))
+        for triple in self.graph:
+            self.assertIn(triple, self.term_graph)
+        self.term_graph.add((x('A'), x('p'), x('B')))
+        self.assertEqual(len(self.term_graph), len(self.graph))
+
+    def test_remap_subjects(self):
+        # New terms, and a chain which is only followed once
+        mapping = {x('A'): x('PA'), x('B'): x('A')}
+        self.term_graph.remap_subjects(mapping)
+        expected = self._expected(lambda s, p, o: (mapping.get(s, s), p, o))
+        self.assertTrue(self.term_graph.to_graph(Graph()).isomorphic(expected))
+        self.assertIn((x('PA'), x('p'), x('B')), self.term_graph)
+        self.assertNotIn((x('B'), x('p'), x('C')), self.term_graph)
+        self.assertEqual(set(self.term_graph.subjects()), set(expected.subjects()))
+
+    def test_remap_subjects_merged(self):
+        # Two subjects mapped to the same proxy share their triples
+        mapping = {x('B'): x('P')}
+        self.term_graph.remap_subjects(mapping)
+        expected = self._expected(lambda s, p, o: (mapping.get(s, s), p, o))
+        self.assertEqual(len(self.term_graph), len(expected))
+        self.assertEqual(len(self.term_graph), len(self.graph) - 1)
+        self.assertTrue(self.term_graph.to_graph(Graph()).isomorphic(expected))
+        
+        # The triple removed as a duplicate can be added again
+        self.term_graph.add((x('B'), x('p'), x('C')))
+        self.assertIn((x('B'), x('p'), x('C')), self.term_graph)
+
+    def test_remap_objects(self):
+        mapping = {x('B'): x('P'), x('C'): x('P'), x('A'): Literal('not used')}
+        self.term_graph.remap_objects(mapping, skip_predicate=OWL.sameAs)
+        def rewrite(s, p, o):
+            return (s, p, o if p == OWL.sameAs else mapping.get(o, o))
+        expected = self._expected(rewrite)
+        self.assertTrue(self.term_graph.to_graph(Graph()).isomorphic(expected))
+        
+        # The sameAs links are left alone
+        self.assertEqual(sorted(self.term_graph.subject_objects(OWL.sameAs)),
+                         sorted(self.graph.subject_objects(OWL.sameAs)))
+        self.assertEqual(set(self.term_graph.objects(x('B'), x('p'))),
+                         set([x('P'), Literal('not used')]))
+
+    def test_remap_unknown(self):
+        self.term_graph.remap_objects({x('unknown'): x('P')})
+        self.term_graph.remap_subjects({})
+        self.assertTrue(self.term_graph.to_graph(Graph()).isomorphic(self.graph))
+
+    def test_patterns(self):
+        self.assertEqual(set(self.term_graph.triples((None, x('p'), x('C')))),
+                         set(self.graph.triples((None, x('p'), x('C')))))
+        self.assertEqual(list(self.term_graph.triples((x('unknown'), None, None))), [])
+        self.assertEqual(set(self.term_graph.objects(x('A'))), set(self.graph.objects(x('A'))))